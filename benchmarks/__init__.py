@@ -0,0 +1,4 @@
+"""Headless benchmarks for the validators' non-GUI logic.
+
+    python -m benchmarks.run --images 20000 --boxes 0 30 --out bench.json
+"""
@@ -0,0 +1,408 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+import importlib.util
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path: sys.path.insert(0, ROOT)
+
+from benchmarks.synth import generate_dataset
+from label_index import LabelIndex, CACHE_DIRNAME, cache_dir
+from dataset_discovery import DatasetScanner, dataset_roots
+from box_store import BoxStore
+from label_journal import LabelWriter, write_labels_atomic, rewrite_labels
+from spatial_index import BoxGrid
+from undo_history import UndoHistory, delete_record, apply_record
+from bulk_ops import bulk_remap
+from sanity_scan import SanityScanner
+from box_query import parse_query, run_query
+from review_state import ReviewDB, ReviewIndex, apply_rows, ACCEPTED
+
+def load_app(filename, name):
+    """Import one of the validator scripts as a module (they are not importable by name)."""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, filename))
+    mod = importlib.util.module_from_spec(spec); spec.loader.exec_module(mod)
+    return mod
+
+# --- Measurement helpers ---
+def summarize(samples_s):
+    xs = sorted(samples_s)
+    if not xs: return {}
+    pick = lambda q: xs[min(len(xs) - 1, int(q * len(xs)))] * 1e6
+    return {'n': len(xs), 'p50_us': pick(0.5), 'p95_us': pick(0.95), 'max_us': xs[-1] * 1e6, 'mean_us': sum(xs) / len(xs) * 1e6}
+
+def peak_rss_mb():
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError: return None
+
+class Scenario:
+    """Times a block and records memory: process peak RSS so far, plus the Python
+    heap peak while it ran when tracemalloc is on (--trace-memory; it slows timings)."""
+    def __init__(self, results, name):
+        self.results = results; self.name = name; self.metrics = {}
+    def __enter__(self):
+        if tracemalloc.is_tracing(): tracemalloc.reset_peak()
+        self.t0 = time.perf_counter(); return self.metrics
+    def __exit__(self, *exc):
+        self.metrics['wall_s'] = time.perf_counter() - self.t0
+        if tracemalloc.is_tracing(): self.metrics['peak_heap_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+        self.metrics['peak_rss_mb'] = peak_rss_mb()
+        self.results[self.name] = self.metrics
+        print(f"{self.name:>16}: " + ", ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}" for k, v in self.metrics.items() if not isinstance(v, dict)))
+
+# --- Scenarios ---
+def startup(results, name, yaml_path):
+    base = os.path.dirname(yaml_path)
+    with Scenario(results, name) as m:
+        scanner = DatasetScanner(dataset_roots(yaml_path), os.path.join(cache_dir(base), "manifest.txt"), stream=False)
+        t = time.perf_counter(); scanner.run(); m['discover_s'] = time.perf_counter() - t
+        indexer = LabelIndex(os.path.join(cache_dir(base), "label_index.pkl"))
+        t = time.perf_counter(); entries = indexer.build(scanner.paths); m['index_s'] = time.perf_counter() - t
+        t = time.perf_counter()
+        store = BoxStore.from_boxes([entries[p][2] for p in scanner.paths])
+        m['store_s'] = time.perf_counter() - t
+        m['images'] = len(scanner.paths); m['boxes'] = len(store); m['reparsed'] = indexer.reparsed
+        m['manifest_hit'] = scanner.from_manifest
+        m['store_mb'] = store.nbytes() / 2**20
+    return scanner.paths, entries, store
+
+def cold_start(results, workdir, n_classes=50000):
+    """Class names of a big YAML (first launch vs the binary cache), and each script's import time in a fresh interpreter."""
+    import yaml
+    from dataset_discovery import load_class_names, _yaml_memo
+    d = os.path.join(workdir, "big_yaml"); os.makedirs(d, exist_ok=True)
+    path = os.path.join(d, "data.yaml")
+    with open(path, 'w') as f: yaml.safe_dump({'path': '.', 'train': 'images', 'names': [f"class_{i}" for i in range(n_classes)]}, f)
+    shutil.rmtree(os.path.join(d, CACHE_DIRNAME), ignore_errors=True)
+    for name in ('classes_yaml', 'classes_cached'):
+        _yaml_memo.clear()
+        with Scenario(results, name) as m:
+            t = time.perf_counter(); m['classes'] = len(load_class_names(path)); m['load_s'] = time.perf_counter() - t
+    for name, filename in (('import_v30', "data_annotator_validating_box_wise.py"), ('import_v18', "data_annotator_validating tool.py")):
+        code = ("import importlib.util as u, time; t = time.perf_counter(); "
+                f"s = u.spec_from_file_location('app', {os.path.join(ROOT, filename)!r}); s.loader.exec_module(u.module_from_spec(s)); "
+                "print(time.perf_counter() - t)")
+        with Scenario(results, name) as m:
+            m['import_s'] = float(subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True).stdout)
+    shutil.rmtree(d, ignore_errors=True)
+
+def next_box(results, store, image_paths, steps):
+    v30 = SimpleNamespace(store=store, queue=None)
+    neighbour_images = APP_V30.ValidatorV30.neighbour_images
+    samples = []
+    with Scenario(results, 'next_box') as m:
+        for q in range(min(steps, len(store))):
+            t = time.perf_counter()
+            img_id, local = store.locate(q)
+            store.get(store.row(img_id, local))
+            if local == 0: neighbour_images(v30, img_id)
+            samples.append(time.perf_counter() - t)
+        m.update(summarize(samples))
+
+def jump(results, store, n_pages, steps, rng):
+    samples = []
+    with Scenario(results, 'jump') as m:
+        for _ in range(steps):
+            page = rng.randrange(n_pages)
+            t = time.perf_counter()
+            img_id = store.first_image_with_boxes(page)
+            if img_id is not None: store.locate(store.boxes_before(img_id))
+            samples.append(time.perf_counter() - t)
+        m.update(summarize(samples))
+
+def undo_redo(results, store, image_paths, steps, rng, workdir):
+    ids = {p: i for i, p in enumerate(image_paths)}
+    history = UndoHistory(os.path.join(workdir, "bench_history.jsonl"), encode=lambda i: image_paths[i], decode=ids.get)
+    history.load()
+    samples = []
+    with Scenario(results, 'undo_redo') as m:
+        for _ in range(steps):
+            if not len(store): break
+            t = time.perf_counter()
+            img_id, local = store.locate(rng.randrange(len(store)))
+            old = store.get(store.delete(img_id, local))                     # edit
+            history.push(delete_record(img_id, local, old))
+            apply_record(store, history.undo(), undo=True)                   # undo
+            apply_record(store, history.redo(), undo=False)                  # redo
+            apply_record(store, history.undo(), undo=True)
+            samples.append(time.perf_counter() - t)
+        m.update(summarize(samples))
+    history.close()
+
+def review_resume(results, store, image_paths, steps, rng, workdir):
+    """Mark a random half of the images reviewed, reload the state, then skip-navigate."""
+    db = ReviewDB(os.path.join(workdir, "bench_review.db"), "bench")
+    for i in rng.sample(range(len(image_paths)), len(image_paths) // 2):
+        db.put(image_paths[i], [ACCEPTED] * int(store.counts[i]))
+    db.close()
+    ids = {p: i for i, p in enumerate(image_paths)}
+    samples = []
+    with Scenario(results, 'review_resume') as m:
+        t = time.perf_counter()
+        rows = db.load(); store.status[:] = 0; apply_rows(store, ids, rows)
+        index = ReviewIndex(store); m['load_s'] = time.perf_counter() - t
+        m['reviewed'] = index.reviewed()
+        for _ in range(steps):
+            t = time.perf_counter(); index.next_unreviewed(rng.randrange(max(len(store), 1))); samples.append(time.perf_counter() - t)
+        m.update(summarize(samples))
+    store.status[:] = 0
+
+QUERIES = ("class:0", "area:<0.001", "aspect:>4 sort:-aspect", "border:<0.01 count:>10", "class:1,2,3 sort:area,class")
+
+def queue_query(results, store):
+    with Scenario(results, 'queue_query') as m:
+        for text in QUERIES:
+            q = parse_query(text)
+            t = time.perf_counter(); rows = run_query(store, q)
+            m[text] = {'ms': (time.perf_counter() - t) * 1000, 'matches': len(rows)}
+        print("                  " + ", ".join(f"{k}: {v['ms']:.1f} ms/{v['matches']}" for k, v in m.items()))
+
+def save_throughput(results, store, entries, image_paths, steps, rng, workdir):
+    ids = [rng.randrange(len(image_paths)) for _ in range(steps)]
+    with Scenario(results, 'save_sync') as m:
+        samples = []
+        for i in ids:
+            t = time.perf_counter(); write_labels_atomic(entries[image_paths[i]][0], store.boxes(i)); samples.append(time.perf_counter() - t)
+        m.update(summarize(samples)); m['edits_per_s'] = len(ids) / max(sum(samples), 1e-9)
+    with Scenario(results, 'save_journal') as m:
+        writer = LabelWriter(os.path.join(workdir, "bench_journal.jsonl"), interval=0.2)
+        samples = []
+        for i in ids:
+            t = time.perf_counter(); writer.write(entries[image_paths[i]][0], store.boxes(i)); samples.append(time.perf_counter() - t)
+        t = time.perf_counter(); writer.close(); m['close_flush_s'] = time.perf_counter() - t
+        m.update(summarize(samples)); m['edits_per_s'] = len(ids) / max(sum(samples), 1e-9)
+
+def bulk_edit(results, store, entries, image_paths):
+    """Remap class 0 to 1 everywhere, rewrite the touched label files in parallel, then revert."""
+    with Scenario(results, 'bulk_remap') as m:
+        rows = run_query(store, parse_query("class:0"))
+        t = time.perf_counter(); recs = bulk_remap(store, rows, 1); m['apply_s'] = time.perf_counter() - t
+        jobs = [(entries[image_paths[r[1]]][0], lambda i=r[1]: store.boxes(i)) for r in recs]
+        t = time.perf_counter(); rewrite_labels(jobs); m['rewrite_s'] = time.perf_counter() - t
+        t = time.perf_counter(); apply_record(store, ('T', recs), undo=True); m['undo_s'] = time.perf_counter() - t
+        m['boxes'] = len(rows); m['files'] = len(recs)
+    rewrite_labels(jobs)
+
+def sanity(results, entries, image_paths, n_classes):
+    lbl_paths = [entries[p][0] for p in image_paths]
+    for name, processes in (('sanity_scan', True), ('sanity_scan_threads', False)):
+        with Scenario(results, name) as m:
+            findings = SanityScanner(n_classes, processes=processes).run(lbl_paths)
+            m['findings'] = len(findings)
+
+def label_pack(results, entries, image_paths, workdir):
+    """Pack the labels of the first split into a side archive, then read every image back from the mmap."""
+    from label_pack import pack_labels, PackedLabels
+    labels_dir = os.path.dirname(entries[image_paths[0]][0])
+    out = os.path.join(workdir, CACHE_DIRNAME, "bench.pack")
+    with Scenario(results, 'pack_import') as m:
+        _, m['images'] = pack_labels(labels_dir, out)
+    with Scenario(results, 'pack_read_all') as m:
+        pk = PackedLabels(out)
+        m['boxes'] = sum(len(pk.get(s)) for s in pk.names)
+        pk.close()
+
+def v18_page_load(results, image_paths, steps, rng, size):
+    v18 = SimpleNamespace(custom_label_dir=None, orig_w=size[0], orig_h=size[1])
+    cls = APP_V18.YoloValidatorV18
+    samples = []; hits = []
+    with Scenario(results, 'v18_page_load') as m:
+        for _ in range(steps):
+            img_path = image_paths[rng.randrange(len(image_paths))]
+            t = time.perf_counter()
+            lbl = cls.find_label_path(v18, img_path)
+            boxes = cls.read_boxes(v18, lbl) if lbl else []
+            grid = BoxGrid(boxes)
+            samples.append(time.perf_counter() - t)
+            t = time.perf_counter()
+            for _ in range(20): grid.hit(rng.random(), rng.random())
+            hits.append((time.perf_counter() - t) / 20)
+        m.update(summarize(samples)); m['hit_test'] = summarize(hits)
+
+def thumbnails(results, image_paths, workdir, n=500):
+    from thumbnails import ThumbCache
+    root = os.path.join(workdir, CACHE_DIRNAME, "thumbs")
+    paths = image_paths[:n]
+    with Scenario(results, 'thumbs_cold') as m:
+        cache = ThumbCache(root)
+        t = time.perf_counter()
+        cache.request(paths)
+        while cache.busy(): time.sleep(0.01)
+        m['generated'] = len(cache.drain())
+        m['per_image_ms'] = (time.perf_counter() - t) / max(1, len(paths)) * 1e3
+        cache.shutdown()
+    with Scenario(results, 'thumbs_warm_lookup') as m:
+        cache = ThumbCache(root)
+        t = time.perf_counter()
+        m['hits'] = sum(cache.lookup(p) is not None for p in paths)
+        m['per_lookup_us'] = (time.perf_counter() - t) / max(1, len(paths)) * 1e6
+        cache.shutdown()
+
+def large_region(results, workdir, side, steps, rng):
+    """Viewport renders of one side x side uncompressed TIFF read by region (RSS should track the viewport)."""
+    import numpy as np
+    from PIL import Image
+    from large_image import LargeImages
+    from tile_pyramid import TilePyramid, TileCache
+    path = os.path.join(workdir, f"large_{side}.tif")
+    if not os.path.exists(path):
+        band = np.random.default_rng(0).integers(0, 255, (side, side, 3), np.uint8)
+        Image.fromarray(band).save(path); del band
+    large = LargeImages(os.path.join(workdir, CACHE_DIRNAME, "large"), min_pixels=0)
+    with Scenario(results, 'large_build') as m:
+        pyr = TilePyramid(path, None, TileCache(64 * 2**20), large=large)
+        while not pyr.ready(): time.sleep(0.05)
+    samples = []
+    with Scenario(results, 'large_render') as m:
+        for _ in range(steps):
+            zoom = rng.choice((0.02, 0.1, 0.5, 1.0, 2.0))
+            t = time.perf_counter()
+            pyr.render(rng.uniform(0, side), rng.uniform(0, side), zoom, 1200, 800)
+            samples.append(time.perf_counter() - t)
+        m.update(summarize(samples))
+    large.shutdown()
+
+def export(results, image_paths, workdir, classes):
+    from dataset_export import export_coco, export_shards
+    out = os.path.join(workdir, CACHE_DIRNAME, "export")
+    os.makedirs(out, exist_ok=True)
+    with Scenario(results, 'export_coco') as m:
+        m['images'], m['annotations'] = export_coco(os.path.join(out, "bench.json"), image_paths, workdir, classes)
+    with Scenario(results, 'export_shards') as m:
+        shards = export_shards(os.path.join(out, "shards"), "bench", image_paths)
+        m['shards'] = len(shards); m['mb'] = sum(s[2] for s in shards) / 2**20
+    shutil.rmtree(out, ignore_errors=True)
+
+def render(results, image_paths, steps, rng):
+    from image_cache import ImageCache
+    from tile_pyramid import TilePyramid, TileCache
+    cache = ImageCache(); tiles = TileCache()
+    samples = []
+    with Scenario(results, 'render') as m:
+        for _ in range(steps):
+            path = image_paths[rng.randrange(min(len(image_paths), 8))]
+            pyr = TilePyramid(path, cache.get, tiles, full=cache.peek(path))
+            zoom = rng.choice((0.15, 0.3, 0.7, 1.0, 2.5))
+            t = time.perf_counter()
+            pyr.render(rng.uniform(0, pyr.size[0]), rng.uniform(0, pyr.size[1]), zoom, 1200, 800)
+            samples.append(time.perf_counter() - t)
+        m.update(summarize(samples))
+    cache.shutdown()
+
+def flashcard(results, store, image_paths, steps):
+    """Critical path of a Space press: render the next card on demand vs take it from the lookahead."""
+    from image_cache import ImageCache
+    from tile_pyramid import TileCache
+    from large_image import LargeImages
+    from flashcard_lookahead import FlashcardLookahead, view_for
+    tk_root = SimpleNamespace(after=lambda ms, fn: None, after_cancel=lambda i: None)
+    rows = [store.row(*store.locate(q)) for q in range(min(steps, len(store)))]
+    for name in ('flashcard_render', 'flashcard_lookahead'):
+        cache = ImageCache(); la = FlashcardLookahead(tk_root, cache, TileCache(), LargeImages(tempfile.mkdtemp()), photo=lambda im: im)
+        samples = []; hits = 0
+        with Scenario(results, name) as m:
+            for i, row in enumerate(rows):
+                path = image_paths[int(store.img[row])]; box = store.xywh[row].tolist()
+                t = time.perf_counter()
+                if name == 'flashcard_render':
+                    pyr = la.pyramid(path)
+                    pyr.render(*view_for(box, *pyr.size, 1200, 800), 1200, 800)
+                else:
+                    hits += la.take(la.key(row, store.xywh[row], 1200, 800)) is not None
+                    la.schedule([(la.key(r, store.xywh[r], 1200, 800), image_paths[int(store.img[r])], store.xywh[r].tolist())
+                                 for r in rows[i + 1:i + 1 + la.depth]], 1200, 800)
+                samples.append(time.perf_counter() - t)
+                if name == 'flashcard_lookahead': time.sleep(0.02)   # a fast reviewer: ~50 boxes/s
+            m.update(summarize(samples))
+            if name == 'flashcard_lookahead': m['hit_rate'] = hits / max(len(rows) - 1, 1)
+        la.close(); cache.shutdown()
+
+# --- CLI ---
+def compare(new, old_path):
+    with open(old_path, 'r') as f: old = json.load(f)
+    print(f"\nvs {old_path}:")
+    for name, metrics in new['scenarios'].items():
+        prev = old.get('scenarios', {}).get(name, {})
+        for key in ('wall_s', 'p50_us', 'p95_us', 'peak_heap_mb', 'peak_rss_mb'):
+            if key in metrics and prev.get(key):
+                print(f"{name:>16}.{key:<12} {prev[key]:>12.4g} -> {metrics[key]:<12.4g} ({(metrics[key] / prev[key] - 1) * 100:+.1f}%)")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Headless benchmarks for ValidatorV30 / YoloValidatorV18 logic")
+    ap.add_argument("--images", type=int, default=2000)
+    ap.add_argument("--size", type=int, nargs=2, default=(1280, 720), metavar=("W", "H"))
+    ap.add_argument("--boxes", type=int, nargs=2, default=(0, 20), metavar=("MIN", "MAX"), help="boxes per image")
+    ap.add_argument("--classes", type=int, default=80)
+    ap.add_argument("--class-dist", choices=("zipf", "uniform"), default="zipf")
+    ap.add_argument("--coords", choices=("normalized", "pixel", "mixed"), default="normalized")
+    ap.add_argument("--no-images", action="store_true", help="write empty image files (skips the render scenario)")
+    ap.add_argument("--steps", type=int, default=2000)
+    ap.add_argument("--large", type=int, default=0, metavar="SIDE", help="also time region reads of a SIDE x SIDE TIFF")
+    ap.add_argument("--dataset", help="reuse/generate the dataset here instead of a temp dir")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--trace-memory", action="store_true", help="record per-scenario Python heap peaks")
+    ap.add_argument("--out", default="bench_results.json")
+    ap.add_argument("--compare", help="previous results JSON to diff against")
+    args = ap.parse_args(argv)
+
+    global APP_V30, APP_V18
+    APP_V30 = load_app("data_annotator_validating_box_wise.py", "validator_v30")
+    APP_V18 = load_app("data_annotator_validating tool.py", "validator_v18")
+
+    rng = random.Random(args.seed)
+    workdir = args.dataset or tempfile.mkdtemp(prefix="yolo_bench_")
+    yaml_path = os.path.join(workdir, "data_cleaned.yaml")
+    t = time.perf_counter()
+    if not os.path.exists(yaml_path):
+        generate_dataset(workdir, args.images, tuple(args.size), tuple(args.boxes), args.classes,
+                         args.class_dist, args.coords, not args.no_images, args.seed)
+    gen_s = time.perf_counter() - t
+    shutil.rmtree(os.path.join(workdir, CACHE_DIRNAME), ignore_errors=True)
+
+    results = {}
+    if args.trace_memory: tracemalloc.start()
+    cold_start(results, workdir)
+    startup(results, 'startup_cold', yaml_path)
+    image_paths, entries, store = startup(results, 'startup_warm', yaml_path)
+    next_box(results, store, image_paths, args.steps)
+    jump(results, store, len(image_paths), args.steps, rng)
+    undo_redo(results, store, image_paths, args.steps, rng, workdir)
+    queue_query(results, store)
+    review_resume(results, store, image_paths, args.steps, rng, workdir)
+    save_throughput(results, store, entries, image_paths, min(args.steps, 500), rng, workdir)
+    bulk_edit(results, store, entries, image_paths)
+    sanity(results, entries, image_paths, args.classes)
+    label_pack(results, entries, image_paths, workdir)
+    v18_page_load(results, image_paths, min(args.steps, 500), rng, tuple(args.size))
+    if not args.no_images:
+        render(results, image_paths, min(args.steps, 300), rng)
+        flashcard(results, store, image_paths, min(args.steps, 300))
+        thumbnails(results, image_paths, workdir)
+        export(results, image_paths, workdir, [f"class_{i}" for i in range(args.classes)])
+    if args.large: large_region(results, workdir, args.large, min(args.steps, 300), rng)
+    if args.trace_memory: tracemalloc.stop()
+
+    out = {
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': sys.version.split()[0], 'platform': platform.platform(),
+        'config': vars(args), 'generate_s': gen_s, 'peak_rss_mb': peak_rss_mb(),
+        'scenarios': results,
+    }
+    with open(args.out, 'w') as f: json.dump(out, f, indent=2)
+    print(f"\nwrote {args.out}")
+    if args.compare: compare(out, args.compare)
+    if not args.dataset: shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
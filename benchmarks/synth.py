@@ -0,0 +1,48 @@
+import io
+import os
+import random
+import yaml
+
+def class_sampler(n_classes, dist, rng):
+    if dist == 'uniform': return lambda: rng.randrange(n_classes)
+    # Zipf-like: a few classes dominate, as in real auto-labeled data
+    weights = [1.0 / (i + 1) for i in range(n_classes)]
+    ids = list(range(n_classes))
+    return lambda: rng.choices(ids, weights)[0]
+
+def jpeg_bytes(size):
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.effect_noise(size, 40).convert('RGB').save(buf, 'JPEG', quality=85)
+    return buf.getvalue()
+
+def generate_dataset(root, n_images=1000, size=(1280, 720), boxes=(0, 20), n_classes=80,
+                     class_dist='zipf', coords='normalized', write_images=True, seed=0):
+    """Write a YOLO dataset under root and return the path of its data.yaml.
+
+    Layout is images/ + labels/ side by side, which is what get_label_path
+    and find_label_path resolve. `coords` is 'normalized', 'pixel'
+    or 'mixed' (per file). With write_images=False the images are empty
+    placeholder files, enough for discovery and label indexing.
+    """
+    rng = random.Random(seed)
+    sample_cls = class_sampler(n_classes, class_dist, rng)
+    img_dir = os.path.join(root, 'images'); lbl_dir = os.path.join(root, 'labels')
+    os.makedirs(img_dir, exist_ok=True); os.makedirs(lbl_dir, exist_ok=True)
+    data = jpeg_bytes(size) if write_images else b""
+    w, h = size
+    for i in range(n_images):
+        name = f"img_{i:07d}"
+        with open(os.path.join(img_dir, name + ".jpg"), 'wb') as f: f.write(data)
+        pixel = coords == 'pixel' or (coords == 'mixed' and rng.random() < 0.5)
+        lines = []
+        for _ in range(rng.randint(*boxes)):
+            bw = rng.uniform(0.005, 0.3); bh = rng.uniform(0.005, 0.3)
+            cx = rng.uniform(bw/2, 1 - bw/2); cy = rng.uniform(bh/2, 1 - bh/2)
+            if pixel: cx, cy, bw, bh = cx*w, cy*h, bw*w, bh*h
+            lines.append(f"{sample_cls()} {cx:.6f} {cy:.6f} {bw:.6f} {bh:.6f}\n")
+        with open(os.path.join(lbl_dir, name + ".txt"), 'w') as f: f.writelines(lines)
+    yaml_path = os.path.join(root, 'data_cleaned.yaml')
+    with open(yaml_path, 'w') as f:
+        yaml.safe_dump({'path': '.', 'train': 'images', 'names': [f"class_{i}" for i in range(n_classes)]}, f)
+    return yaml_path
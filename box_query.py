@@ -0,0 +1,101 @@
+import re
+import math
+import numpy as np
+from label_index import pixel_rows
+
+QUERY_HELP = "class:3,car  area:<0.001  aspect:>4  border:<0.01  count:>50  sort:-area"
+FIELDS = ('class', 'area', 'aspect', 'border', 'count')
+RANGE_RE = re.compile(r'^(-?[0-9.]+(?:e-?[0-9]+)?)-(-?[0-9.]+(?:e-?[0-9]+)?)$', re.I)
+
+def parse_range(text):
+    """'<x', '>x', 'a-b' or 'x' -> inclusive (lo, hi)."""
+    if text.startswith('<'): return -math.inf, float(text[1:])
+    if text.startswith('>'): return float(text[1:]), math.inf
+    m = RANGE_RE.match(text)
+    if m: return float(m.group(1)), float(m.group(2))
+    return float(text), float(text)
+
+def parse_query(text, classes=()):
+    """'key:value' terms -> {field: filter, 'sort': [(field, descending)]}. Raises ValueError."""
+    names = {str(n).lower(): i for i, n in enumerate(classes)}
+    query = {'sort': []}
+    for term in text.split():
+        key, sep, val = term.partition(':')
+        key = key.lower()
+        if not sep or not val: raise ValueError(f"expected key:value, got '{term}'")
+        if key == 'class':
+            ids = set()
+            for c in val.split(','):
+                if c.lstrip('-').isdigit(): ids.add(int(c))
+                elif c.lower() in names: ids.add(names[c.lower()])
+                else: raise ValueError(f"unknown class '{c}'")
+            query['class'] = ids
+        elif key == 'sort':
+            for k in val.split(','):
+                desc = k.startswith('-'); k = k.lstrip('-+').lower()
+                if k not in FIELDS: raise ValueError(f"cannot sort by '{k}'")
+                query['sort'].append((k, desc))
+        elif key in FIELDS: query[key] = parse_range(val)
+        else: raise ValueError(f"unknown field '{key}' (use {', '.join(FIELDS + ('sort',))})")
+    return query
+
+def features(store, rows, name):
+    """One per-box feature for the given rows (ids or a slice), in normalized image units.
+
+    Boxes of pixel-coordinate label files are divided by their image's
+    store.img_wh; while that is unknown their geometry is NaN, which matches
+    no range and sorts last.
+    """
+    if name == 'class': return store.cls[rows]
+    if name == 'count': return store.counts[store.img[rows]]
+    xywh = store.xywh[rows]
+    px = pixel_rows(xywh)
+    if px.any():
+        xywh = xywh.astype(np.float64)
+        wh = store.img_wh[store.img[rows][px]].astype(np.float64)
+        wh[wh == 0] = np.nan
+        xywh[px] /= np.concatenate([wh, wh], axis=1)
+    w, h = xywh[:, 2], xywh[:, 3]
+    if name == 'area': return w * h
+    if name == 'aspect':
+        # Elongation in either direction, always >= 1 (normalized w/h, image aspect not applied)
+        w = np.maximum(w, 1e-9); h = np.maximum(h, 1e-9)
+        return np.maximum(w / h, h / w)
+    if name == 'border':
+        cx, cy = xywh[:, 0], xywh[:, 1]
+        hw = w / 2; hh = h / 2
+        return np.minimum(np.minimum(cx - hw, cy - hh), np.minimum(1 - cx - hw, 1 - cy - hh))
+    raise KeyError(name)
+
+def query_mask(store, query, rows=None):
+    """Which boxes pass the query's filters: over every row, or over the given row ids."""
+    sel = slice(0, store.size) if rows is None else rows
+    cls = store.cls[sel]
+    mask = np.ones(len(cls), bool)
+    if 'class' in query:
+        # isin, not a lookup table indexed by class id: `class:99999999` must not allocate by its value.
+        mask &= np.isin(cls, [c for c in query['class'] if c >= 0])
+    for name in ('count', 'area', 'aspect', 'border'):
+        if name in query:
+            lo, hi = query[name]
+            v = features(store, sel, name)
+            mask &= (v >= lo) & (v <= hi)
+    if 'images' in query:
+        # Image id range [lo, hi): set by the app (shared review), not by the query syntax.
+        lo, hi = query['images']
+        img = store.img[sel]
+        mask &= (img >= lo) & (img < hi)
+    return mask
+
+def run_query(store, query):
+    """Row ids of the live boxes matching `query`, in queue order or the requested sort.
+
+    Predicates run over whole columns (no gathers), so only the matches are
+    put in queue order and sorted.
+    """
+    rows = store.queue_rows(query_mask(store, query))
+    # Stable sorts applied last-key-first give a lexicographic order over the sort keys.
+    for name, desc in reversed(query['sort']):
+        v = features(store, rows, name)
+        rows = rows[np.argsort(-v if desc else v, kind='stable')]
+    return rows
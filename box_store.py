@@ -0,0 +1,165 @@
+import itertools
+import numpy as np
+from label_index import pixel_rows
+
+class BoxStore:
+    """Struct-of-arrays storage for every box in the dataset.
+
+    Rows are append-only: deleting a box clears its `alive` flag so its row id
+    stays valid for undo. An image's boxes are the contiguous rows it was loaded
+    with until the first edit, after which an explicit row list is kept for it.
+    A Fenwick tree over per-image box counts maps a global box number to
+    (image id, local index) and back in O(log N).
+    """
+    def __init__(self, n_images, capacity=1024):
+        self.n_images = n_images
+        self.img = np.zeros(capacity, np.int32)
+        self.cls = np.zeros(capacity, np.int32)
+        self.xywh = np.zeros((capacity, 4), np.float32)
+        self.alive = np.zeros(capacity, bool)
+        self.status = np.zeros(capacity, np.uint8)   # review_state.UNREVIEWED/ACCEPTED/MODIFIED
+        self.img_wh = np.zeros((n_images, 2), np.float32)   # (w, h) of images with pixel-coordinate boxes, 0 = unknown
+        self.size = 0
+        self.start = np.zeros(n_images, np.int64)
+        self.counts = np.zeros(n_images, np.int64)
+        self.order = {}
+        self.tree = np.zeros(n_images + 1, np.int64)
+        self.total = 0
+
+    @classmethod
+    def from_boxes(cls, per_image):
+        """per_image[i] is the list of [cls, cx, cy, w, h] boxes for image id i."""
+        counts = np.fromiter((len(b) for b in per_image), np.int64, len(per_image))
+        n = int(counts.sum())
+        store = cls(len(per_image), max(n, 1024))
+        flat = np.fromiter(itertools.chain.from_iterable(b[:5] for boxes in per_image for b in boxes), np.float64, n * 5).reshape(n, 5)
+        store.img[:n] = np.repeat(np.arange(len(per_image), dtype=np.int32), counts)
+        store.cls[:n] = flat[:, 0]
+        store.xywh[:n] = flat[:, 1:]
+        store.alive[:n] = True
+        store.size = n
+        store.start[1:] = np.cumsum(counts)[:-1]
+        store.counts = counts
+        store.rebuild_tree()
+        return store
+
+    # --- Fenwick tree over per-image counts ---
+    def rebuild_tree(self):
+        csum = np.concatenate(([0], np.cumsum(self.counts)))
+        i = np.arange(1, self.n_images + 1)
+        self.tree[1:] = csum[i] - csum[i - (i & -i)]
+        self.total = int(csum[-1])
+
+    def _tree_add(self, img_id, delta):
+        self.counts[img_id] += delta; self.total += delta
+        i = img_id + 1
+        while i <= self.n_images: self.tree[i] += delta; i += i & -i
+
+    def boxes_before(self, img_id):
+        s = 0; i = img_id
+        while i > 0: s += self.tree[i]; i -= i & -i
+        return int(s)
+
+    def locate(self, q):
+        """Global box number (0-based) -> (image id, local index)."""
+        pos = 0; rem = q
+        step = 1 << (self.n_images.bit_length() - 1) if self.n_images else 0
+        while step:
+            nxt = pos + step
+            if nxt <= self.n_images and self.tree[nxt] <= rem: pos = nxt; rem -= int(self.tree[nxt])
+            step >>= 1
+        return pos, rem
+
+    def global_index(self, img_id, local): return self.boxes_before(img_id) + local
+
+    def first_image_with_boxes(self, img_id):
+        """img_id itself or the next image that still has boxes, or None."""
+        q = self.boxes_before(img_id)
+        return self.locate(q)[0] if q < self.total else None
+
+    def __len__(self): return self.total
+
+    def pixel_images(self):
+        """Ids of images with a live box in pixel coordinates, kept as loaded."""
+        n = self.size
+        return np.unique(self.img[:n][self.alive[:n] & pixel_rows(self.xywh[:n])])
+
+    # --- Rows ---
+    def rows(self, img_id):
+        o = self.order.get(img_id)
+        if o is not None: return o
+        s = int(self.start[img_id])
+        return range(s, s + int(self.counts[img_id]))
+
+    def _edit_rows(self, img_id):
+        if img_id not in self.order: self.order[img_id] = list(self.rows(img_id))
+        return self.order[img_id]
+
+    def _append(self, img_id, data):
+        if self.size == len(self.alive):
+            cap = len(self.alive) * 2
+            self.img = np.resize(self.img, cap); self.cls = np.resize(self.cls, cap)
+            self.xywh = np.resize(self.xywh, (cap, 4)); self.alive = np.resize(self.alive, cap)
+            self.status = np.resize(self.status, cap)
+            self.alive[self.size:] = False; self.status[self.size:] = 0
+        r = self.size; self.size += 1
+        self.img[r] = img_id
+        self.set(r, data)
+        return r
+
+    def queue_rows(self, mask=None):
+        """Row ids of every live box (where mask[row] holds) in queue order: image, then local index."""
+        keep = self.alive[:self.size] if mask is None else self.alive[:self.size] & mask
+        if not self.order: return np.flatnonzero(keep)
+        # Untouched images still own their contiguous load-time rows; splice the edited ones in
+        # where their load-time block started.
+        ids = sorted(self.order)
+        edited = np.zeros(self.n_images, bool); edited[ids] = True
+        plain = np.flatnonzero(keep & ~edited[self.img[:self.size]])
+        extra = np.fromiter(itertools.chain.from_iterable(self.order[i] for i in ids), np.int64)
+        owner = np.repeat(np.array(ids, np.int64), [len(self.order[i]) for i in ids])
+        hit = keep[extra]
+        return np.insert(plain, np.searchsorted(plain, self.start[owner[hit]]), extra[hit])
+
+    def local_index(self, row):
+        """Row id -> (image id, local index) of a live box."""
+        img_id = int(self.img[row])
+        return img_id, self.rows(img_id).index(int(row))
+
+    def local_indices(self, rows):
+        """local_index() for an array of live row ids; vectorized for images never edited."""
+        rows = np.asarray(rows, np.int64); img = self.img[rows]
+        local = rows - self.start[img]
+        if self.order:
+            for k in np.flatnonzero(np.isin(img, list(self.order))): local[k] = self.order[int(img[k])].index(int(rows[k]))
+        return local
+
+    def row(self, img_id, local): return self.rows(img_id)[local]
+    def get(self, row): return [float(self.cls[row])] + self.xywh[row].tolist()
+    def set(self, row, data): self.cls[row] = int(data[0]); self.xywh[row] = data[1:5]
+    def boxes(self, img_id): return [self.get(r) for r in self.rows(img_id)]
+
+    # --- Edits (O(boxes in image) + O(log N)) ---
+    def delete(self, img_id, local):
+        r = self._edit_rows(img_id).pop(local)
+        self.alive[r] = False; self._tree_add(img_id, -1)
+        return r
+
+    def delete_many(self, img_id, locals_):
+        """Delete several boxes of one image at once; returns their row ids."""
+        drop = set(locals_); rows = self._edit_rows(img_id)
+        gone = [r for j, r in enumerate(rows) if j in drop]
+        self.order[img_id] = [r for j, r in enumerate(rows) if j not in drop]
+        self.alive[gone] = False; self._tree_add(img_id, -len(gone))
+        return gone
+
+    def add(self, img_id, data, local=None):
+        r = self._append(img_id, data)
+        rows = self._edit_rows(img_id)
+        if local is None: rows.append(r)
+        else: rows.insert(local, r)
+        self.alive[r] = True; self._tree_add(img_id, 1)
+        return r
+
+    def nbytes(self):
+        return self.img.nbytes + self.cls.nbytes + self.xywh.nbytes + self.alive.nbytes + self.status.nbytes + self.start.nbytes + self.counts.nbytes + self.tree.nbytes
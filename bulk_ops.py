@@ -0,0 +1,29 @@
+import numpy as np
+from undo_history import remap_record, delete_many_record
+
+def group_by_image(store, rows):
+    """Live row ids -> [(img_id, local indices ascending, row ids)], one entry per image."""
+    rows = np.asarray(rows, np.int64)
+    if not len(rows): return []
+    img = store.img[rows]; local = store.local_indices(rows)
+    o = np.lexsort((local, img)); img, local, rows = img[o], local[o], rows[o]
+    ids, starts = np.unique(img, return_index=True)
+    return list(zip(ids.tolist(), np.split(local, starts[1:]), np.split(rows, starts[1:])))
+
+def bulk_remap(store, rows, new_cls):
+    """Set the class of every row; returns one 'C' undo record per image that changed."""
+    recs = []
+    for img_id, local, r in group_by_image(store, rows):
+        old = store.cls[r]; hit = old != new_cls
+        if hit.any(): recs.append(remap_record(img_id, local[hit].tolist(), old[hit].tolist(), new_cls))
+    store.cls[np.asarray(rows, np.int64)] = new_cls
+    return recs
+
+def bulk_delete(store, rows):
+    """Delete every row; returns one 'X' undo record per image."""
+    recs = []
+    for img_id, local, r in group_by_image(store, rows):
+        old = np.column_stack((store.cls[r].astype(np.float64), store.xywh[r])).tolist()
+        store.delete_many(img_id, local.tolist())
+        recs.append(delete_many_record(img_id, local.tolist(), old))
+    return recs
@@ -0,0 +1,172 @@
+import re
+import bisect
+from collections import Counter
+import tkinter as tk
+from tkinter import Listbox
+
+TOP_K = 50
+DEBOUNCE_MS = 80
+WORD_SPLIT = re.compile(r"[\s_\-/.,:()]+")
+
+def trigrams(s):
+    return {s[i:i+3] for i in range(len(s) - 2)}
+
+class ClassIndex:
+    """Search index over class names: exact lookup, sorted prefix keys and a trigram index.
+
+    search() ranks exact id (then id prefix), exact name, name/word prefix, substring, then
+    fuzzy (shared trigrams), and stops once it has k results.
+    """
+    def __init__(self, classes):
+        self.names = [str(n) for n in classes]
+        self.lower = [n.lower() for n in self.names]
+        self.exact = {}
+        keys = set()
+        self.grams = {}
+        for i, n in enumerate(self.lower):
+            self.exact.setdefault(n, i)
+            keys.add((n, i))
+            for w in WORD_SPLIT.split(n):
+                if w: keys.add((w, i))
+            for g in trigrams(n): self.grams.setdefault(g, []).append(i)
+        self.prefix = sorted(keys)
+        self.keys = [k for k, _ in self.prefix]
+
+    def resolve(self, text):
+        """Class id for an id or an exact (case-insensitive) name, else None."""
+        q = text.strip()
+        if q.isdigit(): return int(q)
+        return self.exact.get(q.lower())
+
+    def search(self, text, k=TOP_K):
+        q = text.strip().lower()
+        if not q: return list(range(min(k, len(self.names))))
+        out = []; seen = set()
+        def take(ids):
+            for i in ids:
+                if i not in seen: seen.add(i); out.append(i)
+                if len(out) >= k: return True
+            return False
+        by_len = lambda i: (len(self.lower[i]), i)
+
+        if q.isdigit():
+            # The id itself, then ids that start with the typed digits (12 -> 120..129, 1200..).
+            n = int(q); ids = [n] if n < len(self.names) else []
+            lo = n * 10
+            while n and lo < len(self.names) and len(ids) < k:
+                ids.extend(range(lo, min(lo + 10 ** (len(str(lo)) - len(q)), len(self.names)))); lo *= 10
+            if take(ids): return out
+        if q in self.exact and take([self.exact[q]]): return out
+        lo = bisect.bisect_left(self.keys, q); hi = bisect.bisect_left(self.keys, q + "\uffff")
+        if take(sorted({self.prefix[j][1] for j in range(lo, hi)}, key=by_len)): return out
+
+        grams = trigrams(q)
+        if grams:
+            # Every substring match contains all of q's trigrams: verify the rarest one's postings.
+            cand = min((self.grams.get(g, ()) for g in grams), key=len)
+        else: cand = range(len(self.lower))
+        if take(sorted((i for i in cand if q in self.lower[i]), key=by_len)): return out
+
+        if grams:
+            score = Counter()
+            for g in grams: score.update(self.grams.get(g, ()))
+            need = max(1, len(grams) // 2)
+            take(sorted((i for i, s in score.items() if s >= need), key=lambda i: (-score[i],) + by_len(i)))
+        return out
+
+# --- Dialog ---
+class AutoSuggestDialog(tk.Toplevel):
+    def __init__(self, parent, title, classes, index=None):
+        super().__init__(parent)
+        self.title(title)
+        self.geometry("300x250")
+        self.classes = classes
+        self.index = index or ClassIndex(classes)
+        self.ids = []
+        self.pending = None
+        self.result = None
+        x = parent.winfo_rootx() + 50; y = parent.winfo_rooty() + 50
+        self.geometry(f"+{x}+{y}")
+
+        tk.Label(self, text="Type Class Name or ID:").pack(pady=5)
+        self.entry = tk.Entry(self)
+        self.entry.pack(fill=tk.X, padx=10)
+        self.entry.bind("<KeyRelease>", self.on_key_release)
+        self.entry.bind("<Return>", self.on_enter)
+        self.entry.bind("<Down>", self.focus_list)
+        self.entry.focus_set()
+
+        self.listbox = Listbox(self)
+        self.listbox.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        self.listbox.bind("<Double-Button-1>", self.on_list_click)
+        self.listbox.bind("<Return>", self.on_list_enter)
+
+        self.update_list("")
+        self.transient(parent); self.grab_set(); self.wait_window()
+
+    def update_list(self, filter_text):
+        # Only the top-K ranked matches ever reach the Listbox.
+        self.pending = None
+        self.ids = self.index.search(filter_text)
+        self.listbox.delete(0, tk.END)
+        if self.ids: self.listbox.insert(tk.END, *[f"[{i}] {self.index.names[i]}" for i in self.ids])
+        if self.ids: self.listbox.selection_set(0)
+
+    def on_key_release(self, e):
+        if e.keysym in ('Up','Down','Return'): return
+        if self.pending: self.after_cancel(self.pending)
+        self.pending = self.after(DEBOUNCE_MS, lambda: self.update_list(self.entry.get()))
+    def focus_list(self, e): self.listbox.focus_set()
+    def on_list_click(self, e): self.select_and_close()
+    def on_list_enter(self, e): self.select_and_close()
+    def on_enter(self, e): self.select_and_close()
+    def select_and_close(self):
+        if self.pending: self.after_cancel(self.pending); self.update_list(self.entry.get())
+        sel = self.listbox.curselection()
+        if sel: self.result = self.ids[sel[0]]
+        else: self.result = self.index.resolve(self.entry.get())
+        self.destroy()
+
+class ClassLegend:
+    """Scrollable "[id] name" list of every class that only ever holds the
+    visible rows: the scrollbar maps onto the full class count, so filling or
+    scrolling it costs the same for 80 classes or 50k."""
+    def __init__(self, parent, height=20, **listbox_kw):
+        self.frame = tk.Frame(parent)
+        self.sb = tk.Scrollbar(self.frame, command=self.on_scroll)
+        self.sb.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox = Listbox(self.frame, height=height, **listbox_kw)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.listbox.bind("<MouseWheel>", lambda e: self.scroll_to(self.top - (3 if e.delta > 0 else -3)))
+        self.listbox.bind("<Button-4>", lambda e: self.scroll_to(self.top - 3))
+        self.listbox.bind("<Button-5>", lambda e: self.scroll_to(self.top + 3))
+        self.listbox.bind("<Configure>", lambda e: self.refresh())
+        self.rows = height
+        self.names = []
+        self.top = 0
+
+    def pack(self, **kw): self.frame.pack(**kw)
+
+    def set_names(self, names): self.names = names; self.top = 0; self.refresh()
+
+    def visible_rows(self):
+        # Rows that fit the current height (the Listbox's own height before it is mapped).
+        h = self.listbox.winfo_height()
+        line = self.listbox.bbox(0)
+        return max(1, h // line[3]) if h > 1 and line else self.rows
+
+    def scroll_to(self, top):
+        self.top = max(0, min(int(top), len(self.names) - self.visible_rows())); self.refresh()
+        return "break"
+
+    def on_scroll(self, *args):
+        n = self.visible_rows()
+        if args[0] == 'moveto': self.scroll_to(float(args[1]) * len(self.names))
+        elif args[0] == 'scroll': self.scroll_to(self.top + int(args[1]) * (n if args[2] == 'pages' else 1))
+
+    def refresh(self):
+        n = self.visible_rows(); end = min(len(self.names), self.top + n)
+        self.listbox.delete(0, tk.END)
+        if end > self.top: self.listbox.insert(tk.END, *[f"[{i}] {self.names[i]}" for i in range(self.top, end)])
+        total = max(len(self.names), 1)
+        self.sb.set(self.top / total, end / total if self.names else 1.0)
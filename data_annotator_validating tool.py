@@ -1,39 +1,73 @@
+import time
+STARTUP_T0 = time.perf_counter()
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, Menu, Listbox, Scrollbar, simpledialog
-from PIL import Image, ImageTk
-import yaml
+if __name__ == "__main__":
+    # Put a window up before the heavy imports below (numpy, PIL); the app is built into it.
+    ROOT = tk.Tk(); SPLASH = ttk.Label(ROOT, text="Starting...", padding=40); SPLASH.pack(); ROOT.update()
 import os
+import threading
 import glob
+import bisect
+from image_cache import ImageCache
+from tile_pyramid import TilePyramid, TileCache
+from large_image import LargeImages
+from dataset_discovery import DatasetScanner, dataset_roots, load_class_names
+from label_index import cache_dir, stat_key
+from label_pack import find_pack, pack_label_path, open_pack, is_pack_path, read_packed, close_packs
+from label_journal import write_labels_atomic
+from spatial_index import BoxGrid
+from perf_trace import TRACER, PerfOverlay, StartupTimer
+from class_search import ClassIndex, AutoSuggestDialog, ClassLegend
+from thumbnails import ThumbCache, ThumbnailGrid
+
+LABEL_LIMIT = 1000
+
+PREFETCH_AHEAD = 3
+
+def photo_image(img):
+    from PIL import ImageTk   # imported on first draw, not at startup
+    return ImageTk.PhotoImage(img)
 
 class YoloValidatorV18:
     def __init__(self, root, yaml_filename="data_cleaned.yaml"):
         self.root = root
         self.root.title(f"YOLO Validator V18 (Red Text & Shift-Pan)")
         self.root.geometry("1600x900")
+        self.startup = StartupTimer(STARTUP_T0)
+        self.startup.mark("imports")
         
         # --- Config ---
         self.yaml_filename = yaml_filename
         self.yaml_path = self.find_yaml_path()
-        self.classes = self.load_classes()
-        self.image_paths = self.load_images()
+        self.classes = []          # filled by load_class_data, off the Tk thread
+        self.class_index = None
+        threading.Thread(target=self.load_class_data, daemon=True).start()
+        self.image_paths = []
+        self.scanner = self.start_discovery()
         
         # --- State ---
         self.current_idx = 0
         self.boxes = []
+        self.grid = BoxGrid(self.boxes)
         self.selected_box_idx = None
         self.custom_label_dir = None
         self.unsaved_changes = False
+        self.loaded = None   # (image path, label path, label stat key) the boxes were read from
         self.mode = "EDIT"
         self.shift_pressed = False # New state for panning
         
         # View State
         self.scale = 1.0
         self.img_id = None
-        
-        if not self.image_paths:
-            messagebox.showerror("Error", "No images found! Run in dataset folder.")
-            root.destroy()
-            return
+        self.img_cache = ImageCache()
+        self.tiles = TileCache()
+        self.pyramid = None
+        base = os.path.dirname(self.yaml_path) if self.yaml_path else os.getcwd()
+        self.large = LargeImages(os.path.join(cache_dir(base), "large"))
+        self.large_poll = None
+        self.thumbs = None
+        self.overview = None
 
         # --- GUI Layout ---
         
@@ -42,23 +76,17 @@ class YoloValidatorV18:
         side.pack(side=tk.RIGHT, fill=tk.Y)
         
         self.lbl_status = ttk.Label(side, text="Status: Safe", foreground="green", font=("Arial", 10, "bold"))
-        self.lbl_status.pack(pady=(0, 15))
+        self.lbl_status.pack(pady=(0, 5))
+        self.lbl_cache = ttk.Label(side, text="", foreground="gray")
+        self.lbl_cache.pack(pady=(0, 10))
 
         ttk.Label(side, text="ACTIVE OBJECTS:", font=("Arial", 9, "bold")).pack(anchor="w")
         self.list_active = Listbox(side, height=10, width=40, font=("Consolas", 10), bg="#e6f2ff")
         self.list_active.pack(fill=tk.X, pady=(0, 15))
 
         ttk.Label(side, text="LEGEND (ID: Name):", font=("Arial", 9, "bold")).pack(anchor="w")
-        legend_frame = ttk.Frame(side)
-        legend_frame.pack(fill=tk.BOTH, expand=True)
-        sb = Scrollbar(legend_frame)
-        sb.pack(side=tk.RIGHT, fill=tk.Y)
-        self.list_all = Listbox(legend_frame, height=20, width=40, yscrollcommand=sb.set, font=("Consolas", 9))
-        self.list_all.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        sb.config(command=self.list_all.yview)
-        
-        for i, c in enumerate(self.classes):
-            self.list_all.insert(tk.END, f"[{i}] {c}")
+        self.legend = ClassLegend(side, height=20, width=40, font=("Consolas", 9))
+        self.legend.pack(fill=tk.BOTH, expand=True)
 
         # 2. Top Toolbar
         ctrl = ttk.Frame(root, padding=5, relief="raised")
@@ -74,7 +102,7 @@ class YoloValidatorV18:
         self.ent_page.pack(side=tk.LEFT, padx=2)
         self.ent_page.bind("<Return>", self.jump_to_page)
         
-        self.lbl_total = ttk.Label(ctrl, text=f"/ {len(self.image_paths)}")
+        self.lbl_total = ttk.Label(ctrl, text="/ ?")
         self.lbl_total.pack(side=tk.LEFT, padx=(0, 5))
         
         ttk.Button(ctrl, text="Go", width=3, command=self.jump_to_page).pack(side=tk.LEFT)
@@ -90,6 +118,7 @@ class YoloValidatorV18:
         self.btn_mode.pack(side=tk.LEFT, padx=15)
         
         ttk.Button(ctrl, text="SAVE", command=self.manual_save).pack(side=tk.LEFT, padx=20)
+        ttk.Button(ctrl, text="▦ Grid (G)", command=self.open_overview).pack(side=tk.LEFT)
         ttk.Button(ctrl, text="DELETE BOX", command=self.delete_box).pack(side=tk.RIGHT, padx=10)
         ttk.Button(ctrl, text="📂 Folder", command=self.set_label_folder).pack(side=tk.RIGHT)
 
@@ -100,6 +129,7 @@ class YoloValidatorV18:
         self.canvas.pack(fill=tk.BOTH, expand=True)
 
         # Bindings
+        self.canvas.bind("<Configure>", lambda e: self.refresh_view())
         self.canvas.bind("<Button-1>", self.on_left_click)
         self.canvas.bind("<B1-Motion>", self.on_left_drag)
         self.canvas.bind("<ButtonRelease-1>", self.on_left_release)
@@ -118,8 +148,15 @@ class YoloValidatorV18:
         self.root.bind("<d>", lambda e: self.next_image())
         self.root.bind("<Delete>", lambda e: self.delete_box())
         self.root.bind("<Control-s>", lambda e: self.manual_save())
+        self.root.bind("<g>", lambda e: self.open_overview())
 
-        self.root.after(100, self.load_current_image)
+        base = os.path.dirname(self.yaml_path) if self.yaml_path else os.getcwd()
+        self.perf = PerfOverlay(self.root, self.canvas, cache_dir(base), status=lambda t: self.lbl_info.config(text=t, foreground="gray"))
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(50, self.poll_discovery)
+        self.root.after(50, self.poll_classes)
+        self.root.after(2000, self.poll_disk)
+        self.startup.mark("window")
 
     # --- Setup ---
     def find_yaml_path(self):
@@ -129,31 +166,45 @@ class YoloValidatorV18:
         if yamls: return os.path.abspath(yamls[0])
         return None
 
-    def load_classes(self):
-        defaults = [f"Class {i}" for i in range(100)]
-        if not self.yaml_path: return defaults
-        try:
-            with open(self.yaml_path, 'r') as f:
-                data = yaml.safe_load(f)
-            names = data.get('names', [])
-            if isinstance(names, dict):
-                max_id = max(names.keys())
-                ret = ["Unknown"] * (max_id + 1)
-                for k,v in names.items(): ret[k] = v
-                return ret
-            elif isinstance(names, list): return names
-            return defaults
-        except: return defaults
-
-    def load_images(self):
-        exts = ('.jpg', '.jpeg', '.png', '.bmp')
-        files = []
-        base = os.getcwd()
-        if self.yaml_path: base = os.path.dirname(self.yaml_path)
-        for root, dirs, f in os.walk(base):
-            for file in f:
-                if file.lower().endswith(exts): files.append(os.path.join(root, file))
-        return sorted(files)
+    def load_classes(self): return load_class_names(self.yaml_path, missing="Unknown")
+
+    def load_class_data(self):
+        # Worker thread: a cold 50k-name YAML still takes a moment, and so does its search index.
+        self.classes = self.load_classes()
+        self.class_index = ClassIndex(self.classes)
+
+    def poll_classes(self):
+        if self.class_index is None: self.root.after(50, self.poll_classes); return
+        self.legend.set_names(self.classes)
+        if self.image_paths: self.update_active_legend()
+        self.startup.mark("classes")
+
+    def start_discovery(self):
+        base = os.path.dirname(self.yaml_path) if self.yaml_path else os.getcwd()
+        return DatasetScanner(dataset_roots(self.yaml_path), os.path.join(cache_dir(base), "manifest.txt")).start()
+
+    def poll_discovery(self):
+        # Images stream in while the scan runs; the first one is shown as soon as it is found.
+        done = self.scanner.done
+        new = self.scanner.drain()
+        first = not self.image_paths
+        if done:
+            cur = self.image_paths[self.current_idx] if self.image_paths else None
+            self.image_paths = self.scanner.paths
+            if not self.image_paths:
+                messagebox.showerror("Error", "No images found! Run in dataset folder.")
+                self.root.destroy()
+                return
+            if cur:
+                self.current_idx = bisect.bisect_left(self.image_paths, cur)
+                self.ent_page.delete(0, tk.END)
+                self.ent_page.insert(0, str(self.current_idx + 1))
+            self.lbl_total.config(text=f"/ {len(self.image_paths)}")
+        else:
+            self.image_paths.extend(new)
+            self.lbl_total.config(text=f"/ {len(self.image_paths)}+")
+            self.root.after(100, self.poll_discovery)
+        if first and self.image_paths: self.load_current_image()
 
     def set_label_folder(self):
         f = filedialog.askdirectory()
@@ -165,6 +216,8 @@ class YoloValidatorV18:
             p = os.path.join(self.custom_label_dir, base + ".txt")
             if os.path.exists(p): return p
         d = os.path.dirname(img_path)
+        pack = find_pack(d)
+        if pack: return pack_label_path(pack, base) if open_pack(pack).has(base) else None
         p = os.path.join(os.path.dirname(d), 'labels', base + ".txt")
         if os.path.exists(p): return p
         p = os.path.join(d, base + ".txt")
@@ -173,7 +226,11 @@ class YoloValidatorV18:
 
     # --- Loading ---
     def load_current_image(self):
-        if self.unsaved_changes: self.save_annotations()
+        if self.unsaved_changes and not self.save_annotations(leaving=True):
+            # Kept the changed file and the edits: stay on the image they belong to.
+            if self.loaded and self.loaded[0] in self.image_paths: self.current_idx = self.image_paths.index(self.loaded[0])
+            self.ent_page.delete(0, tk.END); self.ent_page.insert(0, str(self.current_idx + 1))
+            self.lbl_status.config(text="Status: UNSAVED (label changed on disk)", foreground="red"); return
         self.unsaved_changes = False
         self.update_status()
 
@@ -183,8 +240,11 @@ class YoloValidatorV18:
         self.ent_page.delete(0, tk.END)
         self.ent_page.insert(0, str(self.current_idx + 1))
         
-        self.pil_base = Image.open(img_path)
-        self.orig_w, self.orig_h = self.pil_base.size
+        self.pyramid = TilePyramid(img_path, self.img_cache.get, self.tiles, full=self.img_cache.peek(img_path), large=self.large)
+        self.orig_w, self.orig_h = self.pyramid.size
+        near = [self.current_idx + k for k in range(1, PREFETCH_AHEAD+1)] + [self.current_idx - k for k in range(1, PREFETCH_AHEAD+1)]
+        self.img_cache.prefetch([self.image_paths[i] for i in near if 0 <= i < len(self.image_paths)])
+        self.lbl_cache.config(text=self.img_cache.status_text())
         
         if self.current_idx == 0:
             cw = self.canvas.winfo_width() or 1000
@@ -196,44 +256,95 @@ class YoloValidatorV18:
         
         lbl = self.find_label_path(img_path)
         name = os.path.basename(img_path)
+        self.loaded = (img_path, lbl, stat_key(lbl) if lbl else None)
         
         if lbl:
             self.lbl_info.config(text=f"{name} | Labels Found", foreground="green")
-            try:
-                with open(lbl, 'r') as f:
-                    for line in f:
-                        parts = line.replace(',', ' ').split()
-                        if len(parts) >= 5:
-                            cls = int(float(parts[0]))
-                            cx, cy, w, h = map(float, parts[1:5])
-                            if cx > 1 or cy > 1:
-                                cx /= self.orig_w; cy /= self.orig_h; w /= self.orig_w; h /= self.orig_h
-                            self.boxes.append([cls, cx, cy, w, h])
-            except: pass
+            self.boxes = self.read_boxes(lbl)
         else:
             self.lbl_info.config(text=f"{name} | NO LABELS", foreground="red")
+        self.grid = BoxGrid(self.boxes)
 
         self.redraw_image()
         self.redraw_boxes()
         self.update_active_legend()
+        if not self.pyramid.ready(): self.poll_large()
+        if "ready" not in self.startup.marks:
+            self.startup.mark("ready")
+            self.lbl_cache.config(text=f"Startup: {self.startup.text()}")
+            self.startup.report(cache_dir(os.path.dirname(self.yaml_path) if self.yaml_path else os.getcwd()), "v18")
+
+    def poll_large(self):
+        # A large image shows up once its one-time level build is done.
+        if self.large_poll: self.root.after_cancel(self.large_poll); self.large_poll = None
+        src = self.pyramid.source
+        if src is None or src.ready():
+            found = self.find_label_path(src.path) if src else None
+            if src: self.lbl_info.config(text=f"{os.path.basename(src.path)} | {'Labels Found' if found else 'NO LABELS'}", foreground="green" if found else "red")
+            self.redraw_visible(); return
+        if src.error: self.lbl_info.config(text=f"Cannot prepare large image: {src.error}", foreground="red"); return
+        self.lbl_info.config(text=f"{os.path.basename(src.path)} | Preparing large image... {src.progress():.0%}", foreground="orange")
+        self.large_poll = self.root.after(250, self.poll_large)
+
+    def read_boxes(self, lbl):
+        boxes = []
+        try:
+            if is_pack_path(lbl): rows = read_packed(lbl)
+            else:
+                with open(lbl, 'r') as f: rows = [line.replace(',', ' ').split() for line in f]
+            for parts in rows:
+                if len(parts) >= 5:
+                    cls = int(float(parts[0]))
+                    cx, cy, w, h = map(float, parts[1:5])
+                    if cx > 1 or cy > 1:
+                        cx /= self.orig_w; cy /= self.orig_h; w /= self.orig_w; h /= self.orig_h
+                    boxes.append([cls, cx, cy, w, h])
+        except: pass
+        return boxes
 
     # --- Drawing ---
     def redraw_image(self):
         new_w = int(self.orig_w * self.scale)
         new_h = int(self.orig_h * self.scale)
-        resized = self.pil_base.resize((new_w, new_h), Image.NEAREST) 
-        self.tk_img = ImageTk.PhotoImage(resized)
         self.canvas.delete("all")
-        self.img_id = self.canvas.create_image(0, 0, anchor=tk.NW, image=self.tk_img)
+        self.img_id = None
         self.canvas.config(scrollregion=(0,0, new_w, new_h))
+        self.redraw_visible()
+
+    def redraw_visible(self):
+        # The scrollregion spans the whole scaled image, but only the visible part is rendered.
+        if self.pyramid is None: return
+        vx = self.canvas.canvasx(0); vy = self.canvas.canvasy(0)
+        cw = self.canvas.winfo_width() or 1000
+        ch = self.canvas.winfo_height() or 800
+        out = self.pyramid.render(vx / self.scale, vy / self.scale, self.scale, cw, ch)
+        if out is None: return
+        disp, dx, dy = out
+        with TRACER.span("photoimage"): self.tk_img = photo_image(disp)
+        if self.img_id is None:
+            self.img_id = self.canvas.create_image(vx+dx, vy+dy, anchor=tk.NW, image=self.tk_img)
+            self.canvas.tag_lower(self.img_id)
+        else:
+            self.canvas.coords(self.img_id, vx+dx, vy+dy)
+            self.canvas.itemconfig(self.img_id, image=self.tk_img)
 
     def redraw_boxes(self):
         self.canvas.delete("box")
+        if self.pyramid is None: return
         curr_w = self.orig_w * self.scale
         curr_h = self.orig_h * self.scale
         
-        for i, b in enumerate(self.boxes):
-            cls, cx, cy, w, h = b
+        # Cull to the visible scroll region via the grid
+        vx = self.canvas.canvasx(0); vy = self.canvas.canvasy(0)
+        cw = self.canvas.winfo_width() or 1000
+        ch = self.canvas.winfo_height() or 800
+        visible = self.grid.query(vx/curr_w, vy/curr_h, (vx+cw)/curr_w, (vy+ch)/curr_h)
+        with TRACER.span("canvas.items"): self.draw_boxes(visible, curr_w, curr_h)
+
+    def draw_boxes(self, visible, curr_w, curr_h):
+        show_labels = len(visible) <= LABEL_LIMIT
+        for i in visible:
+            cls, cx, cy, w, h = self.boxes[i]
             sx = cx * curr_w; sy = cy * curr_h
             sw = w * curr_w; sh = h * curr_h
             x1 = sx - sw/2; y1 = sy - sh/2
@@ -246,6 +357,7 @@ class YoloValidatorV18:
             self.canvas.create_rectangle(x1, y1, x2, y2, outline=col, width=wd, tags=("box", f"idx_{i}"))
             
             # --- CHANGED: JUST RED TEXT, NO BACKGROUND ---
+            if not show_labels and not is_sel: continue
             txt = f"{cls}"
             self.canvas.create_text(x1+2, y1-15, text=txt, fill="#FF0000", anchor=tk.NW, font=("Arial", 12, "bold"), tags="box")
 
@@ -272,7 +384,8 @@ class YoloValidatorV18:
 
     # --- Panning (SHIFT based) ---
     def pan_start(self, e): self.canvas.scan_mark(e.x, e.y); self.canvas.config(cursor="fleur")
-    def pan_move(self, e): self.canvas.scan_dragto(e.x, e.y, gain=1)
+    def pan_move(self, e): self.canvas.scan_dragto(e.x, e.y, gain=1); self.refresh_view()
+    def refresh_view(self): self.redraw_visible(); self.redraw_boxes()
 
     def enable_shift_pan(self, e):
         self.shift_pressed = True
@@ -294,11 +407,7 @@ class YoloValidatorV18:
         
         if self.mode == "EDIT":
             nx = cx / curr_w; ny = cy / curr_h
-            found = None
-            for i, b in enumerate(self.boxes):
-                bcx, bcy, bw, bh = b[1:]
-                if abs(bcx-nx) < bw/2 and abs(bcy-ny) < bh/2: found = i
-            self.selected_box_idx = found
+            self.selected_box_idx = self.grid.hit(nx, ny)
             self.redraw_boxes()
         elif self.mode == "DRAW": self.draw_start = (cx, cy)
 
@@ -327,6 +436,7 @@ class YoloValidatorV18:
             w = nx2-nx1; h = ny2-ny1; cx = nx1 + w/2; cy = ny1 + h/2
             self.boxes.append([0, cx, cy, w, h])
             self.selected_box_idx = len(self.boxes)-1
+            self.grid.insert(self.selected_box_idx)
             self.mark_modified()
             self.redraw_boxes()
             self.update_active_legend()
@@ -335,10 +445,7 @@ class YoloValidatorV18:
         cx = self.canvas.canvasx(e.x); cy = self.canvas.canvasy(e.y)
         curr_w = self.orig_w * self.scale; curr_h = self.orig_h * self.scale
         nx = cx / curr_w; ny = cy / curr_h
-        found = None
-        for i, b in enumerate(self.boxes):
-            bcx, bcy, bw, bh = b[1:]
-            if abs(bcx-nx) < bw/2 and abs(bcy-ny) < bh/2: found = i
+        found = self.grid.hit(nx, ny)
         if found is not None:
             self.selected_box_idx = found; self.redraw_boxes()
             m = Menu(self.root, tearoff=0)
@@ -348,18 +455,10 @@ class YoloValidatorV18:
 
     def ask_class_input(self):
         if self.selected_box_idx is None: return
-        ans = simpledialog.askstring("Class", "Enter Name or ID:")
-        if not ans: return
-        new_id = -1
-        if ans.isdigit(): new_id = int(ans)
-        else:
-            ans = ans.lower()
-            for i, n in enumerate(self.classes):
-                if n.lower() == ans: new_id = i; break
-        if new_id != -1:
-            self.boxes[self.selected_box_idx][0] = new_id
-            self.mark_modified(); self.redraw_boxes(); self.update_active_legend()
-        else: messagebox.showwarning("Error", "Class not found")
+        dlg = AutoSuggestDialog(self.root, "Class", self.classes, self.class_index)
+        if dlg.result is None: return
+        self.boxes[self.selected_box_idx][0] = dlg.result
+        self.mark_modified(); self.redraw_boxes(); self.update_active_legend()
 
     def update_active_legend(self):
         self.list_active.delete(0, tk.END)
@@ -373,28 +472,85 @@ class YoloValidatorV18:
     def update_status(self):
         if self.unsaved_changes: self.lbl_status.config(text="Status: UNSAVED", foreground="red")
         else: self.lbl_status.config(text="Status: Saved", foreground="green")
-    def save_annotations(self):
-        if not self.image_paths: return
-        img_path = self.image_paths[self.current_idx]
+    def save_annotations(self, leaving=False):
+        if not self.image_paths: return False
+        with TRACER.span("save_file"): return self.write_annotations(leaving)
+
+    def write_annotations(self, leaving=False):
+        """Write the boxes to their label file; False when the user kept a version changed on disk.
+        leaving: the user is moving to another image and may also choose to discard the edits (True)."""
+        # The boxes belong to the image they were loaded from, which is not current_idx once navigation moved on.
+        img_path = self.loaded[0] if self.loaded else self.image_paths[self.current_idx]
         lbl = self.find_label_path(img_path)
+        if lbl and self.loaded and lbl == self.loaded[1] and stat_key(lbl) != self.loaded[2]:
+            msg = f"{os.path.basename(lbl)} was changed on disk after it was loaded.\n\nOverwrite it with your edits?"
+            if not leaving:
+                if not messagebox.askyesno("Label Conflict", msg): return False
+            else:
+                keep = messagebox.askyesnocancel("Label Conflict", msg + "\n\nYes: overwrite\nNo: discard your edits\nCancel: stay on this image")
+                if keep is None: return False
+                if not keep: return True
         if not lbl:
-            d = os.path.dirname(os.path.dirname(img_path)); lbl = os.path.join(d, 'labels', os.path.splitext(os.path.basename(img_path))[0] + ".txt")
-            os.makedirs(os.path.dirname(lbl), exist_ok=True)
-        with open(lbl, 'w') as f:
-            for b in self.boxes: f.write(f"{int(b[0])} {b[1]:.6f} {b[2]:.6f} {b[3]:.6f} {b[4]:.6f}\n")
-    def manual_save(self): self.save_annotations(); self.unsaved_changes=False; self.update_status()
+            base = os.path.splitext(os.path.basename(img_path))[0]; pack = find_pack(os.path.dirname(img_path))
+            lbl = pack_label_path(pack, base) if pack else os.path.join(os.path.dirname(os.path.dirname(img_path)), 'labels', base + ".txt")
+        write_labels_atomic(lbl, self.boxes)
+        self.loaded = (img_path, lbl, stat_key(lbl))
+        if self.overview and self.overview.alive: self.overview.invalidate(img_path)
+        return True
+
+    def poll_disk(self):
+        # Labels of the open image rewritten by another program: reload them unless there are unsaved edits.
+        self.root.after(2000, self.poll_disk)
+        if not self.loaded or not self.image_paths or self.loaded[0] != self.image_paths[self.current_idx]: return
+        img_path, lbl, key = self.loaded
+        lbl = self.find_label_path(img_path)
+        new = stat_key(lbl) if lbl else None
+        if new == key: return
+        if self.unsaved_changes:
+            self.lbl_status.config(text="Status: CHANGED ON DISK", foreground="red"); return
+        self.loaded = (img_path, lbl, new)
+        self.boxes = self.read_boxes(lbl) if lbl else []
+        self.selected_box_idx = None; self.grid = BoxGrid(self.boxes)
+        self.redraw_boxes(); self.update_active_legend()
+        self.lbl_status.config(text="Status: Reloaded from disk", foreground="orange")
+    def manual_save(self):
+        # Declining to overwrite a changed file keeps the edits unsaved, so navigating away asks again.
+        if self.save_annotations(): self.unsaved_changes=False; self.update_status()
+        else: self.lbl_status.config(text="Status: CHANGED ON DISK", foreground="red")
     def delete_box(self):
-        if self.selected_box_idx is not None: del self.boxes[self.selected_box_idx]; self.selected_box_idx = None; self.mark_modified(); self.redraw_boxes(); self.update_active_legend()
+        if self.selected_box_idx is not None:
+            del self.boxes[self.selected_box_idx]; self.selected_box_idx = None
+            self.grid = BoxGrid(self.boxes)
+            self.mark_modified(); self.redraw_boxes(); self.update_active_legend()
     def prev_image(self): 
         if self.current_idx>0: self.current_idx-=1; self.load_current_image()
     def next_image(self): 
         if self.current_idx<len(self.image_paths)-1: self.current_idx+=1; self.load_current_image()
+    # --- Overview ---
+    def open_overview(self):
+        if self.overview and self.overview.alive: self.overview.win.lift(); self.overview.show_index(self.current_idx); return
+        if self.thumbs is None:
+            base = os.path.dirname(self.yaml_path) if self.yaml_path else os.getcwd()
+            self.thumbs = ThumbCache(os.path.join(cache_dir(base), "thumbs"))
+        self.overview = ThumbnailGrid(self.root, self.thumbs, lambda: self.image_paths, self.find_label_path,
+                                      self.open_from_overview, current=lambda: self.current_idx)
+
+    def open_from_overview(self, i):
+        self.current_idx = i; self.load_current_image()
+
+    def on_close(self):
+        self.large.shutdown()
+        if self.thumbs: self.thumbs.shutdown()
+        close_packs()
+        if TRACER.enabled: self.perf.export()
+        self.img_cache.shutdown()
+        self.root.destroy()
     def toggle_mode(self):
         self.mode = "DRAW" if self.mode == "EDIT" else "EDIT"
         self.btn_mode.config(text=f"MODE: {self.mode}")
         self.canvas.config(cursor="cross" if self.mode=="DRAW" else "arrow")
 
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = YoloValidatorV18(root, "data_cleaned.yaml")
-    root.mainloop()
\ No newline at end of file
+    SPLASH.destroy()
+    app = YoloValidatorV18(ROOT, "data_cleaned.yaml")
+    ROOT.mainloop()
\ No newline at end of file
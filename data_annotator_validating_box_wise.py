@@ -1,59 +1,94 @@
+import time
+STARTUP_T0 = time.perf_counter()
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, Listbox, simpledialog
-from PIL import Image, ImageTk
-import yaml
+if __name__ == "__main__":
+    # Put a window up before the heavy imports below (numpy, PIL); the app is built into it.
+    ROOT = tk.Tk(); SPLASH = ttk.Label(ROOT, text="Starting...", padding=40); SPLASH.pack(); ROOT.update()
 import os
+import re
 import glob
+import getpass
+import threading
+import numpy as np
+from label_index import LabelIndex, cache_dir, resolve_label_path, stat_key, parse_label_file, is_pixel_box, pixel_rows
+from label_watch import LabelWatcher, same_boxes
+from label_pack import close_packs
+from box_store import BoxStore
+from image_cache import ImageCache
+from tile_pyramid import TileCache
+from large_image import LargeImages
+from frame_scheduler import FrameScheduler
+from label_journal import LabelWriter, LabelConflict, rewrite_labels
+from dataset_discovery import DatasetScanner, dataset_roots, load_class_names
+from perf_trace import TRACER, PerfOverlay, StartupTimer
+from undo_history import UndoHistory, modify_record, delete_record, add_record, apply_record, leaf_records, BULK_OPS
+from bulk_ops import bulk_remap, bulk_delete
+from sanity_scan import SanityScanner, write_report
+from review_state import ReviewDB, ReviewIndex, apply_rows, UNREVIEWED, ACCEPTED, MODIFIED
+from box_query import parse_query, run_query, query_mask, QUERY_HELP
+from class_search import ClassIndex, AutoSuggestDialog
+from work_leases import WorkLeases
+from flashcard_lookahead import FlashcardLookahead, view_for
+
+PREFETCH_AHEAD = 3
 
-# --- Helper: Auto Suggest ---
-class AutoSuggestDialog(tk.Toplevel):
-    def __init__(self, parent, title, classes):
+def photo_image(img):
+    from PIL import ImageTk   # imported on first draw, not at startup
+    return ImageTk.PhotoImage(img)
+
+# --- Helper: Bulk Edit ---
+class BulkOpDialog(tk.Toplevel):
+    """Pick boxes with a queue query and remap them to one class or delete them."""
+    def __init__(self, parent, classes, query_text, count_fn):
         super().__init__(parent)
-        self.title(title)
-        self.geometry("300x250")
+        self.title("Bulk Edit")
         self.classes = classes
+        self.count_fn = count_fn
         self.result = None
-        x = parent.winfo_rootx() + 50; y = parent.winfo_rooty() + 50
-        self.geometry(f"+{x}+{y}")
-        
-        tk.Label(self, text="Type Class Name or ID:").pack(pady=5)
-        self.entry = tk.Entry(self)
-        self.entry.pack(fill=tk.X, padx=10)
-        self.entry.bind("<KeyRelease>", self.on_key_release)
-        self.entry.bind("<Return>", self.on_enter)
-        self.entry.bind("<Down>", self.focus_list)
-        self.entry.focus_set()
-        
-        self.listbox = Listbox(self)
-        self.listbox.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
-        self.listbox.bind("<Double-Button-1>", self.on_list_click)
-        self.listbox.bind("<Return>", self.on_list_enter)
-        
-        self.update_list("")
+        self.geometry(f"+{parent.winfo_rootx() + 80}+{parent.winfo_rooty() + 80}")
+
+        tk.Label(self, text="Match boxes (query):").pack(anchor="w", padx=10, pady=(10, 0))
+        self.ent_query = tk.Entry(self, width=50)
+        self.ent_query.pack(fill=tk.X, padx=10)
+        self.ent_query.insert(0, query_text)
+        tk.Label(self, text=QUERY_HELP, fg="gray").pack(anchor="w", padx=10)
+
+        self.action = tk.StringVar(value="remap")
+        row = tk.Frame(self); row.pack(fill=tk.X, padx=10, pady=(10, 0))
+        tk.Radiobutton(row, text="Remap to class:", variable=self.action, value="remap").pack(side=tk.LEFT)
+        self.ent_cls = tk.Entry(row, width=15)
+        self.ent_cls.pack(side=tk.LEFT, padx=5)
+        tk.Radiobutton(self, text="Delete matching boxes", variable=self.action, value="delete").pack(anchor="w", padx=10)
+
+        self.lbl_count = tk.Label(self, text="", fg="gray")
+        self.lbl_count.pack(anchor="w", padx=10, pady=5)
+        btns = tk.Frame(self); btns.pack(fill=tk.X, padx=10, pady=10)
+        tk.Button(btns, text="Preview", command=self.preview).pack(side=tk.LEFT)
+        tk.Button(btns, text="Cancel", command=self.destroy).pack(side=tk.RIGHT)
+        tk.Button(btns, text="Apply", command=self.apply).pack(side=tk.RIGHT, padx=5)
+        self.ent_query.focus_set()
         self.transient(parent); self.grab_set(); self.wait_window()
 
-    def update_list(self, filter_text):
-        self.listbox.delete(0, tk.END)
-        filter_text = filter_text.lower()
-        for i, name in enumerate(self.classes):
-            display = f"[{i}] {name}"
-            if filter_text in str(i) or filter_text in name.lower():
-                self.listbox.insert(tk.END, display)
-        if self.listbox.size() > 0: self.listbox.selection_set(0)
-
-    def on_key_release(self, e): 
-        if e.keysym not in ('Up','Down','Return'): self.update_list(self.entry.get())
-    def focus_list(self, e): self.listbox.focus_set()
-    def on_list_click(self, e): self.select_and_close()
-    def on_list_enter(self, e): self.select_and_close()
-    def on_enter(self, e): self.select_and_close()
-    def select_and_close(self):
-        sel = self.listbox.curselection()
-        if sel:
-            import re
-            m = re.match(r"\[(\d+)\]", self.listbox.get(sel[0]))
-            if m: self.result = int(m.group(1))
-        elif self.entry.get().isdigit(): self.result = int(self.entry.get())
+    def parse(self):
+        query = parse_query(self.ent_query.get().strip(), self.classes)
+        target = None
+        if self.action.get() == "remap":
+            ids = parse_query("class:" + self.ent_cls.get().strip(), self.classes)['class'] if self.ent_cls.get().strip() else set()
+            if len(ids) != 1: raise ValueError("enter one target class (id or name)")
+            target = ids.pop()
+        return query, target
+
+    def preview(self):
+        try: query, _ = self.parse()
+        except ValueError as ex: self.lbl_count.config(text=str(ex), fg="red"); return
+        n_boxes, n_images = self.count_fn(query)
+        self.lbl_count.config(text=f"{n_boxes} boxes in {n_images} images", fg="gray")
+
+    def apply(self):
+        try: query, target = self.parse()
+        except ValueError as ex: self.lbl_count.config(text=str(ex), fg="red"); return
+        self.result = (query, self.action.get(), target)
         self.destroy()
 
 # --- Main App ---
@@ -66,15 +101,31 @@ class ValidatorV30:
         # --- Config ---
         self.yaml_filename = yaml_filename
         self.yaml_path = self.find_yaml_path()
-        self.classes = self.load_classes()
-        self.image_paths = self.load_images()
+        self.startup = StartupTimer(STARTUP_T0)
+        self.startup.mark("imports")
+        self.classes = []          # loaded with the index, off the Tk thread
+        self.class_index = None
+        self.image_paths = []
         
         # --- Data ---
-        self.data_cache = {}
-        self.queue = [] 
+        self.store = BoxStore(0)
+        self.lbl_paths = []
+        self.image_ids = {}
         self.q_index = 0
-        self.history = [] 
-        self.history_idx = -1
+        self.queue = None   # row ids of a filtered/sorted queue, or None for every box in image order
+        self.query = None
+        self.issues = {}    # row id -> sanity scan issue codes
+        self.history = None
+        self.review = None
+        self.review_index = None
+        self.watcher = None
+        self.lbl_ids = {}
+        self.edited = set()     # images saved this session: external rewrites of these are conflicts
+        self.conflicts = {}     # img_id -> (disk key, disk boxes)
+        # Shared review: several reviewers on one dataset, each working a leased chunk of images.
+        self.shared = os.environ.get("YOLO_SHARED", "") not in ("", "0")
+        self.leases = None
+        self.chunk = None       # (first, end) image ids of the leased chunk
         
         # --- View State ---
         self.view_x = 0.0
@@ -87,14 +138,23 @@ class ValidatorV30:
         self.last_mouse = (0,0)
         self.shift_pressed = False
         self.tk_img = None
-        
-        if not self.image_paths:
-            messagebox.showerror("Error", "No images found!")
-            root.destroy()
-            return
+        self.img_item = None
+        self.box_items = []
+        self.shown_boxes = 0
+        self.active_items = None
+        self.img_cache = ImageCache()
+        self.tiles = TileCache()
+        self.large = LargeImages(os.path.join(cache_dir(self.dataset_base()), "large"))
+        self.large_poll = None
+        self.lookahead = FlashcardLookahead(self.root, self.img_cache, self.tiles, self.large, photo_image)
 
         self.build_gui()
+        self.perf = PerfOverlay(self.root, self.canvas, cache_dir(self.dataset_base()), status=lambda t: self.lbl_status.config(text=t, foreground="gray"))
+        self.frames = FrameScheduler(self.root, self.redraw)
+        self.writer = None
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         self.root.after(100, self.initialize_data)
+        self.startup.mark("window")
 
     def build_gui(self):
         top = ttk.Frame(self.root, padding=5)
@@ -103,6 +163,19 @@ class ValidatorV30:
         self.lbl_progress.pack(side=tk.LEFT)
         self.lbl_status = ttk.Label(top, text="Ready", foreground="gray")
         self.lbl_status.pack(side=tk.RIGHT, padx=20)
+        self.lbl_cache = ttk.Label(top, text="", foreground="gray")
+        self.lbl_cache.pack(side=tk.RIGHT, padx=10)
+
+        # Queue Query
+        qf = ttk.Frame(self.root, padding=(5, 0, 5, 5))
+        qf.pack(side=tk.TOP, fill=tk.X)
+        ttk.Label(qf, text="Query:").pack(side=tk.LEFT)
+        self.ent_query = ttk.Entry(qf, width=60)
+        self.ent_query.pack(side=tk.LEFT, padx=5)
+        self.ent_query.bind("<Return>", self.apply_query)
+        ttk.Button(qf, text="Apply", command=self.apply_query).pack(side=tk.LEFT, padx=2)
+        ttk.Button(qf, text="Clear", command=self.clear_query).pack(side=tk.LEFT, padx=2)
+        ttk.Label(qf, text=QUERY_HELP, foreground="gray").pack(side=tk.LEFT, padx=10)
 
         # Main Canvas
         self.canvas = tk.Canvas(self.root, bg="#202020", highlightthickness=0)
@@ -136,11 +209,16 @@ class ValidatorV30:
         self.ent_page.pack(side=tk.LEFT)
         self.ent_page.bind("<Return>", self.jump_to_page)
         
-        self.lbl_total_pages = ttk.Label(nav_frame, text=f"/ {len(self.image_paths)}")
+        self.lbl_total_pages = ttk.Label(nav_frame, text="/ ?")
         self.lbl_total_pages.pack(side=tk.LEFT, padx=2)
         
         ttk.Button(nav_frame, text="Go", width=3, command=self.jump_to_page).pack(side=tk.LEFT, padx=2)
 
+        # --- REVIEW STATE ---
+        self.skip_reviewed = tk.BooleanVar(value=False)
+        ttk.Checkbutton(nav_frame, text="Skip reviewed", variable=self.skip_reviewed).pack(side=tk.LEFT, padx=10)
+        ttk.Button(nav_frame, text="Next unreviewed (U)", command=self.jump_to_unreviewed).pack(side=tk.LEFT, padx=2)
+
         # Action Buttons
         act_frame = ttk.Frame(bot)
         act_frame.pack(side=tk.RIGHT)
@@ -151,6 +229,8 @@ class ValidatorV30:
         
         ttk.Button(act_frame, text="DELETE (Del)", command=self.delete_current).pack(side=tk.LEFT, padx=5)
         ttk.Button(act_frame, text="RE-CLASS (C)", command=self.change_class_dialog).pack(side=tk.LEFT, padx=5)
+        ttk.Button(act_frame, text="BULK (B)", command=self.bulk_dialog).pack(side=tk.LEFT, padx=5)
+        ttk.Button(act_frame, text="SANITY SCAN (S)", command=self.start_sanity_scan).pack(side=tk.LEFT, padx=5)
         ttk.Button(act_frame, text="➕ ADD NEW (N)", command=self.toggle_add_mode).pack(side=tk.LEFT, padx=20)
 
         # Bindings
@@ -160,8 +240,12 @@ class ValidatorV30:
         self.root.bind("<Delete>", lambda e: self.delete_current())
         self.root.bind("c", lambda e: self.change_class_dialog())
         self.root.bind("n", lambda e: self.toggle_add_mode())
+        self.root.bind("u", lambda e: self.jump_to_unreviewed())
+        self.root.bind("b", lambda e: self.bulk_dialog())
+        self.root.bind("s", lambda e: self.start_sanity_scan())
         self.root.bind("<Control-z>", lambda e: self.undo())
         self.root.bind("<Control-y>", lambda e: self.redo())
+        self.root.bind("<Control-r>", lambda e: self.resolve_conflicts())
         self.root.bind("<KeyPress-Shift_L>", self.enable_shift)
         self.root.bind("<KeyRelease-Shift_L>", self.disable_shift)
         
@@ -171,6 +255,9 @@ class ValidatorV30:
         self.canvas.bind("<Button-2>", self.start_pan)
         self.canvas.bind("<B2-Motion>", self.do_pan)
         self.canvas.bind("<MouseWheel>", self.on_wheel)
+        # Typing in an entry must not fire the single-key shortcuts bound on the root window.
+        for ent in (self.ent_query, self.ent_page, self.ent_box):
+            ent.bindtags(tuple(t for t in ent.bindtags() if t != str(self.root)))
 
     # --- Initialization ---
     def find_yaml_path(self):
@@ -178,77 +265,153 @@ class ValidatorV30:
         g = glob.glob("*.yaml")
         return os.path.abspath(g[0]) if g else None
 
-    def load_classes(self):
-        defaults = [f"Class {i}" for i in range(100)]
-        if not self.yaml_path: return defaults
-        try:
-            with open(self.yaml_path, 'r') as f: data = yaml.safe_load(f)
-            names = data.get('names', [])
-            if isinstance(names, dict):
-                mx = max(names.keys()); ret = ["?"]*(mx+1)
-                for k,v in names.items(): ret[k]=v
-                return ret
-            return names if isinstance(names, list) else defaults
-        except: return defaults
-
-    def load_images(self):
-        exts = ('.jpg','.png','.jpeg','.bmp')
-        files = []
-        base = os.getcwd()
-        if self.yaml_path: base = os.path.dirname(self.yaml_path)
-        for r, d, f in os.walk(base):
-            for file in f:
-                if file.lower().endswith(exts): files.append(os.path.join(r, file))
-        return sorted(files)
+    def load_classes(self): return load_class_names(self.yaml_path)
+
+    def dataset_base(self):
+        return os.path.dirname(self.yaml_path) if self.yaml_path else os.getcwd()
 
     def initialize_data(self):
-        self.queue = []
-        
-        for img_path in self.image_paths:
-            lbl_path = self.get_label_path(img_path)
-            boxes = []
-            if lbl_path and os.path.exists(lbl_path):
-                with open(lbl_path, 'r') as f:
-                    for line in f:
-                        parts = list(map(float, line.strip().split()))
-                        if len(parts) >= 5: boxes.append(parts)
-            
-            self.data_cache[img_path] = {'lbl_path': lbl_path, 'boxes': boxes}
-            for i in range(len(boxes)): self.queue.append((img_path, i))
-                
-        self.lbl_progress.config(text=f"Loaded {len(self.queue)} boxes.")
-        self.lbl_total_boxes.config(text=f"/ {len(self.queue)}")
+        self.lbl_progress.config(text="Finding images...")
+        self.scanner = DatasetScanner(dataset_roots(self.yaml_path), os.path.join(cache_dir(self.dataset_base()), "manifest.txt"), stream=False)
+        self.journal_path = self.session_path("journal.jsonl")
+        self.indexer = LabelIndex(os.path.join(cache_dir(self.dataset_base()), "label_index.pkl"))
+        self.review = ReviewDB(self.session_path("review_state.db"), self.reviewer_name(), stamp=self.review_stamp)
+        self.index_progress = None
+        self.index_result = None; self.index_error = None; self.recovered = 0; self.replay_conflicts = {}; self.review_rows = []
+        threading.Thread(target=self.run_indexer, daemon=True).start()
+        self.root.after(50, self.poll_indexer)
+
+    def run_indexer(self):
+        try:
+            self.classes = self.load_classes()
+            self.class_index = ClassIndex(self.classes)
+            # Edits journaled by a session that crashed before flushing land on disk before indexing;
+            # files changed on disk since come back as conflicts, settled in poll_indexer.
+            self.recovered, self.replay_conflicts = LabelWriter.replay(self.journal_path)
+            self.scanner.run()
+            self.image_paths = self.scanner.paths
+            self.review_rows = self.review.load()
+            self.index_result = self.indexer.build(self.image_paths, progress=self.on_index_progress)
+        except Exception as ex: self.index_error = ex
+
+    def on_index_progress(self, done, total): self.index_progress = (done, total)
+
+    def read_image_sizes(self, img_ids):
+        # Queries normalize pixel-coordinate boxes by image size; only those images' headers are read.
+        from PIL import Image
+        for i in img_ids:
+            if self.store.img_wh[i].all(): continue
+            try:
+                with Image.open(self.image_paths[i]) as im: self.store.img_wh[i] = im.size
+            except OSError: pass
+
+    def reviewer_name(self):
+        try: return os.environ.get("YOLO_REVIEWER") or getpass.getuser()
+        except Exception: return "unknown"
+
+    def session_path(self, name):
+        """A cache file of this session; one per reviewer in shared mode, where sessions share the cache dir."""
+        if self.shared:
+            stem, ext = os.path.splitext(name)
+            name = f"{stem}.{re.sub(r'[^A-Za-z0-9_.-]', '_', self.reviewer_name())}{ext}"
+        return os.path.join(cache_dir(self.dataset_base()), name)
+
+    def poll_indexer(self):
+        # Tk is not thread-safe: the worker only writes plain attributes, we render them here.
+        if self.index_error is not None:
+            messagebox.showerror("Error", f"Indexing failed: {self.index_error}"); return
+        if self.index_result is None:
+            if self.index_progress is None: self.lbl_progress.config(text=f"Finding images... {self.scanner.count}")
+            else: self.lbl_progress.config(text="Indexing labels... %d/%d" % self.index_progress)
+            self.root.after(100, self.poll_indexer); return
+        if not self.image_paths:
+            messagebox.showerror("Error", "No images found!")
+            self.on_close(); return
+
+        entries = self.index_result; self.index_result = None
+        self.lbl_paths = [entries[p][0] for p in self.image_paths]
+        self.lbl_ids = {p: i for i, p in enumerate(self.lbl_paths)}
+        kept = {}
+        if self.replay_conflicts:
+            if messagebox.askyesno("Recovered Edits", f"{len(self.replay_conflicts)} label files with unsaved edits from the last session were changed on disk since.\n\nYes: apply your edits (overwrite)\nNo: keep the disk versions"):
+                kept = {p: b for p, b in self.replay_conflicts.items() if p in self.lbl_ids}
+                for p in kept:
+                    img = self.image_paths[self.lbl_ids[p]]; entries[img] = (p, entries[img][1], kept[p])
+            elif os.path.exists(self.journal_path): os.remove(self.journal_path)
+            self.replay_conflicts = {}
+        self.watcher = LabelWatcher(self.lbl_paths, [entries[p][1] for p in self.image_paths])
+        for i, p in enumerate(self.image_paths):
+            self.image_ids[p] = i; self.image_ids.setdefault(os.path.basename(p), i)
+        self.store = BoxStore.from_boxes([entries[p][2] for p in self.image_paths])
+        self.read_image_sizes(self.store.pixel_images())
+        self.indexer.entries = {}
+        apply_rows(self.store, self.image_ids, self.review_rows, label_key=lambda p: entries[p][1] if p in entries else None)
+        self.review_rows = []
+        self.review_index = ReviewIndex(self.store)
+        self.writer = LabelWriter(self.journal_path, guard=self.watcher)
+        for p, boxes in kept.items(): self.writer.write(p, boxes)
+        self.history = UndoHistory(self.session_path("session_history.jsonl"),
+                                   encode=lambda i: self.image_paths[i], decode=self.image_ids.get,
+                                   stamp=lambda i: stat_key(self.lbl_paths[i]))
+        self.history.load()
+
+        self.lbl_status.config(text=f"Index: {self.indexer.reparsed} files re-parsed")
+        if self.recovered: self.lbl_status.config(text=f"Recovered {self.recovered} label files from journal", foreground="orange")
+        self.lbl_progress.config(text=f"Loaded {len(self.store)} boxes.")
+        self.lbl_total_pages.config(text=f"/ {len(self.image_paths)}")
+        self.lbl_total_boxes.config(text=f"/ {len(self.store)}")
+        self.root.after(1000, self.poll_changes)
+        if self.shared:
+            self.leases = WorkLeases(os.path.join(cache_dir(self.dataset_base()), "leases"), len(self.image_paths), self.reviewer_name())
+            self.next_chunk(); self.root.after(5000, self.poll_lease); return
+        # Resume at the first box nobody has reviewed yet.
+        q = self.review_index.next_unreviewed(0)
+        self.q_index = q if q is not None else 0
         self.load_current_flashcard()
 
-    def get_label_path(self, img_path):
-        base = os.path.splitext(os.path.basename(img_path))[0]
-        d = os.path.dirname(img_path)
-        p1 = os.path.join(os.path.dirname(d), 'labels', base+".txt")
-        if os.path.exists(p1): return p1
-        return os.path.join(d, base+".txt")
+    def get_label_path(self, img_path): return resolve_label_path(img_path)
 
     # --- Core Logic ---
+    def current(self):
+        """(img_id, local box index) of the active flashcard."""
+        if self.queue is None: return self.store.locate(self.q_index)
+        return self.store.local_index(self.queue[self.q_index])
+
+    def queue_len(self): return len(self.store) if self.queue is None else len(self.queue)
+
+    def goto_box(self, img_id, local):
+        """Make (img_id, local) the active flashcard in whichever queue is active."""
+        if self.queue is None: self.q_index = self.store.global_index(img_id, local)
+        else:
+            row = self.store.row(img_id, local)
+            hit = np.flatnonzero(self.queue == row)
+            if len(hit): self.q_index = int(hit[0])
+            else: self.queue = np.insert(self.queue, self.q_index, row)
+        self.load_current_flashcard()
+
     def load_current_flashcard(self):
-        if not self.queue: return
-        if self.q_index >= len(self.queue): self.q_index = len(self.queue)-1
+        n = self.queue_len()
+        if not n: return
+        if self.q_index >= n: self.q_index = n-1
         if self.q_index < 0: self.q_index = 0
         
-        img_path, box_idx = self.queue[self.q_index]
+        img_id, box_idx = self.current()
+        img_path = self.image_paths[img_id]
         
         # Load Image
         if not hasattr(self, 'cur_img_path') or self.cur_img_path != img_path:
-            self.cur_img_path = img_path
-            self.pil_img = Image.open(img_path)
-            self.img_w, self.img_h = self.pil_img.size
+            self.cur_img_path = img_path; self.cur_img_id = img_id
+            self.pyramid = self.lookahead.pyramid(img_path)
+            self.img_w, self.img_h = self.pyramid.size
             self.tk_img = None
+            if not self.pyramid.ready(): self.poll_large()
             self.focus_view(box_idx)
+            self.img_cache.prefetch([self.image_paths[i] for i in self.neighbour_images(img_id)])
+            self.lbl_cache.config(text=self.img_cache.status_text())
             
             # Update Page Number
-            try:
-                page_idx = self.image_paths.index(img_path) + 1
-                self.ent_page.delete(0, tk.END)
-                self.ent_page.insert(0, str(page_idx))
-            except: pass
+            self.ent_page.delete(0, tk.END)
+            self.ent_page.insert(0, str(img_id + 1))
         else:
             self.focus_view(box_idx)
 
@@ -256,128 +419,183 @@ class ValidatorV30:
         self.ent_box.delete(0, tk.END)
         self.ent_box.insert(0, str(self.q_index + 1))
 
-        self.redraw()
+        row = self.store.row(img_id, box_idx)
+        cw = self.canvas.winfo_width() or 1000
+        ch = self.canvas.winfo_height() or 800
+        self.redraw(self.lookahead.take(self.lookahead.key(row, self.store.xywh[row], cw, ch)))
+        self.schedule_lookahead(cw, ch)
         
-        box_data = self.data_cache[img_path]['boxes'][box_idx]
-        cls = int(box_data[0])
+        cls = int(self.store.cls[row])
         cls_name = self.classes[cls] if cls < len(self.classes) else "?"
-        self.lbl_progress.config(text=f"Box {self.q_index+1}/{len(self.queue)} : [{cls}] {cls_name}")
+        state = ("", " (reviewed)", " (modified)")[self.store.status[row]]
+        if row in self.issues: state += "  ⚠ " + ", ".join(self.issues[row])
+        self.lbl_progress.config(text=f"Box {self.q_index+1}/{n} : [{cls}] {cls_name}{state}"
+                                      f"   Reviewed {self.review_index.reviewed()}/{len(self.store)}")
+        if "ready" not in self.startup.marks:
+            self.startup.mark("ready")
+            self.lbl_cache.config(text=f"Startup: {self.startup.text()}")
+            self.startup.report(cache_dir(self.dataset_base()), "v30")
+
+    def schedule_lookahead(self, cw, ch):
+        """Have the next flashcards Space will show rendered in the background."""
+        cards = []; q = self.q_index
+        for _ in range(self.lookahead.depth):
+            q = self.next_unreviewed(q + 1) if self.skip_reviewed.get() and self.review_index else q + 1
+            if q is None or q >= self.queue_len(): break
+            row = self.queue[q] if self.queue is not None else self.store.row(*self.store.locate(q))
+            box = self.store.xywh[row]
+            cards.append((self.lookahead.key(row, box, cw, ch), self.image_paths[int(self.store.img[row])], box.tolist()))
+        self.lookahead.schedule(cards, cw, ch)
+
+    def neighbour_images(self, img_id, n=PREFETCH_AHEAD):
+        """Next n image ids in queue order, then the previous n."""
+        if self.queue is not None:
+            # Filtered queue: look at a window of queued boxes on either side.
+            near = lambda rows: list(dict.fromkeys(i for i in self.store.img[rows].tolist() if i != img_id))[:n]
+            w = 64 * n
+            return near(self.queue[self.q_index+1:self.q_index+1+w]) + near(self.queue[max(self.q_index-w, 0):self.q_index][::-1])
+        ahead, behind = [], []
+        q_next = self.store.boxes_before(img_id) + int(self.store.counts[img_id])
+        q_prev = self.store.boxes_before(img_id) - 1
+        for _ in range(n):
+            if q_next < len(self.store):
+                i = self.store.locate(q_next)[0]; ahead.append(i); q_next += int(self.store.counts[i])
+            if q_prev >= 0:
+                i = self.store.locate(q_prev)[0]; behind.append(i); q_prev = self.store.boxes_before(i) - 1
+        return ahead + behind
 
     def jump_to_page(self, event=None):
-        try:
-            page = int(self.ent_page.get())
-            if 1 <= page <= len(self.image_paths):
-                target_img = self.image_paths[page-1]
-                found_idx = -1
-                for i, (path, box_i) in enumerate(self.queue):
-                    if path == target_img: found_idx = i; break
-                
-                if found_idx != -1:
-                    self.q_index = found_idx
-                    self.load_current_flashcard()
-                else: messagebox.showinfo("Info", f"Page {page} has no boxes.")
-            else: messagebox.showwarning("Error", f"Page range: 1-{len(self.image_paths)}")
-        except: pass
+        # Accepts a page number or an image file name; both resolve in O(log N).
+        txt = self.ent_page.get().strip()
+        try: page = int(txt)
+        except ValueError:
+            img_id = self.image_ids.get(txt)
+            if img_id is None: messagebox.showwarning("Error", f"No image named {txt}"); return
+            page = img_id + 1
+        if not 1 <= page <= len(self.image_paths):
+            messagebox.showwarning("Error", f"Page range: 1-{len(self.image_paths)}"); return
+        if self.queue is not None:
+            hit = np.flatnonzero(self.store.img[self.queue] == page-1)
+            if not len(hit): messagebox.showinfo("Info", f"No queued boxes on page {page}."); return
+            self.q_index = int(hit[0]); self.load_current_flashcard(); return
+        img_id = self.store.first_image_with_boxes(page-1)
+        if img_id is None: messagebox.showinfo("Info", f"No boxes on page {page} or after it."); return
+        if img_id != page-1: self.lbl_status.config(text=f"Page {page} has no boxes, showing page {img_id+1}", foreground="orange")
+        self.q_index = self.store.boxes_before(img_id)
+        self.load_current_flashcard()
 
     def jump_to_box_global(self, event=None):
         try:
             box_num = int(self.ent_box.get())
-            if 1 <= box_num <= len(self.queue):
+            if 1 <= box_num <= self.queue_len():
                 self.q_index = box_num - 1
                 self.load_current_flashcard()
-            else: messagebox.showwarning("Error", f"Box range: 1-{len(self.queue)}")
+            else: messagebox.showwarning("Error", f"Box range: 1-{self.queue_len()}")
         except: pass
 
     def focus_view(self, box_idx):
-        boxes = self.data_cache[self.cur_img_path]['boxes']
-        if box_idx >= len(boxes): return
-        cls, cx, cy, w, h = boxes[box_idx]
-        if cx > 1: cx/=self.img_w; cy/=self.img_h; w/=self.img_w; h/=self.img_h
-        
+        rows = self.store.rows(self.cur_img_id)
+        if box_idx >= len(rows): return
         cw = self.canvas.winfo_width() or 1000
         ch = self.canvas.winfo_height() or 800
-        
-        target_w = w * self.img_w
-        target_h = h * self.img_h
-        
-        scale_w = cw / (target_w * 3.0)
-        scale_h = ch / (target_h * 3.0)
-        self.zoom = min(max(min(scale_w, scale_h), 0.2), 10.0)
-        
-        center_x = cx * self.img_w
-        center_y = cy * self.img_h
-        self.view_x = center_x - (cw / 2 / self.zoom)
-        self.view_y = center_y - (ch / 2 / self.zoom)
+        # Same view as the lookahead renders for this box.
+        self.view_x, self.view_y, self.zoom = view_for(self.store.xywh[rows[box_idx]].tolist(), self.img_w, self.img_h, cw, ch)
 
-    def redraw(self):
-        self.canvas.delete("all")
+    def redraw(self, prepared=None):
+        # Retained scene: items are created once and moved with coords/itemconfig.
+        self.frames.cancel()
+        if not hasattr(self, 'cur_img_path'): return
+        self.canvas.delete("temp")
         cw = self.canvas.winfo_width() or 1000
         ch = self.canvas.winfo_height() or 800
         
-        x1 = max(0, int(self.view_x))
-        y1 = max(0, int(self.view_y))
-        x2 = min(self.img_w, int(self.view_x + cw / self.zoom))
-        y2 = min(self.img_h, int(self.view_y + ch / self.zoom))
-        
-        if x2 > x1 and y2 > y1:
-            crop = self.pil_img.crop((x1, y1, x2, y2))
-            disp_w = int((x2 - x1) * self.zoom)
-            disp_h = int((y2 - y1) * self.zoom)
-            self.tk_img = ImageTk.PhotoImage(crop.resize((disp_w, disp_h), Image.NEAREST))
-            draw_x = int((x1 - self.view_x) * self.zoom)
-            draw_y = int((y1 - self.view_y) * self.zoom)
-            self.canvas.create_image(draw_x, draw_y, anchor=tk.NW, image=self.tk_img)
-
-        img_boxes = self.data_cache[self.cur_img_path]['boxes']
-        current_target_idx = self.queue[self.q_index][1]
-        for i, box in enumerate(img_boxes):
-            self.draw_box_on_canvas(box, is_active=(i == current_target_idx))
-
-    def draw_box_on_canvas(self, data, is_active):
-        cls, cx, cy, w, h = data
-        if cx > 1: cx/=self.img_w; cy/=self.img_h; w/=self.img_w; h/=self.img_h
-        
-        left_img = (cx - w/2) * self.img_w
-        top_img = (cy - h/2) * self.img_h
-        right_img = (cx + w/2) * self.img_w
-        bottom_img = (cy + h/2) * self.img_h
-        
-        x1 = (left_img - self.view_x) * self.zoom
-        y1 = (top_img - self.view_y) * self.zoom
-        x2 = (right_img - self.view_x) * self.zoom
-        y2 = (bottom_img - self.view_y) * self.zoom
-        
-        col = "#00FF00" if is_active else "gray"
-        wd = 3 if is_active else 1
-        tag = "active" if is_active else "passive"
-        
-        self.canvas.create_rectangle(x1, y1, x2, y2, outline=col, width=wd, tags=tag)
-        
-        if is_active:
-            hs = 6
-            self.canvas.create_rectangle(x1-hs, y1-hs, x1+hs, y1+hs, fill="red", tags=("handle", "tl"))
-            self.canvas.create_rectangle(x2-hs, y1-hs, x2+hs, y1+hs, fill="red", tags=("handle", "tr"))
-            self.canvas.create_rectangle(x1-hs, y2-hs, x1+hs, y2+hs, fill="red", tags=("handle", "bl"))
-            self.canvas.create_rectangle(x2-hs, y2-hs, x2+hs, y2+hs, fill="red", tags=("handle", "br"))
-            
-            cls = int(cls)
-            txt = f"[{cls}] {self.classes[cls]}" if cls < len(self.classes) else str(cls)
-            self.canvas.create_text(x1, y1-15, text=txt, fill="red", font=("Arial", 12, "bold"), anchor="w")
+        # A flashcard rendered ahead by the lookahead, else only the tiles under
+        # the viewport, from the pyramid level nearest the zoom
+        out = prepared or self.pyramid.render(self.view_x, self.view_y, self.zoom, cw, ch)
+        if out:
+            disp, draw_x, draw_y = out
+            if prepared: self.tk_img = disp
+            else:
+                with TRACER.span("photoimage"): self.tk_img = photo_image(disp)
+            if self.img_item is None:
+                self.img_item = self.canvas.create_image(draw_x, draw_y, anchor=tk.NW, image=self.tk_img)
+                self.canvas.tag_lower(self.img_item)
+            else:
+                self.canvas.coords(self.img_item, draw_x, draw_y)
+                self.canvas.itemconfig(self.img_item, image=self.tk_img, state="normal")
+        elif self.img_item is not None: self.canvas.itemconfig(self.img_item, state="hidden")
+
+        with TRACER.span("canvas.items"): self.draw_boxes()
+
+    def draw_boxes(self):
+        rows = self.store.rows(self.cur_img_id)
+        current_target_idx = self.current()[1]
+        coords = self.rows_to_canvas(rows)
+        if len(self.box_items) < len(rows):
+            while len(self.box_items) < len(rows):
+                self.box_items.append(self.canvas.create_rectangle(0, 0, 0, 0, outline="gray", width=1, tags="passive"))
+            if self.active_items: self.canvas.tag_raise("active"); self.canvas.tag_raise("handle"); self.canvas.tag_raise("label")
+
+        j = 0
+        for i, xyxy in enumerate(coords):
+            if i == current_target_idx: continue
+            self.canvas.coords(self.box_items[j], *xyxy); j += 1
+        for item in self.box_items[self.shown_boxes:j]: self.canvas.itemconfig(item, state="normal")
+        for item in self.box_items[j:self.shown_boxes]: self.canvas.itemconfig(item, state="hidden")
+        self.shown_boxes = j
+
+        if current_target_idx < len(rows):
+            cls = int(self.store.cls[rows[current_target_idx]])
+            self.draw_active_box(coords[current_target_idx], cls)
+
+    def rows_to_canvas(self, rows):
+        """Canvas (x1, y1, x2, y2) for each row, vectorized over the image's boxes."""
+        b = self.store.xywh[np.asarray(rows, dtype=np.int64)].astype(np.float64)
+        b[pixel_rows(b)] /= (self.img_w, self.img_h, self.img_w, self.img_h)
+        cx, cy, w, h = b.T
+        x1 = ((cx - w/2) * self.img_w - self.view_x) * self.zoom
+        y1 = ((cy - h/2) * self.img_h - self.view_y) * self.zoom
+        x2 = ((cx + w/2) * self.img_w - self.view_x) * self.zoom
+        y2 = ((cy + h/2) * self.img_h - self.view_y) * self.zoom
+        return np.stack([x1, y1, x2, y2], axis=1).tolist()
+
+    def draw_active_box(self, xyxy, cls):
+        x1, y1, x2, y2 = xyxy
+        if self.active_items is None:
+            c = self.canvas
+            self.active_items = {
+                'rect': c.create_rectangle(0, 0, 0, 0, outline="#00FF00", width=3, tags="active"),
+                'tl': c.create_rectangle(0, 0, 0, 0, fill="red", tags=("handle", "tl")),
+                'tr': c.create_rectangle(0, 0, 0, 0, fill="red", tags=("handle", "tr")),
+                'bl': c.create_rectangle(0, 0, 0, 0, fill="red", tags=("handle", "bl")),
+                'br': c.create_rectangle(0, 0, 0, 0, fill="red", tags=("handle", "br")),
+                'text': c.create_text(0, 0, text="", fill="red", font=("Arial", 12, "bold"), anchor="w", tags="label"),
+            }
+        hs = 6
+        it = self.active_items
+        self.canvas.coords(it['rect'], x1, y1, x2, y2)
+        self.canvas.coords(it['tl'], x1-hs, y1-hs, x1+hs, y1+hs)
+        self.canvas.coords(it['tr'], x2-hs, y1-hs, x2+hs, y1+hs)
+        self.canvas.coords(it['bl'], x1-hs, y2-hs, x1+hs, y2+hs)
+        self.canvas.coords(it['br'], x2-hs, y2-hs, x2+hs, y2+hs)
+        txt = f"[{cls}] {self.classes[cls]}" if cls < len(self.classes) else str(cls)
+        self.canvas.coords(it['text'], x1, y1-15)
+        self.canvas.itemconfig(it['text'], text=txt)
 
     # --- Interaction ---
-    def on_resize(self, event): self.redraw()
+    def on_resize(self, event): self.frames.request()
     def start_pan(self, e): self.last_mouse = (e.x, e.y); self.canvas.config(cursor="fleur")
     def do_pan(self, e):
         dx = e.x - self.last_mouse[0]; dy = e.y - self.last_mouse[1]
         self.view_x -= dx / self.zoom; self.view_y -= dy / self.zoom
-        self.last_mouse = (e.x, e.y); self.redraw()
+        self.last_mouse = (e.x, e.y); self.frames.request()
     def on_wheel(self, e):
         f = 1.1 if (e.delta > 0 or e.num == 4) else 0.9
         mx_img = self.view_x + e.x / self.zoom
         my_img = self.view_y + e.y / self.zoom
         self.zoom *= f; self.zoom = max(self.zoom, 0.1)
         self.view_x = mx_img - e.x / self.zoom; self.view_y = my_img - e.y / self.zoom
-        self.redraw()
+        self.frames.request()
 
     def on_click(self, e):
         if self.shift_pressed: self.start_pan(e); return
@@ -401,9 +619,8 @@ class ValidatorV30:
             self.draw_start = None; return
         if self.drag_handle:
             nx = self.view_x + e.x / self.zoom; ny = self.view_y + e.y / self.zoom
-            img_path, box_idx = self.queue[self.q_index]
-            data = self.data_cache[img_path]['boxes'][box_idx]
-            cls, cx, cy, w, h = data
+            img_id, box_idx = self.current()
+            cls, cx, cy, w, h = self.store.get(self.store.row(img_id, box_idx))
             if cx>1: cx/=self.img_w; cy/=self.img_h; w/=self.img_w; h/=self.img_h
             x1 = (cx - w/2) * self.img_w; y1 = (cy - h/2) * self.img_h
             x2 = (cx + w/2) * self.img_w; y2 = (cy + h/2) * self.img_h
@@ -413,29 +630,27 @@ class ValidatorV30:
             if self.drag_handle == "br": x2, y2 = nx, ny
             nw = abs(x2-x1) / self.img_w; nh = abs(y2-y1) / self.img_h
             ncx = (min(x1,x2) + abs(x2-x1)/2) / self.img_w; ncy = (min(y1,y2) + abs(y2-y1)/2) / self.img_h
-            self.update_box_data(img_path, box_idx, [cls, ncx, ncy, nw, nh])
+            self.update_box_data(img_id, box_idx, [cls, ncx, ncy, nw, nh])
             self.drag_handle = None
 
     # --- Data Operations ---
-    def update_box_data(self, img_path, idx, new_data):
-        old_data = self.data_cache[img_path]['boxes'][idx][:]
-        self.data_cache[img_path]['boxes'][idx] = new_data
-        self.save_file(img_path)
-        self.push_history('MODIFY', (img_path, idx, old_data, new_data))
+    def update_box_data(self, img_id, idx, new_data):
+        row = self.store.row(img_id, idx)
+        old_data = self.store.get(row)
+        self.store.set(row, new_data); self.store.status[row] = MODIFIED
+        self.save_file(img_id)
+        self.history.push(modify_record(img_id, idx, old_data, new_data))
         self.redraw()
 
     def delete_current(self):
-        img_path, box_idx = self.queue[self.q_index]
-        old_data = self.data_cache[img_path]['boxes'][box_idx][:]
-        del self.data_cache[img_path]['boxes'][box_idx]
-        del self.queue[self.q_index]
-        for i in range(len(self.queue)):
-            qp, qi = self.queue[i]
-            if qp == img_path and qi > box_idx: self.queue[i] = (qp, qi-1)
-        self.save_file(img_path)
-        self.push_history('DELETE', (img_path, box_idx, old_data, None))
-        if self.q_index >= len(self.queue): self.q_index = len(self.queue)-1
-        self.lbl_total_boxes.config(text=f"/ {len(self.queue)}")
+        if not self.queue_len(): return
+        img_id, box_idx = self.current()
+        row = self.store.delete(img_id, box_idx)
+        if self.queue is not None: self.queue = np.delete(self.queue, self.q_index)
+        self.save_file(img_id)
+        self.history.push(delete_record(img_id, box_idx, self.store.get(row)))
+        if self.q_index >= self.queue_len(): self.q_index = self.queue_len()-1
+        self.lbl_total_boxes.config(text=f"/ {self.queue_len()}")
         self.load_current_flashcard()
 
     def finish_add(self, x1, y1, x2, y2):
@@ -444,75 +659,392 @@ class ValidatorV30:
         ix2 = self.view_x + x2/self.zoom; iy2 = self.view_y + y2/self.zoom
         cx = (ix1+ix2)/2/self.img_w; cy = (iy1+iy2)/2/self.img_h
         w = abs(ix2-ix1)/self.img_w; h = abs(iy2-iy1)/self.img_h
-        dlg = AutoSuggestDialog(self.root, "Class", self.classes)
+        dlg = AutoSuggestDialog(self.root, "Class", self.classes, self.class_index)
         if dlg.result is not None:
-            img_path = self.cur_img_path
+            img_id, box_idx = self.current()
             new_data = [float(dlg.result), cx, cy, w, h]
-            self.data_cache[img_path]['boxes'].append(new_data)
-            self.save_file(img_path)
-            new_idx = len(self.data_cache[img_path]['boxes']) - 1
-            self.queue.insert(self.q_index+1, (img_path, new_idx))
-            self.push_history('ADD', (img_path, new_idx, None, new_data))
-            self.lbl_total_boxes.config(text=f"/ {len(self.queue)}")
+            row = self.store.add(img_id, new_data, box_idx+1)
+            self.store.status[row] = MODIFIED
+            if self.queue is not None: self.queue = np.insert(self.queue, self.q_index+1, row)
+            self.save_file(img_id)
+            self.history.push(add_record(img_id, box_idx+1, new_data))
+            self.lbl_total_boxes.config(text=f"/ {self.queue_len()}")
             self.next_box()
 
     def change_class_dialog(self):
-        img_path, box_idx = self.queue[self.q_index]
-        dlg = AutoSuggestDialog(self.root, "Change Class", self.classes)
+        if not self.queue_len(): return
+        img_id, box_idx = self.current()
+        dlg = AutoSuggestDialog(self.root, "Change Class", self.classes, self.class_index)
         if dlg.result is not None:
-            data = self.data_cache[img_path]['boxes'][box_idx]
-            new_data = data[:]
+            new_data = self.store.get(self.store.row(img_id, box_idx))
             new_data[0] = float(dlg.result)
-            self.update_box_data(img_path, box_idx, new_data)
+            self.update_box_data(img_id, box_idx, new_data)
 
-    def save_file(self, img_path):
-        data = self.data_cache[img_path]
-        if not os.path.exists(os.path.dirname(data['lbl_path'])): os.makedirs(os.path.dirname(data['lbl_path']))
-        with open(data['lbl_path'], 'w') as f:
-            for b in data['boxes']: f.write(f"{int(b[0])} {b[1]:.6f} {b[2]:.6f} {b[3]:.6f} {b[4]:.6f}\n")
-        self.lbl_status.config(text="Saved", foreground="green")
+    def save_file(self, img_id):
+        # Journaled now, written to the label file by the background flusher.
+        with TRACER.span("save_file"): self.writer.write(self.lbl_paths[img_id], self.store.boxes(img_id))
+        self.edited.add(img_id)
+        if self.writer.last_error:
+            path, ex = self.writer.last_error
+            self.lbl_status.config(text=f"Save failed: {os.path.basename(path)} ({ex})", foreground="red")
+        else: self.lbl_status.config(text="Saved", foreground="green")
+        self.sync_review(img_id)
 
-    # --- Undo/Redo ---
-    def push_history(self, type, data):
-        self.history = self.history[:self.history_idx+1]
-        self.history.append({'type': type, 'data': data}); self.history_idx += 1
+    # --- Queue Query ---
+    def apply_query(self, event=None):
+        txt = self.ent_query.get().strip()
+        if not txt: self.clear_query(); return
+        try: query = self.lease_query(parse_query(txt, self.classes))
+        except ValueError as ex: messagebox.showwarning("Query", f"{ex}\n\ne.g. {QUERY_HELP}"); return
+        t = time.perf_counter()
+        with TRACER.span("query"): rows = run_query(self.store, query)
+        ms = (time.perf_counter() - t) * 1000
+        if not len(rows): messagebox.showinfo("Query", "No boxes match."); return
+        self.queue = rows; self.query = query; self.q_index = 0
+        self.lbl_status.config(text=f"Query: {len(rows)} of {len(self.store)} boxes ({ms:.0f} ms)", foreground="gray")
+        self.lbl_total_boxes.config(text=f"/ {self.queue_len()}")
+        self.load_current_flashcard()
 
-    def undo(self):
-        if self.history_idx < 0: return
-        act = self.history[self.history_idx]; self.history_idx -= 1
-        self.handle_history(act, undo=True)
+    def clear_query(self):
+        self.ent_query.delete(0, tk.END)
+        if self.queue is None: return
+        # Stay on the same box in the full queue.
+        pos = self.current() if len(self.queue) else None
+        if self.leases:
+            # Shared review never leaves the leased chunk: back to all of its boxes.
+            self.query = self.lease_query({'sort': []}); self.queue = run_query(self.store, self.query)
+            hit = np.flatnonzero(self.queue == self.store.row(*pos)) if pos else []
+            self.q_index = int(hit[0]) if len(hit) else 0
+        else:
+            self.queue = None; self.query = None
+            self.q_index = self.store.global_index(*pos) if pos else 0
+        self.lbl_total_boxes.config(text=f"/ {self.queue_len()}")
+        self.load_current_flashcard()
 
-    def redo(self):
-        if self.history_idx >= len(self.history)-1: return
-        self.history_idx += 1; self.handle_history(self.history[self.history_idx], undo=False)
-
-    def handle_history(self, act, undo):
-        type = act['type']
-        img_path, idx, old_d, new_d = act['data']
-        if type == 'MODIFY':
-            self.data_cache[img_path]['boxes'][idx] = old_d if undo else new_d
-            self.save_file(img_path); self.redraw()
-        elif type == 'DELETE':
-            if undo:
-                self.data_cache[img_path]['boxes'].insert(idx, old_d)
-                self.queue.insert(self.q_index, (img_path, idx))
-                for i in range(len(self.queue)):
-                    qp, qi = self.queue[i]
-                    if qp == img_path and qi >= idx and i != self.q_index: self.queue[i] = (qp, qi+1)
+    # --- Bulk Edit ---
+    def bulk_dialog(self):
+        if not len(self.store) or getattr(self, 'bulk_busy', False): return
+        def count(query):
+            rows = run_query(self.store, self.lease_query(query))
+            return len(rows), len(np.unique(self.store.img[rows]))
+        dlg = BulkOpDialog(self.root, self.classes, self.ent_query.get().strip(), count)
+        if dlg.result is None: return
+        query, action, target = dlg.result
+        rows = run_query(self.store, self.lease_query(query))
+        if not len(rows): messagebox.showinfo("Bulk Edit", "No boxes match."); return
+        n_images = len(np.unique(self.store.img[rows]))
+        what = f"Delete {len(rows)} boxes" if action == "delete" else \
+               f"Remap {len(rows)} boxes to [{target}] {self.classes[target] if target < len(self.classes) else '?'}"
+        if not messagebox.askyesno("Bulk Edit", f"{what} in {n_images} label files?"): return
+
+        with TRACER.span("bulk.apply"):
+            if action == "delete": recs = bulk_delete(self.store, rows)
             else:
-                del self.data_cache[img_path]['boxes'][idx]; del self.queue[self.q_index]
-                for i in range(len(self.queue)):
-                    qp, qi = self.queue[i]
-                    if qp == img_path and qi > idx: self.queue[i] = (qp, qi-1)
-            self.save_file(img_path); self.load_current_flashcard()
-        elif type == 'ADD':
-            if undo:
-                del self.data_cache[img_path]['boxes'][idx]; del self.queue[self.q_index]; self.save_file(img_path); self.q_index -= 1; self.load_current_flashcard()
+                recs = bulk_remap(self.store, rows, target)
+                self.store.status[rows] = MODIFIED
+        # One transaction, so a single Ctrl+Z reverts the whole bulk edit.
+        self.history.begin()
+        for rec in recs: self.history.push(rec)
+        self.history.commit()
+        self.rewrite_images([r[1] for r in recs], f"Bulk edit: {what.lower()} in {len(recs)} files")
+
+    def rewrite_images(self, img_ids, done_msg):
+        """Write the label files of many images in parallel, behind a modal progress window."""
+        self.writer.flush()   # pending single-box saves must not land after the bulk rewrite
+        self.bulk_busy = True; self.bulk_progress = (0, len(img_ids)); self.bulk_errors = None
+        self.bulk_win = tk.Toplevel(self.root); self.bulk_win.title("Bulk Edit")
+        self.lbl_bulk = ttk.Label(self.bulk_win, text="Writing label files...", padding=20)
+        self.lbl_bulk.pack()
+        self.bulk_win.transient(self.root); self.bulk_win.grab_set()
+        # Box lists are taken here, on the Tk thread; the watcher's guard keeps files changed on disk unwritten.
+        jobs = [(self.lbl_paths[i], self.store.boxes(i)) for i in img_ids]
+        def run():
+            with TRACER.span("bulk.rewrite"):
+                self.bulk_errors = rewrite_labels(jobs, progress=lambda d, n: setattr(self, 'bulk_progress', (d, n)), guard=self.watcher)
+        threading.Thread(target=run, daemon=True).start()
+        self.root.after(100, lambda: self.poll_rewrite(img_ids, done_msg))
+
+    def poll_rewrite(self, img_ids, done_msg):
+        if self.bulk_errors is None:
+            self.lbl_bulk.config(text="Writing label files... %d/%d" % self.bulk_progress)
+            self.root.after(100, lambda: self.poll_rewrite(img_ids, done_msg)); return
+        self.bulk_win.destroy(); self.bulk_busy = False
+        self.edited.update(img_ids)
+        for i in img_ids: self.review.put(self.image_paths[i], self.store.status[list(self.store.rows(i))])
+        self.review_index = ReviewIndex(self.store)
+        errors = [(p, ex) for p, ex in self.bulk_errors if not isinstance(ex, LabelConflict)]
+        for p, ex in self.bulk_errors:
+            if isinstance(ex, LabelConflict): self.conflicts[self.lbl_ids[p]] = (stat_key(p), parse_label_file(p))
+        if errors:
+            # Hand the failures to the journaled writer so they are retried in the background.
+            for p, _ in errors: self.writer.write(p, self.store.boxes(self.lbl_ids[p]))
+            path, ex = errors[0]
+            self.lbl_status.config(text=f"{len(errors)} label files failed: {os.path.basename(path)} ({ex})", foreground="red")
+        elif self.conflicts:
+            self.lbl_status.config(text=f"{len(self.conflicts)} label files changed on disk under your edits: Ctrl+R to resolve", foreground="red")
+        else: self.lbl_status.config(text=done_msg, foreground="green")
+        if self.queue is not None: self.queue = self.queue[self.store.alive[self.queue]]
+        self.lbl_total_boxes.config(text=f"/ {self.queue_len()}")
+        self.load_current_flashcard()
+
+    # --- Sanity Scan ---
+    def start_sanity_scan(self):
+        if not self.lbl_paths or getattr(self, 'scan_busy', False): return
+        self.writer.flush()   # scan what is on disk, so it must match the store
+        self.scan_busy = True; self.scan_progress = (0, len(self.lbl_paths))
+        self.scan_result = None; self.scan_error = None
+        scanner = SanityScanner(len(self.classes))
+        def run():
+            try:
+                with TRACER.span("sanity.scan"):
+                    self.scan_result = scanner.run(self.lbl_paths, progress=lambda d, n: setattr(self, 'scan_progress', (d, n)))
+            except Exception as ex: self.scan_error = ex
+        threading.Thread(target=run, daemon=True).start()
+        self.root.after(100, self.poll_sanity_scan)
+
+    def poll_sanity_scan(self):
+        if self.scan_error is not None:
+            self.scan_busy = False; messagebox.showerror("Sanity Scan", f"Scan failed: {self.scan_error}"); return
+        if self.scan_result is None:
+            self.lbl_status.config(text="Sanity scan... %d/%d files" % self.scan_progress, foreground="gray")
+            self.root.after(100, self.poll_sanity_scan); return
+        self.scan_busy = False
+        findings = self.scan_result; self.scan_result = None
+        report = os.path.join(cache_dir(self.dataset_base()), "sanity_report.tsv")
+        counts = write_report(report, findings, self.image_paths, self.lbl_paths)
+        self.issues = {}
+        for img_id, idx, code in findings:
+            if 0 <= idx < self.store.counts[img_id]: self.issues.setdefault(self.store.row(img_id, idx), []).append(code)
+        summary = ", ".join(f"{c}: {n}" for c, n in sorted(counts.items(), key=lambda kv: -kv[1]))
+        if not self.issues:
+            self.lbl_status.config(text=f"Sanity scan: no suspect boxes ({summary or 'clean'})", foreground="green"); return
+        # Review the suspects as a flashcard queue, in image order.
+        mask = np.zeros(self.store.size, bool); mask[list(self.issues)] = True
+        if self.leases: mask &= query_mask(self.store, self.lease_query({}))
+        self.queue = self.store.queue_rows(mask); self.query = None; self.q_index = 0
+        self.ent_query.delete(0, tk.END)
+        self.lbl_status.config(text=f"Sanity scan: {len(self.queue)} suspect boxes ({summary}), report: {report}", foreground="orange")
+        self.lbl_total_boxes.config(text=f"/ {self.queue_len()}")
+        self.load_current_flashcard()
+
+    # --- Review State ---
+    def review_stamp(self, img_path):
+        # Review thread: the label key the statuses belong to, unknown while the writer still owes the file a write.
+        i = self.image_ids.get(img_path); p = self.lbl_paths[i] if i is not None and i < len(self.lbl_paths) else None
+        if p is None or (self.writer and self.writer.is_dirty(p)): return None
+        return stat_key(p)
+
+    def sync_review(self, img_id):
+        self.review_index.refresh(img_id)
+        self.review.put(self.image_paths[img_id], self.store.status[list(self.store.rows(img_id))])
+
+    def mark_reviewed(self):
+        if not self.queue_len(): return
+        img_id, box_idx = self.current()
+        row = self.store.row(img_id, box_idx)
+        if self.store.status[row] == UNREVIEWED:
+            self.store.status[row] = ACCEPTED; self.sync_review(img_id)
+
+    def next_unreviewed(self, q):
+        if self.queue is None: return self.review_index.next_unreviewed(q)
+        hit = np.flatnonzero(self.store.status[self.queue[q:]] == UNREVIEWED)
+        return q + int(hit[0]) if len(hit) else None
+
+    def jump_to_unreviewed(self):
+        if not self.queue_len(): return
+        q = self.next_unreviewed(self.q_index + 1)
+        if q is None: q = self.next_unreviewed(0)
+        if q is None: self.lbl_status.config(text="Every box has been reviewed", foreground="green"); return
+        self.q_index = q; self.load_current_flashcard()
+
+    def poll_large(self):
+        # A large image shows up once its one-time level build is done.
+        if self.large_poll: self.root.after_cancel(self.large_poll); self.large_poll = None
+        src = self.pyramid.source
+        if src is None or src.ready(): self.lbl_status.config(text="Ready", foreground="gray"); self.redraw(); return
+        if src.error: self.lbl_status.config(text=f"Cannot prepare large image: {src.error}", foreground="red"); return
+        self.lbl_status.config(text=f"Preparing large image... {src.progress():.0%}", foreground="orange")
+        self.large_poll = self.root.after(250, self.poll_large)
+
+    # --- External Changes ---
+    def poll_changes(self):
+        # Label files rewritten by other programs: untouched images are reloaded, edited ones wait as conflicts.
+        if getattr(self, 'bulk_busy', False): self.root.after(1000, self.poll_changes); return   # the store is being written out
+        changed = self.watcher.drain()
+        for path in self.writer.take_conflicts():
+            if path not in changed: changed[path] = (stat_key(path), parse_label_file(path))
+        reload = {}
+        for path, (key, disk) in changed.items():
+            img_id = self.lbl_ids.get(path)
+            if img_id is None: continue
+            if same_boxes(disk, self.store.boxes(img_id)):
+                # Our own write, or the same boxes: nothing to do.
+                self.watcher.accept(path, key); self.conflicts.pop(img_id, None)
+            elif img_id in self.edited or self.writer.is_dirty(path): self.conflicts[img_id] = (key, disk)
+            else: self.watcher.accept(path, key); reload[img_id] = disk
+        if reload:
+            with TRACER.span("reload"): self.reload_images(reload)
+            self.lbl_status.config(text=f"Reloaded {len(reload)} label files changed on disk", foreground="orange")
+        if self.conflicts:
+            self.lbl_status.config(text=f"{len(self.conflicts)} label files changed on disk under your edits: Ctrl+R to resolve", foreground="red")
+        self.root.after(1000, self.poll_changes)
+
+    def reload_images(self, disk_by_id):
+        """Replace the boxes of images from their on-disk versions and patch the queue in place."""
+        store = self.store
+        cur = self.current() if self.queue_len() else None
+        cur_row = store.row(*cur) if cur else None
+        new_rows = {}
+        for img_id, disk in disk_by_id.items():
+            old = store.boxes(img_id)
+            # Boxes that survived the rewrite unchanged keep their review status.
+            kept = {tuple(round(v, 6) for v in b[:5]): s for b, s in zip(old, store.status[list(store.rows(img_id))])}
+            store.delete_many(img_id, range(len(old)))
+            rows = new_rows[img_id] = [store.add(img_id, b[:5]) for b in disk]
+            for r, b in zip(rows, disk): store.status[r] = kept.get(tuple(round(float(v), 6) for v in b[:5]), UNREVIEWED)
+            self.sync_review(img_id)
+        self.history.forget(set(disk_by_id))
+        self.read_image_sizes([i for i, disk in disk_by_id.items() if any(is_pixel_box(b) for b in disk)])
+
+        if self.queue is None:
+            if cur:
+                img_id, local = cur
+                n = len(store.rows(img_id))
+                self.q_index = store.global_index(img_id, min(local, n - 1)) if n else store.boxes_before(img_id)
+        else:
+            q = self.queue
+            img = store.img[q]
+            pos = []; add = []
+            for img_id, rows in (new_rows.items() if self.query else ()):
+                rows = np.array(rows, np.int64)
+                rows = rows[query_mask(store, self.query, rows)] if len(rows) else rows
+                if not len(rows): continue
+                if self.query['sort']:
+                    hit = np.flatnonzero(img == img_id)
+                    at = int(hit[0]) if len(hit) else len(q)
+                else: at = int(np.searchsorted(img, img_id))
+                pos.extend([at] * len(rows)); add.extend(rows.tolist())
+            q = np.insert(q, pos, add) if add else q
+            self.queue = q[store.alive[q]]
+            if cur_row is not None:
+                hit = np.flatnonzero(self.queue == cur_row)
+                if len(hit): self.q_index = int(hit[0])
+                else:
+                    hit = np.flatnonzero(store.img[self.queue] == cur[0])
+                    self.q_index = int(hit[0]) if len(hit) else min(self.q_index, max(self.queue_len() - 1, 0))
+        self.lbl_total_boxes.config(text=f"/ {self.queue_len()}")
+        self.load_current_flashcard()
+
+    def resolve_conflicts(self, final=False):
+        for img_id, (key, disk) in list(self.conflicts.items()):
+            path = self.lbl_paths[img_id]
+            msg = (f"{os.path.basename(self.image_paths[img_id])} was changed on disk while you were editing it.\n\n"
+                   f"On disk: {len(disk)} boxes\nYours: {len(self.store.rows(img_id))} boxes\n\n"
+                   "Yes: keep yours (overwrite the file)\nNo: load the version on disk")
+            if final: keep = messagebox.askyesno("Label Conflict", msg)
+            else: keep = messagebox.askyesnocancel("Label Conflict", msg + "\nCancel: decide later")
+            if keep is None: break
+            del self.conflicts[img_id]
+            self.watcher.accept(path, key)
+            if keep: self.writer.write(path, self.store.boxes(img_id))
             else:
-                self.data_cache[img_path]['boxes'].append(new_d); self.queue.insert(self.q_index+1, (img_path, idx)); self.save_file(img_path); self.next_box()
-        self.lbl_total_boxes.config(text=f"/ {len(self.queue)}")
+                self.writer.discard(path); self.edited.discard(img_id)
+                self.reload_images({img_id: disk})
+        if not self.conflicts: self.lbl_status.config(text="No label conflicts", foreground="green")
+
+    # --- Shared Review ---
+    def lease_query(self, query):
+        """query limited to the leased chunk in shared mode (to nothing while no chunk is held)."""
+        return dict(query, images=self.chunk or (0, 0)) if self.leases else query
 
-    def next_box(self): self.q_index+=1; self.load_current_flashcard()
+    def chunk_finished(self):
+        return self.chunk is not None and not self.review_index.unreviewed_in(*self.chunk)
+
+    def next_chunk(self, finished=False):
+        """Hand back the current chunk (as done when finished) and lease the next one with boxes left to review."""
+        self.writer.flush()   # our saves must land while we still hold the lease
+        if finished: self.leases.finish()
+        start = None if self.chunk is None else self.chunk[0] // self.leases.chunk + 1
+        k = self.leases.claim(skip=lambda k: not self.review_index.unreviewed_in(*self.leases.images(k)), start=start)
+        self.chunk = None if k is None else self.leases.images(k)
+        # Only the leased images may be written: undo must not reach into chunks we gave back.
+        touched = self.history.touched()
+        self.history.forget({i for i in touched if not self.leases.owns(i)})
+        self.ent_query.delete(0, tk.END)
+        self.query = self.lease_query({'sort': []}); self.queue = run_query(self.store, self.query)
+        q = self.next_unreviewed(0)
+        self.q_index = q if q is not None else 0
+        self.lbl_total_boxes.config(text=f"/ {self.queue_len()}")
+        if k is None:
+            self.lbl_progress.config(text="No chunks left: every chunk is done or leased by another reviewer")
+            self.lbl_status.config(text=f"Shared review: {self.leases.done_count()}/{self.leases.n_chunks} chunks done", foreground="green"); return
+        lo, hi = self.chunk
+        self.lbl_status.config(text=f"Chunk {k + 1}/{self.leases.n_chunks}: images {lo + 1}-{hi} "
+                                    f"({self.leases.done_count()} chunks done)", foreground="gray")
+        self.load_current_flashcard()
+
+    def poll_lease(self):
+        if self.leases.lost:
+            lo, hi = self.chunk
+            messagebox.showwarning("Shared Review", f"Your lease on images {lo + 1}-{hi} expired and another reviewer took it over.\n\nMoving to a new chunk.")
+            self.next_chunk()
+        elif self.chunk is None: self.next_chunk()   # retry: chunks free up as leases expire
+        self.root.after(5000 if self.chunk else 60000, self.poll_lease)
+
+    def on_close(self):
+        self.lookahead.close()
+        self.large.shutdown()
+        if self.watcher:
+            self.watcher.close()
+            self.conflicts.update((self.lbl_ids[p], (stat_key(p), parse_label_file(p))) for p in self.writer.take_conflicts() if p in self.lbl_ids)
+            if self.conflicts: self.resolve_conflicts(final=True)
+        if self.writer: self.writer.close()
+        if self.leases: self.leases.close()
+        if self.history: self.history.close()
+        if self.review: self.review.close()
+        close_packs()
+        if TRACER.enabled: self.perf.export()
+        self.img_cache.shutdown()
+        self.root.destroy()
+
+    # --- Undo/Redo ---
+    def undo(self):
+        rec = self.history.undo() if self.history else None
+        if rec: self.handle_history(rec, undo=True)
+
+    def redo(self):
+        rec = self.history.redo() if self.history else None
+        if rec: self.handle_history(rec, undo=False)
+
+    def handle_history(self, rec, undo):
+        touched = apply_record(self.store, rec, undo)
+        leaves = leaf_records(rec)
+        if leaves[0][0] in BULK_OPS:
+            self.rewrite_images(sorted(touched), f"{'Undid' if undo else 'Redid'} bulk edit on {len(touched)} images"); return
+        for img_id in touched: self.save_file(img_id)
+        # Land on the box the step touched last (the first leaf when undoing a transaction).
+        op, img_id, idx = (leaves[0] if undo else leaves[-1])[:3]
+        if op == 'M' and getattr(self, 'cur_img_id', None) == img_id: self.redraw()
+        elif op == 'M' or (op == 'D') == undo: self.goto_box(img_id, idx)
+        elif self.queue is not None:
+            self.queue = self.queue[self.store.alive[self.queue]]
+            self.q_index = min(self.q_index, self.queue_len()-1); self.load_current_flashcard()
+        else:
+            self.q_index = min(self.store.global_index(img_id, idx), len(self.store)-1)
+            if op == 'A': self.q_index = max(self.q_index-1, 0)
+            self.load_current_flashcard()
+        self.lbl_total_boxes.config(text=f"/ {self.queue_len()}")
+
+    def next_box(self):
+        self.mark_reviewed()
+        if self.leases and (self.q_index + 1 >= self.queue_len() or self.skip_reviewed.get()) and self.chunk_finished():
+            self.next_chunk(finished=True); return
+        if self.skip_reviewed.get() and self.review_index:
+            q = self.next_unreviewed(self.q_index + 1)
+            if q is None: self.lbl_status.config(text="No unreviewed boxes ahead", foreground="green"); return
+            self.q_index = q
+        else: self.q_index += 1
+        self.load_current_flashcard()
     def prev_box(self): self.q_index-=1; self.load_current_flashcard()
     def toggle_add_mode(self):
         if self.mode=="EDIT": self.mode="DRAW"; self.canvas.config(cursor="cross")
@@ -521,6 +1053,6 @@ class ValidatorV30:
     def disable_shift(self, e): self.shift_pressed=False; self.canvas.config(cursor="arrow")
 
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = ValidatorV30(root, "data_cleaned.yaml")
-    root.mainloop()
\ No newline at end of file
+    SPLASH.destroy()
+    app = ValidatorV30(ROOT, "data_cleaned.yaml")
+    ROOT.mainloop()
\ No newline at end of file
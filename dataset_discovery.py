@@ -0,0 +1,178 @@
+import os
+import json
+import pickle
+import threading
+from label_index import CACHE_DIRNAME, cache_dir
+
+IMG_EXTS = ('.jpg', '.jpeg', '.png', '.bmp')
+SKIP_DIRS = {'runs', 'labels', '__pycache__', CACHE_DIRNAME}
+MANIFEST_VERSION = 1
+YAML_KEYS = ('names', 'path', 'train', 'val', 'test')
+
+# --- YAML ---
+def _parse_yaml(yaml_path):
+    import yaml   # only needed when the cache below misses
+    with open(yaml_path, 'rb') as f: data = yaml.load(f, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader)) or {}
+    return {k: data[k] for k in YAML_KEYS if k in data}
+
+_yaml_memo = {}
+def read_dataset_yaml(yaml_path):
+    """The keys of a dataset YAML the tools use, cached in binary form per YAML (mtime, size).
+
+    A 50k-class `names` list takes seconds with the pure-Python loader; the
+    pickle under .validator_cache/ loads in milliseconds. Raises OSError or
+    yaml.YAMLError like the parse would.
+    """
+    st = os.stat(yaml_path); key = (st.st_mtime_ns, st.st_size)
+    hit = _yaml_memo.get(yaml_path)
+    if hit and hit[0] == key: return hit[1]
+    cache = os.path.join(os.path.dirname(yaml_path), CACHE_DIRNAME, f"yaml_{os.path.basename(yaml_path)}.pkl")
+    data = None
+    try:
+        with open(cache, 'rb') as f:
+            k, d = pickle.load(f)
+            if k == key: data = d
+    except Exception: pass
+    if data is None:
+        data = _parse_yaml(yaml_path)
+        try:
+            cache_dir(os.path.dirname(yaml_path))
+            with open(cache + ".tmp", 'wb') as f: pickle.dump((key, data), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(cache + ".tmp", cache)
+        except OSError: pass   # read-only dataset: parse every time
+    _yaml_memo[yaml_path] = (key, data)
+    return data
+
+def load_class_names(yaml_path, missing="?"):
+    """The YAML's `names` (list, or {id: name} with gaps filled by `missing`), else 100 placeholders."""
+    defaults = [f"Class {i}" for i in range(100)]
+    if not yaml_path: return defaults
+    try:
+        data = read_dataset_yaml(yaml_path)
+        names = data.get('names', [])
+        if isinstance(names, dict):
+            ret = [missing] * (max(names.keys()) + 1)
+            for k, v in names.items(): ret[k] = v
+            return ret
+        return names if isinstance(names, list) else defaults
+    except Exception: return defaults
+
+# --- Roots ---
+def dataset_splits(yaml_path):
+    """[(split, root)] for the image dirs / list files named by the YAML's train/val/test keys,
+    else [('all', the YAML's dir)]."""
+    base = os.path.dirname(yaml_path) if yaml_path else os.getcwd()
+    if not yaml_path: return [('all', base)]
+    try: data = read_dataset_yaml(yaml_path)
+    except Exception: return [('all', base)]
+    root = base
+    if data.get('path'):
+        p = os.path.join(base, str(data['path']))
+        if os.path.isdir(p): root = p
+    splits = []
+    for key in ('train', 'val', 'test'):
+        v = data.get(key)
+        for p in (v if isinstance(v, list) else [v] if v else []):
+            p = os.path.normpath(os.path.join(root, str(p)))
+            if os.path.exists(p) and all(p != r for _, r in splits): splits.append((key, p))
+    return splits or [('all', base)]
+
+def dataset_roots(yaml_path):
+    """Image dirs / list files named by the YAML's train/val/test keys, else the YAML's dir."""
+    return [r for _, r in dataset_splits(yaml_path)]
+
+def iter_root(root, dirs):
+    """Stream image paths under one root (a dir or a .txt list), recording dir mtimes into `dirs`."""
+    if os.path.isfile(root):
+        dirs[root] = os.stat(root).st_mtime_ns
+        d = os.path.dirname(root)
+        with open(root, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line: yield os.path.normpath(os.path.join(d, line))
+        return
+    stack = [root]
+    while stack:
+        d = stack.pop()
+        try:
+            dirs[d] = os.stat(d).st_mtime_ns
+            with os.scandir(d) as it:
+                for e in it:
+                    if e.is_dir(follow_symlinks=False):
+                        if e.name not in SKIP_DIRS and not e.name.startswith('.'): stack.append(e.path)
+                    elif e.name.lower().endswith(IMG_EXTS): yield e.path
+        except OSError: continue
+
+# --- Manifest ---
+def load_manifest(manifest_path, roots):
+    """Saved image list, or None when the roots changed or any recorded dir was modified."""
+    try:
+        with open(manifest_path, 'r') as f:
+            head = json.loads(f.readline())
+            if head.get('version') != MANIFEST_VERSION or head.get('roots') != roots: return None
+            for d, mtime in head['dirs'].items():
+                if os.stat(d).st_mtime_ns != mtime: return None
+            return f.read().splitlines()
+    except (OSError, ValueError, KeyError): return None
+
+def save_manifest(manifest_path, roots, dirs, paths):
+    tmp = manifest_path + ".tmp"
+    with open(tmp, 'w') as f:
+        f.write(json.dumps({'version': MANIFEST_VERSION, 'roots': roots, 'dirs': dirs}) + "\n")
+        f.write("\n".join(paths))
+    os.replace(tmp, manifest_path)
+
+class DatasetScanner:
+    """Finds images under the dataset roots, streaming them as they are discovered.
+
+    A valid manifest is loaded in one go; otherwise the tree is walked with
+    os.scandir and, with stream=True, new paths are handed out in discovery
+    order by drain().
+    When `done` is set, `paths` holds the full sorted list and the manifest
+    has been rewritten.
+    """
+    def __init__(self, roots, manifest_path, stream=True, batch=256):
+        self.roots = roots
+        self.stream = stream
+        self.manifest_path = manifest_path
+        self.batch = batch
+        self.new = []
+        self.paths = []
+        self.count = 0
+        self.done = False
+        self.from_manifest = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+        return self
+
+    def drain(self):
+        with self.lock: out = self.new; self.new = []
+        return out
+
+    def _emit(self, paths):
+        with self.lock:
+            if self.stream: self.new.extend(paths)
+            self.count += len(paths)
+
+    def run(self):
+        paths = load_manifest(self.manifest_path, self.roots)
+        if paths is not None:
+            self.from_manifest = True
+            with self.lock:
+                if self.stream: self.new.extend(paths)
+                self.count = len(paths)
+        else:
+            dirs = {}; seen = set(); pending = []
+            for root in self.roots:
+                for p in iter_root(root, dirs):
+                    if p in seen: continue
+                    seen.add(p); pending.append(p)
+                    if len(pending) >= self.batch: self._emit(pending); pending = []
+            self._emit(pending)
+            paths = sorted(seen)
+            try: save_manifest(self.manifest_path, self.roots, dirs, paths)
+            except OSError: pass
+        self.paths = paths
+        self.done = True
@@ -0,0 +1,151 @@
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import tarfile
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from label_index import resolve_label_path, parse_label_file, is_pixel_box
+from label_journal import format_labels
+from dataset_discovery import dataset_splits, iter_root, load_class_names
+
+CHUNK = 256          # images per worker task
+SHARD_SIZE = 1000    # samples per tar shard
+
+# --- Workers (module level so they pickle for process pools) ---
+def read_sample(img_path):
+    """(width, height, [[cls, cx, cy, w, h], ...] normalized) of one image; size is None if unreadable."""
+    try:
+        with Image.open(img_path) as im: size = im.size
+    except OSError: size = None
+    boxes = []
+    for b in parse_label_file(resolve_label_path(img_path)):
+        c, cx, cy, w, h = b[:5]
+        if size and is_pixel_box(b): cx /= size[0]; cy /= size[1]; w /= size[0]; h /= size[1]
+        boxes.append([int(c), cx, cy, w, h])
+    return size, boxes
+
+def _read_chunk(img_paths): return [read_sample(p) for p in img_paths]
+
+def sample_key(idx, img_path):
+    # WebDataset splits keys from extensions at the first dot.
+    return f"{idx:08d}_" + os.path.splitext(os.path.basename(img_path))[0].replace('.', '_')
+
+def _write_shard(args):
+    """Write one tar shard of (index, image path) samples: <key>.<ext> plus <key>.txt; returns (path, samples, bytes)."""
+    path, samples = args
+    tmp = path + ".tmp"; n = 0
+    with tarfile.open(tmp, 'w') as tar:
+        for idx, img_path in samples:
+            key = sample_key(idx, img_path)
+            size, boxes = read_sample(img_path)
+            if size is None: continue
+            tar.add(img_path, arcname=key + os.path.splitext(img_path)[1].lower())
+            data = format_labels(boxes).encode()
+            info = tarfile.TarInfo(key + ".txt"); info.size = len(data); info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(data)); n += 1
+    os.replace(tmp, path)
+    return path, n, os.path.getsize(path)
+
+# --- Helpers ---
+def bounded_map(pool, fn, items, window):
+    """pool.map that keeps at most `window` tasks in flight, so results never pile up in memory."""
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window: yield pending.popleft().result()
+    while pending: yield pending.popleft().result()
+
+def _chunks(seq, size):
+    for i in range(0, len(seq), size): yield seq[i:i + size]
+
+def split_images(root):
+    """Sorted image paths of one split (dir walk or list file), and the dir file names are relative to."""
+    paths = sorted(set(iter_root(root, {})))
+    return paths, (root if os.path.isdir(root) else os.path.dirname(root))
+
+# --- COCO ---
+def export_coco(out_path, img_paths, rel_root, classes, workers=None, progress=None):
+    """Stream one split to a COCO detection JSON; returns (images, annotations).
+
+    Images are written as they come back from the pool and annotations are
+    spooled to a side file, so memory does not grow with the dataset.
+    Category ids are class id + 1 (COCO keeps 0 free).
+    """
+    workers = workers or (os.cpu_count() or 4)
+    tmp = out_path + ".tmp"; ann_tmp = out_path + ".ann.tmp"
+    n_img = n_ann = 0
+    with open(tmp, 'w') as out, open(ann_tmp, 'w') as ann, ProcessPoolExecutor(workers) as pool:
+        out.write('{"info": %s, "licenses": [], "categories": %s,\n"images": [' % (
+            json.dumps({'description': "exported from YOLO labels", 'date_created': time.strftime("%Y-%m-%d")}),
+            json.dumps([{'id': i + 1, 'name': str(n), 'supercategory': ""} for i, n in enumerate(classes)])))
+        chunks = list(_chunks(img_paths, CHUNK)); done = 0
+        for chunk, results in zip(chunks, bounded_map(pool, _read_chunk, chunks, 2 * workers)):
+            for img_path, (size, boxes) in zip(chunk, results):
+                if size is None: continue
+                n_img += 1; W, H = size
+                out.write((",\n" if n_img > 1 else "\n") + json.dumps(
+                    {'id': n_img, 'file_name': os.path.relpath(img_path, rel_root).replace(os.sep, '/'), 'width': W, 'height': H}))
+                for c, cx, cy, w, h in boxes:
+                    n_ann += 1
+                    bw, bh = w * W, h * H
+                    ann.write((",\n" if n_ann > 1 else "\n") + json.dumps(
+                        {'id': n_ann, 'image_id': n_img, 'category_id': c + 1, 'iscrowd': 0,
+                         'bbox': [round((cx - w / 2) * W, 2), round((cy - h / 2) * H, 2), round(bw, 2), round(bh, 2)],
+                         'area': round(bw * bh, 2)}))
+            done += len(chunk)
+            if progress: progress(done, len(img_paths))
+        out.write('\n],\n"annotations": [')
+        ann.close()
+        with open(ann_tmp, 'r') as f: shutil.copyfileobj(f, out, 1 << 20)
+        out.write('\n]}\n')
+    os.remove(ann_tmp)
+    os.replace(tmp, out_path)
+    return n_img, n_ann
+
+# --- Shards ---
+def export_shards(out_dir, prefix, img_paths, shard_size=SHARD_SIZE, workers=None, progress=None):
+    """Write <prefix>-NNNNNN.tar shards of shard_size samples, one shard per worker task;
+    returns [(shard path, samples, bytes)]."""
+    workers = workers or (os.cpu_count() or 4)
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = ((os.path.join(out_dir, f"{prefix}-{k:06d}.tar"), [(i, img_paths[i]) for i in range(s, min(s + shard_size, len(img_paths)))])
+             for k, s in enumerate(range(0, len(img_paths), shard_size)))
+    written = []; done = 0
+    with ProcessPoolExecutor(workers) as pool:
+        for res in bounded_map(pool, _write_shard, tasks, 2 * workers):
+            written.append(res); done = min(done + shard_size, len(img_paths))
+            if progress: progress(done, len(img_paths))
+    return written
+
+# --- CLI ---
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Export a YOLO dataset (per data.yaml split) to COCO JSON and/or tar shards")
+    ap.add_argument("yaml", help="dataset YAML (train/val/test, names)")
+    ap.add_argument("--out", required=True, help="output directory")
+    ap.add_argument("--format", choices=("coco", "shards", "both"), default="both")
+    ap.add_argument("--shard-size", type=int, default=SHARD_SIZE, help="samples per tar shard")
+    ap.add_argument("--workers", type=int, default=None)
+    args = ap.parse_args(argv)
+
+    yaml_path = os.path.abspath(args.yaml)
+    classes = load_class_names(yaml_path)
+    os.makedirs(args.out, exist_ok=True)
+    for split, root in dataset_splits(yaml_path):
+        img_paths, rel_root = split_images(root)
+        report = lambda d, n: print(f"\r{split}: {d}/{n}", end="", file=sys.stderr, flush=True)
+        t = time.perf_counter()
+        if args.format in ("coco", "both"):
+            n_img, n_ann = export_coco(os.path.join(args.out, f"{split}.json"), img_paths, rel_root, classes, args.workers, report)
+            print(f"\n{split}.json: {n_img} images, {n_ann} annotations in {time.perf_counter() - t:.1f}s")
+        t = time.perf_counter()
+        if args.format in ("shards", "both"):
+            shards = export_shards(os.path.join(args.out, "shards"), split, img_paths, args.shard_size, args.workers, report)
+            print(f"\n{split}: {len(shards)} shards, {sum(s[2] for s in shards) / 2**20:.0f} MB in {time.perf_counter() - t:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import threading
+from collections import OrderedDict
+from PIL import Image
+from tile_pyramid import TilePyramid
+from perf_trace import TRACER
+
+LOOKAHEAD = 4   # upcoming flashcards rendered ahead of the keypress
+
+def view_for(box, img_w, img_h, cw, ch):
+    """(view_x, view_y, zoom) that centres a box (normalized or pixel cx, cy, w, h) at a third of the canvas."""
+    cx, cy, w, h = box
+    if cx > 1 or cy > 1: cx /= img_w; cy /= img_h; w /= img_w; h /= img_h
+    zoom = min(max(min(cw / (w * img_w * 3.0), ch / (h * img_h * 3.0)), 0.2), 10.0)
+    return cx * img_w - cw / 2 / zoom, cy * img_h - ch / 2 / zoom, zoom
+
+class FlashcardLookahead:
+    """Display images of the next flashcards, rendered before they are asked for.
+
+    schedule() names the upcoming cards as (key, image path, box); a worker
+    thread renders each view from the image's pyramid, and pump() turns the
+    finished buffers into PhotoImages on the Tk thread while it is idle. A
+    prepared card is shown with one canvas itemconfig. Keys hold the box
+    coordinates and the canvas size, so edited boxes and resized windows miss.
+    Pyramids are shared with the viewer through pyramid().
+    """
+    def __init__(self, root, img_cache, tiles, large, photo, depth=LOOKAHEAD):
+        self.root = root
+        self.img_cache = img_cache
+        self.tiles = tiles
+        self.large = large
+        self.photo = photo
+        self.depth = depth
+        self.pyramids = OrderedDict()
+        self.wanted = []
+        self.size = (0, 0)
+        self.buffers = {}            # key -> (PIL image, x, y), from the worker
+        self.ready = OrderedDict()   # key -> (PhotoImage, x, y), Tk thread only
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = False
+        self.pump_id = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def key(row, box, cw, ch): return (int(row), tuple(round(float(v), 6) for v in box), cw, ch)
+
+    def pyramid(self, path, ahead=False):
+        """The shared TilePyramid of path. ahead: None for a large image, whose
+        level build is only started when the viewer opens it."""
+        with self.lock:
+            p = self.pyramids.get(path)
+            if p is not None: self.pyramids.move_to_end(path); return p
+        if ahead:
+            with Image.open(path) as im:
+                if self.large.wants(im.size): return None
+            full = self.img_cache.get(path)
+        else: full = self.img_cache.peek(path)
+        p = TilePyramid(path, self.img_cache.get, self.tiles, full=full, large=self.large)
+        with self.lock:
+            p = self.pyramids.setdefault(path, p); self.pyramids.move_to_end(path)
+            while len(self.pyramids) > self.depth + 2: self.pyramids.popitem(last=False)
+        return p
+
+    # --- Tk thread ---
+    def schedule(self, cards, cw, ch):
+        """cards: [(key, image path, box)] in the order they will be shown."""
+        keys = {c[0] for c in cards}
+        with self.lock:
+            self.wanted = [c for c in cards if c[0] not in self.ready and c[0] not in self.buffers]
+            self.size = (cw, ch)
+            for k in [k for k in self.buffers if k not in keys]: del self.buffers[k]
+        for k in [k for k in self.ready if k not in keys]: del self.ready[k]
+        if self.wanted: self.wake.set(); self.pump()
+
+    def take(self, key):
+        """(PhotoImage, draw_x, draw_y) of a prepared card, or None."""
+        hit = self.ready.pop(key, None)
+        if hit is None:
+            with self.lock: buf = self.buffers.pop(key, None)
+            if buf is not None:
+                with TRACER.span("photoimage"): hit = (self.photo(buf[0]),) + buf[1:]
+        return hit
+
+    def pump(self):
+        # One PhotoImage per idle callback, so a keypress never waits behind a batch of them.
+        self.pump_id = None
+        with self.lock:
+            key = next(iter(self.buffers), None)
+            buf = self.buffers.pop(key) if key is not None else None
+            busy = bool(self.wanted) or bool(self.buffers)
+        if buf is not None:
+            with TRACER.span("lookahead.photo"): self.ready[key] = (self.photo(buf[0]),) + buf[1:]
+        if busy or buf is not None: self.pump_id = self.root.after(5, self.pump)
+
+    # --- Worker ---
+    def run(self):
+        while not self.stopped:
+            self.wake.wait(); self.wake.clear()
+            while not self.stopped:
+                with self.lock:
+                    if not self.wanted: break
+                    key, path, box = self.wanted[0]; cw, ch = self.size
+                try:
+                    with TRACER.span("lookahead.render"):
+                        pyr = self.pyramid(path, ahead=True)
+                        out = pyr.render(*view_for(box, *pyr.size, cw, ch), cw, ch) if pyr and pyr.ready() else None
+                except Exception: out = None
+                with self.lock:
+                    if self.wanted and self.wanted[0][0] == key:
+                        self.wanted.pop(0)
+                        if out: self.buffers[key] = out
+
+    def close(self):
+        self.stopped = True; self.wake.set()
+        if self.pump_id: self.root.after_cancel(self.pump_id); self.pump_id = None
@@ -0,0 +1,33 @@
+import time
+
+FRAME_MS = 16
+
+class FrameScheduler:
+    """Folds bursts of redraw requests into one callback per display frame.
+
+    Input handlers call request() as often as they like; the callback runs at
+    most once per `interval_ms`, on the Tk event loop. The first request after
+    a quiet frame renders as soon as Tk is idle (after the events already
+    queued), so only requests arriving while a frame is pending wait.
+    """
+    def __init__(self, widget, callback, interval_ms=FRAME_MS):
+        self.widget = widget
+        self.callback = callback
+        self.interval_ms = interval_ms
+        self.pending = None
+        self.last = 0.0
+
+    def request(self):
+        if self.pending is not None: return
+        wait = self.interval_ms - (time.perf_counter() - self.last) * 1000
+        self.pending = self.widget.after_idle(self._run) if wait <= 0 else self.widget.after(max(1, int(wait)), self._run)
+
+    def cancel(self):
+        if self.pending is not None: self.widget.after_cancel(self.pending); self.pending = None
+
+    def flush(self):
+        if self.pending is not None: self.cancel(); self.callback()
+
+    def _run(self):
+        self.pending = None; self.last = time.perf_counter()
+        self.callback()
@@ -0,0 +1,91 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from perf_trace import TRACER
+from large_image import is_large
+
+def decode_image(path):
+    """Decoded image, or None for a large image (those are only read by region)."""
+    with TRACER.span("image.open"): img = Image.open(path)
+    if is_large(img.size): img.close(); return None
+    with TRACER.span("image.decode"): img.load()
+    return img
+
+def image_nbytes(img):
+    return img.width * img.height * len(img.getbands())
+
+class ImageCache:
+    """Byte-bounded LRU of decoded PIL images with a background prefetch pool.
+
+    get() is called from the Tk thread; prefetch() queues decodes of the
+    neighbouring images so the next get() is usually a hit.
+    """
+    def __init__(self, max_bytes=512 * 2**20, workers=2, loader=decode_image):
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self.items = OrderedDict()
+        self.pending = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(workers)
+
+    def _put(self, path, img):
+        if img is None: return
+        with self.lock:
+            if path in self.items: return
+            self.items[path] = img; self.nbytes += image_nbytes(img)
+            while self.nbytes > self.max_bytes and len(self.items) > 1:
+                _, old = self.items.popitem(last=False); self.nbytes -= image_nbytes(old)
+
+    def _decode(self, path):
+        try:
+            img = self.loader(path)
+            self._put(path, img)
+            return img
+        finally:
+            with self.lock: self.pending.pop(path, None)
+
+    def get(self, path):
+        with self.lock:
+            img = self.items.get(path)
+            if img is not None: self.items.move_to_end(path); self.hits += 1; return img
+            fut = self.pending.get(path)
+        if fut is not None:
+            if not fut.cancel():
+                # Already decoding in the background: waiting is cheaper than starting over.
+                self.hits += 1
+                return fut.result()
+            with self.lock: self.pending.pop(path, None)
+        self.misses += 1
+        img = self.loader(path)
+        self._put(path, img)
+        return img
+
+    def peek(self, path):
+        """Cached image or None; never decodes."""
+        with self.lock:
+            img = self.items.get(path)
+            if img is not None: self.items.move_to_end(path); self.hits += 1
+            return img
+
+    def prefetch(self, paths):
+        """Queue decodes for paths (nearest first); drops queued work for paths no longer wanted."""
+        wanted = set(paths)
+        with self.lock:
+            for p, fut in list(self.pending.items()):
+                if p not in wanted and fut.cancel(): del self.pending[p]
+            for p in paths:
+                if p in self.items or p in self.pending: continue
+                self.pending[p] = self.pool.submit(self._decode, p)
+
+    def hit_rate(self):
+        n = self.hits + self.misses
+        return self.hits / n if n else 0.0
+
+    def status_text(self):
+        return f"Cache: {self.hit_rate():.0%} hit | {self.nbytes / 2**20:.0f}/{self.max_bytes / 2**20:.0f} MB"
+
+    def shutdown(self): self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,137 @@
+import os
+import pickle
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from label_pack import find_pack, pack_label_path, is_pack_path, pack_key, read_packed
+
+INDEX_VERSION = 1
+CACHE_DIRNAME = ".validator_cache"
+
+# --- Paths ---
+def cache_dir(base):
+    d = os.path.join(base, CACHE_DIRNAME)
+    os.makedirs(d, exist_ok=True)
+    return d
+
+def resolve_label_path(img_path):
+    """Same lookup as ValidatorV30.get_label_path: the split's labels.pack if there is one,
+    else ../labels/<name>.txt, else next to the image."""
+    base = os.path.splitext(os.path.basename(img_path))[0]
+    d = os.path.dirname(img_path)
+    pack = find_pack(d)
+    if pack: return pack_label_path(pack, base)
+    p1 = os.path.join(os.path.dirname(d), 'labels', base+".txt")
+    if os.path.exists(p1): return p1
+    return os.path.join(d, base+".txt")
+
+def stat_key(lbl_path):
+    try:
+        if is_pack_path(lbl_path): return pack_key(lbl_path)
+        st = os.stat(lbl_path)
+        return (st.st_mtime_ns, st.st_size)
+    except (OSError, ValueError): return None
+
+# --- Coordinates ---
+def is_pixel_box(box):
+    """True if a [cls, cx, cy, w, h] box is in pixel coordinates: a normalized center never passes 1."""
+    return box[1] > 1 or box[2] > 1
+
+def pixel_rows(xywh):
+    """is_pixel_box over an (n, 4) array of cx, cy, w, h; returns a row mask."""
+    return (xywh[:, 0] > 1) | (xywh[:, 1] > 1)
+
+def parse_label_file(lbl_path):
+    if is_pack_path(lbl_path): return read_packed(lbl_path)
+    boxes = []
+    try:
+        with open(lbl_path, 'r') as f:
+            for line in f:
+                try: parts = list(map(float, line.strip().split()))
+                except ValueError: continue
+                if len(parts) >= 5: boxes.append(parts)
+    except OSError: pass
+    return boxes
+
+# --- Workers (module level so they pickle for process pools) ---
+def _stat_chunk(img_paths):
+    out = []
+    for img_path in img_paths:
+        lbl_path = resolve_label_path(img_path)
+        out.append((img_path, lbl_path, stat_key(lbl_path)))
+    return out
+
+def _parse_chunk(lbl_paths):
+    return [parse_label_file(p) for p in lbl_paths]
+
+def _chunks(seq, size):
+    for i in range(0, len(seq), size): yield seq[i:i+size]
+
+# --- Index ---
+class LabelIndex:
+    """Persistent label index: img_path -> (lbl_path, (mtime_ns, size) or None, boxes).
+
+    An entry is reused when the label file's path, mtime and size still match,
+    so a relaunch on an unchanged dataset only pays for the stat calls.
+    """
+    def __init__(self, index_path, workers=None, processes=False, chunk_size=512):
+        self.index_path = index_path
+        self.workers = workers or min(32, (os.cpu_count() or 4) * 4)
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self.entries = {}
+        self.reparsed = 0
+
+    def load(self):
+        try:
+            with open(self.index_path, 'rb') as f: data = pickle.load(f)
+            if data.get('version') == INDEX_VERSION: self.entries = data['entries']
+        except Exception: self.entries = {}
+        return self.entries
+
+    def save(self):
+        tmp = self.index_path + ".tmp"
+        with open(tmp, 'wb') as f:
+            pickle.dump({'version': INDEX_VERSION, 'entries': self.entries}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.index_path)
+
+    def build(self, image_paths, progress=None):
+        """Stat every label in a thread pool, re-parse only changed files, save the index.
+
+        progress(done, total) is called from worker threads; GUI callers must
+        hand the numbers over to the Tk thread themselves.
+        Returns the entries dict {img_path: (lbl_path, key, boxes)}.
+        """
+        if not self.entries: self.load()
+        total = len(image_paths)
+        done = 0
+        stale = []
+        fresh = {}
+        with ThreadPoolExecutor(self.workers) as pool:
+            for chunk in pool.map(_stat_chunk, _chunks(image_paths, self.chunk_size)):
+                for img_path, lbl_path, key in chunk:
+                    old = self.entries.get(img_path)
+                    if key is None: fresh[img_path] = (lbl_path, None, [])
+                    elif old and old[0] == lbl_path and old[1] == key: fresh[img_path] = old
+                    else: stale.append((img_path, lbl_path, key))
+                done += len(chunk)
+                if progress: progress(done - len(stale), total)
+
+        self.reparsed = len(stale)
+        if stale:
+            parsed = done - len(stale)
+            batches = list(_chunks(stale, self.chunk_size))
+            # Started from a thread of the GUI, so never forked.
+            if self.processes: pool = ProcessPoolExecutor(os.cpu_count() or 4, mp_context=multiprocessing.get_context("spawn"))
+            else: pool = ThreadPoolExecutor(self.workers)
+            with pool:
+                for batch, results in zip(batches, pool.map(_parse_chunk, [[s[1] for s in b] for b in batches])):
+                    for (img_path, lbl_path, key), boxes in zip(batch, results):
+                        fresh[img_path] = (lbl_path, key, boxes)
+                    parsed += len(batch)
+                    if progress: progress(parsed, total)
+
+        self.entries = fresh
+        try: self.save()
+        except OSError: pass
+        return fresh
+
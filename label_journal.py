@@ -0,0 +1,158 @@
+import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from perf_trace import TRACER
+from label_pack import is_pack_path, write_packed
+from label_index import stat_key, parse_label_file
+
+def format_labels(boxes):
+    return "".join(f"{int(b[0])} {b[1]:.6f} {b[2]:.6f} {b[3]:.6f} {b[4]:.6f}\n" for b in boxes)
+
+def write_labels_atomic(lbl_path, boxes):
+    if is_pack_path(lbl_path): write_packed(lbl_path, boxes); return
+    d = os.path.dirname(lbl_path)
+    if d and not os.path.exists(d): os.makedirs(d, exist_ok=True)
+    tmp = lbl_path + ".tmp"
+    with open(tmp, 'w') as f: f.write(format_labels(boxes))
+    os.replace(tmp, lbl_path)
+
+class LabelConflict(Exception):
+    """The label file was changed by someone else since we last read or wrote it."""
+
+def _rewrite(lbl_path, boxes, guard):
+    if guard and not guard.unchanged(lbl_path): raise LabelConflict(lbl_path)
+    write_labels_atomic(lbl_path, boxes() if callable(boxes) else boxes)
+    if guard: guard.wrote(lbl_path)
+
+def rewrite_labels(jobs, workers=8, progress=None, guard=None):
+    """Write many label files with a thread pool. jobs is [(lbl_path, boxes)], where boxes
+    may be a callable run on the worker; returns [(lbl_path, error)]. With a `guard`
+    (a LabelWatcher), files changed on disk are not written: their error is a LabelConflict."""
+    errors = []; done = 0
+    with ThreadPoolExecutor(workers) as ex:
+        futs = {ex.submit(_rewrite, p, b, guard): p for p, b in jobs}
+        for fut in as_completed(futs):
+            done += 1
+            try: fut.result()
+            except (OSError, LabelConflict) as e: errors.append((futs[fut], e))
+            if progress and (done % 256 == 0 or done == len(jobs)): progress(done, len(jobs))
+    return errors
+
+class LabelWriter:
+    """Write-behind label persistence backed by an append-only journal.
+
+    write() appends the image's new box list to the journal and marks the label
+    file dirty; a background thread batches dirty files and writes each with a
+    temp file plus atomic rename. Once everything is on disk the journal is
+    truncated, so after a crash replay() only has to rewrite unflushed files.
+    With a `guard` (a LabelWatcher), a file changed by someone else since we
+    last saw it is not overwritten: its boxes are held as a conflict (and the
+    journal kept) until they are written again or discarded. Records carry
+    the key the file had when we last saw it, which replay() checks.
+    """
+    def __init__(self, journal_path, interval=1.0, fsync=False, guard=None):
+        self.journal_path = journal_path
+        self.interval = interval
+        self.fsync = fsync
+        self.guard = guard
+        self.dirty = {}
+        self.conflicts = {}
+        self.new_conflicts = set()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = False
+        self.last_error = None
+        self.journal = open(journal_path, 'a')
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def replay(journal_path):
+        """Rewrite the label files recorded in a leftover journal; returns (files rewritten, {path: boxes}).
+
+        A file changed on disk since its record was made is not overwritten:
+        its boxes are returned as a conflict and the journal is cut down to
+        those records, so they survive until the caller decides.
+        """
+        if not os.path.exists(journal_path): return 0, {}
+        latest = {}
+        with open(journal_path, 'r') as f:
+            for line in f:
+                try: rec = json.loads(line)
+                except ValueError: continue  # torn last record
+                latest[rec['path']] = rec
+        done = 0; conflicts = {}
+        for path, rec in latest.items():
+            if 'key' in rec:
+                key = stat_key(path)
+                if (list(key) if key is not None else None) != rec['key']:
+                    # Already written by the crashed session itself, or changed by someone else.
+                    if key is None or format_labels(parse_label_file(path)) != format_labels(rec['boxes']): conflicts[path] = rec['boxes']
+                    continue
+            write_labels_atomic(path, rec['boxes']); done += 1
+        if conflicts:
+            with open(journal_path + ".tmp", 'w') as f: f.writelines(json.dumps(latest[p]) + "\n" for p in conflicts)
+            os.replace(journal_path + ".tmp", journal_path)
+        else: os.remove(journal_path)
+        return done, conflicts
+
+    def write(self, lbl_path, boxes):
+        rec = {'path': lbl_path, 'boxes': boxes}
+        if self.guard:
+            watched, key = self.guard.base(lbl_path)
+            if watched: rec['key'] = key
+        with self.lock:
+            self.journal.write(json.dumps(rec) + "\n"); self.journal.flush()
+            if self.fsync: os.fsync(self.journal.fileno())
+            self.dirty[lbl_path] = boxes
+            self.conflicts.pop(lbl_path, None); self.new_conflicts.discard(lbl_path)
+
+    def pending(self):
+        with self.lock: return len(self.dirty)
+
+    def is_dirty(self, lbl_path):
+        with self.lock: return lbl_path in self.dirty or lbl_path in self.conflicts
+
+    def take_conflicts(self):
+        """Conflicts found since the last call, {path: boxes}; they stay held until written or discarded."""
+        with self.lock:
+            out = {p: self.conflicts[p] for p in self.new_conflicts}; self.new_conflicts = set()
+        return out
+
+    def discard(self, lbl_path):
+        """Forget unwritten boxes for lbl_path (the on-disk version won)."""
+        with self.flush_lock, self.lock:
+            self.dirty.pop(lbl_path, None); self.conflicts.pop(lbl_path, None); self.new_conflicts.discard(lbl_path)
+            if not self.dirty and not self.conflicts: self.journal.truncate(0); self.journal.seek(0)
+
+    def flush(self):
+        # flush_lock: a caller-side flush() waits for a background flush in progress.
+        with self.flush_lock:
+            with self.lock: batch = self.dirty; self.dirty = {}
+            if batch: self.last_error = None  # report only this pass's failures
+            for path, boxes in batch.items():
+                if self.guard and not self.guard.unchanged(path):
+                    with self.lock: self.conflicts[path] = boxes; self.new_conflicts.add(path)
+                    continue
+                try:
+                    with TRACER.span("label.write"): write_labels_atomic(path, boxes)
+                    if self.guard: self.guard.wrote(path)
+                except OSError as ex:
+                    self.last_error = (path, ex)
+                    with self.lock: self.dirty.setdefault(path, boxes)
+            with self.lock:
+                # Held conflicts are on no disk but the journal's: keep it until they are settled.
+                if not self.dirty and not self.conflicts: self.journal.truncate(0); self.journal.seek(0)
+
+    def run(self):
+        while not self.stopped:
+            self.wake.wait(self.interval); self.wake.clear()
+            if self.dirty: self.flush()
+
+    def close(self):
+        self.stopped = True; self.wake.set(); self.thread.join()
+        self.flush()
+        self.journal.close()
+        if not self.dirty and not self.conflicts and os.path.exists(self.journal_path): os.remove(self.journal_path)
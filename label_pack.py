@@ -0,0 +1,222 @@
+import os
+import sys
+import mmap
+import struct
+import argparse
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+PACK_NAME = "labels.pack"
+SEP = "::"          # "<split>/labels.pack::<image stem>" addresses one image's labels
+MAGIC = b"YLPK"
+VERSION = 1
+HEADER = struct.Struct('<4sIQQ')   # magic, version, n_images, n_boxes
+RECORD = struct.Struct('<II')      # delta record: name bytes, box count
+
+# --- Paths ---
+def is_pack_path(lbl_path): return SEP in lbl_path
+def pack_label_path(pack, name): return f"{pack}{SEP}{name}"
+
+def split_pack_path(lbl_path):
+    pack, _, name = lbl_path.rpartition(SEP)
+    return pack, name
+
+_found = {}
+def find_pack(img_dir):
+    """The labels.pack beside img_dir (<split>/images -> <split>/labels.pack), memoized per directory."""
+    p = _found.get(img_dir)
+    if p is None:
+        cand = os.path.join(os.path.dirname(img_dir), PACK_NAME)
+        p = _found[img_dir] = cand if os.path.exists(cand) else ""
+    return p or None
+
+# --- Archive ---
+def write_pack(path, names, counts, chunks):
+    """Write an archive from names, per-image box counts and the float32 box rows in name order."""
+    if any('\n' in s for s in names): raise ValueError("image names cannot contain newlines")
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(names), int(counts.sum())))
+        f.write(np.concatenate(([0], np.cumsum(counts))).astype('<i8').tobytes())
+        for c in chunks: f.write(np.ascontiguousarray(c, '<f4').tobytes())
+        f.write('\n'.join(names).encode('utf-8'))
+
+class PackedLabels:
+    """One split's labels in a single file: a header, per-image offsets (int64),
+    every box as a float32 [cls, cx, cy, w, h] row, then the image-name table.
+
+    The archive is mmapped read-only. put() appends the new box list of an
+    image to <archive>.delta, which is replayed over the archive on open until
+    compact() folds it back in.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.delta_path = path + ".delta"
+        self.lock = threading.Lock()
+        self.delta = None
+        self._open()
+
+    def _open(self):
+        self.f = open(self.path, 'rb')
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n, nb = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION: raise ValueError(f"{self.path}: not a label pack")
+        o = HEADER.size
+        self.offsets = np.frombuffer(self.mm, '<i8', n + 1, o); o += 8 * (n + 1)
+        self.boxes = np.frombuffer(self.mm, '<f4', nb * 5, o).reshape(nb, 5); o += 20 * nb
+        self.names = self.mm[o:].decode('utf-8').split('\n') if n else []
+        self.ids = dict(zip(self.names, range(n)))
+        self.edits = {}
+        self.replay()
+        st = os.fstat(self.f.fileno())
+        self.key = (st.st_mtime_ns, st.st_size, self.delta_bytes)
+
+    def replay(self):
+        self.delta_bytes = 0
+        try:
+            with open(self.delta_path, 'rb') as f: data = f.read()
+        except OSError: return
+        o = 0
+        while o + RECORD.size <= len(data):
+            ln, nb = RECORD.unpack_from(data, o)
+            end = o + RECORD.size + ln + 20 * nb
+            if end > len(data): break   # torn last record
+            name = data[o + RECORD.size:o + RECORD.size + ln].decode('utf-8')
+            self.edits[name] = np.frombuffer(data, '<f4', nb * 5, o + RECORD.size + ln).reshape(nb, 5)
+            o = end
+        if o < len(data):
+            with open(self.delta_path, 'r+b') as f: f.truncate(o)
+        self.delta_bytes = o
+
+    def has(self, name): return name in self.edits or name in self.ids
+
+    def all_names(self): return self.names + [s for s in self.edits if s not in self.ids]
+
+    def get_array(self, name):
+        b = self.edits.get(name)
+        if b is not None: return b
+        i = self.ids.get(name)
+        if i is None: return self.boxes[:0]
+        return self.boxes[self.offsets[i]:self.offsets[i + 1]]
+
+    def get(self, name): return self.get_array(name).tolist()
+
+    def put(self, name, boxes):
+        arr = np.array([b[:5] for b in boxes], '<f4').reshape(-1, 5)
+        nb = name.encode('utf-8')
+        rec = RECORD.pack(len(nb), len(arr)) + nb + arr.tobytes()
+        with self.lock:
+            if self.delta is None: self.delta = open(self.delta_path, 'ab')
+            self.delta.write(rec); self.delta.flush()
+            self.edits[name] = arr; self.delta_bytes += len(rec)
+
+    def compact(self):
+        """Rewrite the archive with the delta folded in, then drop the delta."""
+        with self.lock:
+            if not self.edits: return
+            n = len(self.names)
+            counts = np.diff(self.offsets)
+            edited = sorted(self.ids[s] for s in self.edits if s in self.ids)
+            new = [s for s in self.edits if s not in self.ids]
+            counts = np.concatenate((counts, np.zeros(len(new), np.int64)))
+            for i in edited: counts[i] = len(self.edits[self.names[i]])
+            for j, s in enumerate(new): counts[n + j] = len(self.edits[s])
+            def chunks():
+                # Unedited runs go out as single slices of the mapped archive.
+                prev = 0
+                for i in edited:
+                    yield self.boxes[self.offsets[prev]:self.offsets[i]]; yield self.edits[self.names[i]]; prev = i + 1
+                yield self.boxes[self.offsets[prev]:self.offsets[n]]
+                for s in new: yield self.edits[s]
+            tmp = self.path + ".tmp"
+            write_pack(tmp, self.names + new, counts, chunks())
+            self._close_files()   # Windows cannot replace a mapped file
+            os.replace(tmp, self.path)
+            os.remove(self.delta_path)
+            self._open()
+
+    def _close_files(self):
+        if self.delta: self.delta.close(); self.delta = None
+        self.offsets = self.boxes = None; self.edits = {}
+        try: self.mm.close()
+        except BufferError: pass   # a caller still holds a slice; the map goes with it
+        self.f.close()
+
+    def close(self):
+        with self.lock: self._close_files()
+
+# --- Shared handles ---
+_packs = {}
+_packs_lock = threading.Lock()
+
+def open_pack(path):
+    with _packs_lock:
+        pk = _packs.get(path)
+        if pk is None: pk = _packs[path] = PackedLabels(path)
+        return pk
+
+def pack_key(lbl_path):
+    """Change key of a packed label: the archive's (mtime_ns, size, delta length) at open."""
+    return open_pack(split_pack_path(lbl_path)[0]).key
+
+def read_packed(lbl_path):
+    pack, name = split_pack_path(lbl_path)
+    return open_pack(pack).get(name)
+
+def write_packed(lbl_path, boxes):
+    pack, name = split_pack_path(lbl_path)
+    open_pack(pack).put(name, boxes)
+
+def close_packs(compact_ratio=0.25):
+    """Close every open archive, compacting those whose delta outgrew compact_ratio of the archive."""
+    with _packs_lock: packs = list(_packs.values()); _packs.clear()
+    for pk in packs:
+        try:
+            if pk.delta_bytes > compact_ratio * pk.key[1]: pk.compact()
+        except OSError: pass
+        pk.close()
+
+# --- Import / export ---
+def pack_labels(labels_dir, out_path=None, workers=32):
+    """Pack every <stem>.txt in a YOLO labels directory; returns (archive path, image count)."""
+    from label_index import parse_label_file   # label_index imports this module
+    out_path = out_path or os.path.join(os.path.dirname(os.path.abspath(labels_dir)), PACK_NAME)
+    names = sorted(e.name[:-4] for e in os.scandir(labels_dir) if e.name.endswith('.txt'))
+    with ThreadPoolExecutor(workers) as ex:
+        per_image = list(ex.map(lambda s: [b[:5] for b in parse_label_file(os.path.join(labels_dir, s + ".txt"))], names))
+    counts = np.fromiter((len(b) for b in per_image), np.int64, len(per_image))
+    rows = np.array([b for boxes in per_image for b in boxes], '<f4').reshape(-1, 5)
+    write_pack(out_path + ".tmp", names, counts, [rows])
+    os.replace(out_path + ".tmp", out_path)
+    return out_path, len(names)
+
+def unpack_labels(pack_path, out_dir, workers=32):
+    """Write one <stem>.txt per image in the archive (delta included); returns [(path, error)]."""
+    from label_journal import rewrite_labels   # label_journal imports this module
+    pk = open_pack(pack_path)
+    os.makedirs(out_dir, exist_ok=True)
+    return rewrite_labels([(os.path.join(out_dir, s + ".txt"), lambda s=s: pk.get(s)) for s in pk.all_names()], workers)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Convert YOLO label directories to and from labels.pack archives")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("pack", help="labels/*.txt -> labels.pack (next to the labels dir by default)")
+    p.add_argument("labels_dir"); p.add_argument("--out")
+    p = sub.add_parser("unpack", help="labels.pack -> one .txt per image")
+    p.add_argument("pack"); p.add_argument("out_dir")
+    p = sub.add_parser("compact", help="fold an archive's .delta edits back into it")
+    p.add_argument("pack")
+    args = ap.parse_args(argv)
+    if args.cmd == "pack":
+        path, n = pack_labels(args.labels_dir, args.out)
+        print(f"packed {n} label files into {path}")
+    elif args.cmd == "unpack":
+        errors = unpack_labels(args.pack, args.out_dir)
+        for path, ex in errors: print(f"failed: {path}: {ex}", file=sys.stderr)
+        print(f"wrote {len(open_pack(args.pack).all_names()) - len(errors)} label files to {args.out_dir}")
+    else:
+        open_pack(args.pack).compact()
+    close_packs(compact_ratio=float('inf'))
+
+if __name__ == "__main__":
+    main()
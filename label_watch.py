@@ -0,0 +1,86 @@
+import os
+import threading
+from label_index import stat_key, parse_label_file
+from label_journal import format_labels
+from label_pack import is_pack_path
+
+def same_boxes(a, b):
+    """True if two box lists would write the same label file."""
+    return len(a) == len(b) and format_labels(a) == format_labels(b)
+
+class LabelWatcher:
+    """Polls label files for changes made by other programs, against the
+    (mtime_ns, size) key last read or written for each file.
+
+    A pass stats the label directories first (rename-into-place bumps the dir
+    mtime) and only re-stats files in changed dirs; every `full_every` passes
+    every file is stat'ed, which catches in-place rewrites. Changed files are
+    parsed here, off the Tk thread; drain() hands over {path: (key, boxes)}.
+    Reported keys are not trusted until accept(), so the writer's guard keeps
+    refusing to overwrite them. labels.pack archives are not watched.
+    """
+    def __init__(self, lbl_paths, keys, interval=2.0, full_every=15):
+        self.interval = interval
+        self.full_every = full_every
+        self.known = {p: k for p, k in zip(lbl_paths, keys) if not is_pack_path(p)}
+        self.by_dir = {}
+        for p in self.known: self.by_dir.setdefault(os.path.dirname(p), []).append(p)
+        self.dir_keys = {}
+        self.reported = {}
+        self.changed = {}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = False
+        self.passes = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    # --- Writer guard ---
+    def unchanged(self, path):
+        """False if path was changed on disk since we last read, wrote or accepted it."""
+        if path not in self.known: return True
+        key = stat_key(path)
+        with self.lock: return key == self.known[path]
+
+    def base(self, path):
+        """(watched, the key path had when we last read, wrote or accepted it)."""
+        with self.lock: return path in self.known, self.known.get(path)
+
+    def wrote(self, path):
+        key = stat_key(path)
+        with self.lock:
+            if path in self.known: self.known[path] = key; self.reported.pop(path, None); self.changed.pop(path, None)
+
+    def accept(self, path, key):
+        with self.lock:
+            if path in self.known: self.known[path] = key; self.reported.pop(path, None)
+
+    # --- Polling ---
+    def drain(self):
+        with self.lock: out, self.changed = self.changed, {}
+        return out
+
+    def scan(self, full):
+        for d, paths in self.by_dir.items():
+            if self.stopped: return
+            try: dk = os.stat(d).st_mtime_ns
+            except OSError: dk = None
+            if not full and self.dir_keys.get(d) == dk: continue
+            self.dir_keys[d] = dk
+            for p in paths:
+                key = stat_key(p)
+                with self.lock:
+                    if key == self.known[p] or key == self.reported.get(p): continue
+                    self.reported[p] = key
+                boxes = parse_label_file(p) if key is not None else []
+                with self.lock: self.changed[p] = (key, boxes)
+
+    def run(self):
+        while not self.stopped:
+            self.wake.wait(self.interval); self.wake.clear()
+            if self.stopped: break
+            self.scan(full=self.passes % self.full_every == 0)
+            self.passes += 1
+
+    def close(self):
+        self.stopped = True; self.wake.set(); self.thread.join()
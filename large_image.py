@@ -0,0 +1,285 @@
+import os
+import glob
+import json
+import ctypes
+import ctypes.util
+import shutil
+import hashlib
+import threading
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+
+TILE = 256
+LARGE_PIXELS = 8192 * 8192
+DECODE_PIXELS = 16384 * 16384   # largest frame the level build decodes whole (formats without region reads)
+BAND_ROWS = 512
+META_VERSION = 1
+MODES = {'L': 1, 'RGB': 3, 'RGBA': 4}
+
+# Images above LARGE_PIXELS are only read by region in the viewer, so PIL's
+# decompression-bomb guard would just refuse the 30k x 30k files this is for.
+Image.MAX_IMAGE_PIXELS = None
+
+def is_large(size, min_pixels=LARGE_PIXELS): return size[0] * size[1] > min_pixels
+
+def level_sizes(size):
+    """(w, h) of every pyramid level, matching TilePyramid's level count."""
+    w, h = size; out = [(w, h)]
+    while max(size) >> len(out) >= TILE: k = len(out); out.append((max(1, w >> k), max(1, h >> k)))
+    return out
+
+def level_mode(mode): return mode if mode in MODES else 'RGB'
+
+# --- Uncompressed TIFF ---
+class RawTiff:
+    """Zero-copy region reads from an uncompressed 8-bit TIFF: its strips or
+    tiles are memory-mapped using the offsets from PIL's tile descriptors."""
+    def __init__(self, path, im):
+        self.size = im.size; self.mode = im.mode; self.bands = MODES[im.mode]
+        self.mm = np.memmap(path, np.uint8, 'r')
+        self.ext = np.array([t[1] for t in im.tile], np.int64).reshape(-1, 4)
+        self.offsets = [t[2] for t in im.tile]
+        self.strides = [t[3][1] or (t[1][2] - t[1][0]) * self.bands for t in im.tile]
+
+    @staticmethod
+    def open(path, im):
+        """A RawTiff for im, or None when its pixels are compressed or not plain 8-bit."""
+        if im.format != 'TIFF' or im.mode not in MODES or not im.tile: return None
+        if any(t[0] != 'raw' or t[3][0] != im.mode or t[3][2] != 1 for t in im.tile): return None
+        return RawTiff(path, im)
+
+    def view(self, i):
+        x1, y1, x2, y2 = self.ext[i]; s = self.strides[i]
+        rows = self.mm[self.offsets[i]:self.offsets[i] + (y2 - y1) * s].reshape(y2 - y1, s)
+        return rows[:, :(x2 - x1) * self.bands].reshape(y2 - y1, x2 - x1, self.bands)
+
+    def read(self, x1, y1, x2, y2):
+        e = self.ext
+        hit = np.nonzero((e[:, 0] < x2) & (e[:, 2] > x1) & (e[:, 1] < y2) & (e[:, 3] > y1))[0]
+        if len(hit) == 1 and e[hit[0], 0] <= x1 and e[hit[0], 1] <= y1 and e[hit[0], 2] >= x2 and e[hit[0], 3] >= y2:
+            i = hit[0]; return self.view(i)[y1 - e[i, 1]:y2 - e[i, 1], x1 - e[i, 0]:x2 - e[i, 0]]
+        out = np.empty((y2 - y1, x2 - x1, self.bands), np.uint8)
+        for i in hit:
+            ex1, ey1, ex2, ey2 = e[i]
+            ix1, iy1, ix2, iy2 = max(x1, ex1), max(y1, ey1), min(x2, ex2), min(y2, ey2)
+            out[iy1 - y1:iy2 - y1, ix1 - x1:ix2 - x1] = self.view(i)[iy1 - ey1:iy2 - ey1, ix1 - ex1:ix2 - ex1]
+        return out
+
+# --- Compressed TIFF ---
+_libtiff = None
+def libtiff():
+    """The libtiff shared library (the system one, else the copy bundled with Pillow), or None."""
+    global _libtiff
+    if _libtiff is None:
+        import PIL
+        here = os.path.dirname(PIL.__file__)
+        names = [ctypes.util.find_library('tiff')] + glob.glob(os.path.join(here, os.pardir, "pillow.libs", "libtiff*")) \
+                + glob.glob(os.path.join(here, ".dylibs", "libtiff*"))
+        _libtiff = False
+        for name in filter(None, names):
+            try: lib = ctypes.CDLL(name)
+            except OSError: continue
+            lib.TIFFOpen.restype = ctypes.c_void_p; lib.TIFFOpen.argtypes = [ctypes.c_char_p, ctypes.c_char_p]
+            lib.TIFFClose.argtypes = [ctypes.c_void_p]
+            for fn in (lib.TIFFReadEncodedStrip, lib.TIFFReadEncodedTile):
+                fn.restype = ctypes.c_ssize_t; fn.argtypes = [ctypes.c_void_p, ctypes.c_uint32, ctypes.c_void_p, ctypes.c_ssize_t]
+            lib.TIFFSetWarningHandler(None)   # GeoTIFF tags libtiff does not know would flood stderr
+            _libtiff = lib; break
+    return _libtiff or None
+
+class TiffChunks:
+    """Decodes a compressed 8-bit TIFF one strip or tile at a time through
+    libtiff. Pillow hands such files to libtiff as a single whole-image tile,
+    which for a 30k x 30k frame means gigabytes; here only one chunk is held."""
+    def __init__(self, path, im):
+        t = im.tag_v2
+        self.path = path; self.size = im.size; self.mode = im.mode; self.bands = MODES[im.mode]
+        self.tiled = 322 in t
+        self.cw, self.ch = (t[322], t[323]) if self.tiled else (im.size[0], t.get(278, im.size[1]))
+        self.ycbcr_jpeg = t.get(259) == 7 and t.get(262) == 6
+
+    @staticmethod
+    def open(path, im):
+        """A TiffChunks for im, or None when libtiff is missing or the pixels are not chunky 8-bit."""
+        if im.format != 'TIFF' or im.mode not in MODES or libtiff() is None: return None
+        t = im.tag_v2
+        if any(b != 8 for b in t.get(258, (8,))) or t.get(284, 1) != 1 or t.get(339, (1,))[0] != 1: return None
+        if t.get(262) == 6 and t.get(259) != 7: return None   # subsampled YCbCr is only converted for JPEG
+        return TiffChunks(path, im)
+
+    def read(self):
+        """Yield (x1, y1, x2, y2, pixels) for every strip or tile, in file order."""
+        lib = libtiff(); w, h = self.size; c = self.bands
+        tif = lib.TIFFOpen(self.path.encode(), b"r")
+        if not tif: raise OSError(f"libtiff cannot open {self.path}")
+        try:
+            if self.ycbcr_jpeg: lib.TIFFSetField(ctypes.c_void_p(tif), 65538, 1)   # JPEGCOLORMODE = RGB
+            buf = np.empty(self.ch * self.cw * c, np.uint8)
+            across = (w + self.cw - 1) // self.cw
+            for k in range(((h + self.ch - 1) // self.ch) * across):
+                x1, y1 = (k % across) * self.cw, (k // across) * self.ch
+                x2, y2 = min(x1 + self.cw, w), min(y1 + self.ch, h)
+                rows = self.ch if self.tiled else y2 - y1
+                read = lib.TIFFReadEncodedTile if self.tiled else lib.TIFFReadEncodedStrip
+                if read(tif, k, buf.ctypes.data, rows * self.cw * c) < 0:
+                    raise OSError(f"libtiff cannot decode {'tile' if self.tiled else 'strip'} {k} of {self.path}")
+                yield x1, y1, x2, y2, buf[:rows * self.cw * c].reshape(rows, self.cw, c)[:y2 - y1, :x2 - x1]
+        finally: lib.TIFFClose(tif)
+
+# --- Converted levels ---
+def reduce2(a, h, w):
+    """2x2 box filter of an (2h, 2w, c) uint8 array."""
+    a = a[:2 * h, :2 * w].astype(np.uint16)
+    return ((a[0::2, 0::2] + a[1::2, 0::2] + a[0::2, 1::2] + a[1::2, 1::2] + 2) >> 2).astype(np.uint8)
+
+def build_levels(path, out_dir, skip_level0):
+    """Worker: write every pyramid level of path as a raw uint8 (h, w, c) file.
+
+    Level 0 is read from the memory-mapped TIFF when possible, else decoded
+    strip by strip or tile by tile through libtiff, and every coarser level is
+    built in bands from the one below, so a TIFF never has to fit in memory.
+    Other formats (and TIFFs libtiff cannot split) are decoded whole here, in
+    the worker, up to DECODE_PIXELS. Progress goes to <tmp>/progress; the
+    finished directory is renamed in place.
+    """
+    tmp = out_dir + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True); os.makedirs(tmp)
+    im = Image.open(path)
+    size = im.size; raw = RawTiff.open(path, im)
+    chunks = TiffChunks.open(path, im) if raw is None else None
+    if raw is not None: mode = raw.mode
+    elif chunks is not None: mode = chunks.mode
+    elif size[0] * size[1] > DECODE_PIXELS:
+        im.close()
+        raise ValueError(f"{size[0]}x{size[1]} {im.format} cannot be read by region; save it as a tiled TIFF")
+    else: mode = level_mode(im.mode)
+    if raw is not None or chunks is not None: im.close()
+    sizes = level_sizes(size); c = MODES[mode]
+    total = sum(w * h for w, h in sizes); done = 0
+    def progress(n):
+        nonlocal done; done += n
+        with open(os.path.join(tmp, "progress"), 'w') as f: f.write(f"{done / total:.4f}")
+
+    prev = None
+    for k, (w, h) in enumerate(sizes):
+        if k == 0 and skip_level0 and raw is not None: progress(w * h); prev = lambda y1, y2, w=w: raw.read(0, y1, w, y2); continue
+        out = np.memmap(os.path.join(tmp, f"L{k}.u8"), np.uint8, 'w+', shape=(h, w, c))
+        if k == 0 and chunks is not None:
+            for x1, y1, x2, y2, a in chunks.read(): out[y1:y2, x1:x2] = a; progress((y2 - y1) * (x2 - x1))
+        else:
+            for y in range(0, h, BAND_ROWS):
+                y2 = min(h, y + BAND_ROWS)
+                if k > 0: out[y:y2] = reduce2(prev(2 * y, 2 * y2), y2 - y, w)
+                elif raw is not None: out[y:y2] = raw.read(0, y, w, y2)
+                else: out[y:y2] = np.asarray(im.crop((0, y, w, y2)).convert(mode)).reshape(y2 - y, w, c)
+                progress((y2 - y) * w)
+        if k == 0 and raw is None and chunks is None: im.close()
+        out.flush(); del out
+        mm = np.memmap(os.path.join(tmp, f"L{k}.u8"), np.uint8, 'r', shape=(h, w, c))
+        prev = lambda y1, y2, mm=mm: mm[y1:y2]
+    prev = None
+    meta = {'version': META_VERSION, 'size': list(size), 'mode': mode, 'levels': [list(s) for s in sizes],
+            'level0': not (skip_level0 and raw is not None)}
+    with open(os.path.join(tmp, "meta.json"), 'w') as f: json.dump(meta, f)
+    os.remove(os.path.join(tmp, "progress"))
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp, out_dir)
+    return out_dir
+
+class MMapLevels:
+    """The level files written by build_levels(), memory-mapped on first use."""
+    def __init__(self, out_dir):
+        with open(os.path.join(out_dir, "meta.json")) as f: meta = json.load(f)
+        if meta.get('version') != META_VERSION: raise ValueError("stale level cache")
+        self.dir = out_dir; self.mode = meta['mode']; self.sizes = [tuple(s) for s in meta['levels']]
+        self.first = 0 if meta['level0'] else 1
+        self.maps = {}
+
+    def read(self, k, x1, y1, x2, y2):
+        mm = self.maps.get(k)
+        if mm is None:
+            w, h = self.sizes[k]
+            mm = self.maps[k] = np.memmap(os.path.join(self.dir, f"L{k}.u8"), np.uint8, 'r', shape=(h, w, MODES[self.mode]))
+        return mm[y1:y2, x1:x2]
+
+# --- Per-image source ---
+class LargeImage:
+    """Region source for one large image: level 0 straight from an uncompressed
+    TIFF when possible, every other level from its converted level cache."""
+    def __init__(self, path, im, out_dir):
+        self.path = path
+        self.size = im.size
+        self.sizes = level_sizes(im.size)
+        self.raw = RawTiff.open(path, im)
+        self.mode = self.raw.mode if self.raw else level_mode(im.mode)
+        self.dir = out_dir
+        self.levels = None
+        self.future = None
+        self.error = None
+        self.ready()
+
+    def ready(self):
+        """True once every level can be read (opens the level cache when the build finished)."""
+        if self.levels is not None: return True
+        if self.future is not None and self.future.done():
+            try: self.future.result()
+            except Exception as ex: self.error = ex
+            self.future = None
+        try: self.levels = MMapLevels(self.dir)
+        except (OSError, ValueError): return False
+        return True
+
+    def available(self, k): return (k == 0 and self.raw is not None) or self.ready()
+
+    def progress(self):
+        try:
+            with open(self.dir + ".tmp/progress") as f: return float(f.read() or 0)
+        except (OSError, ValueError): return 0.0
+
+    def read(self, k, box):
+        x1, y1, x2, y2 = box
+        if k == 0 and self.raw is not None: a = self.raw.read(x1, y1, x2, y2)
+        else: a = self.levels.read(k, x1, y1, x2, y2)
+        return Image.fromarray(np.ascontiguousarray(a[..., 0] if a.shape[2] == 1 else a))
+
+class LargeImages:
+    """Opens LargeImage sources under `root` and runs their one-time level
+    builds on a single worker process, newest request first."""
+    def __init__(self, root, min_pixels=LARGE_PIXELS):
+        self.root = root
+        self.min_pixels = min_pixels
+        self.pool = None
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def wants(self, size): return is_large(size, self.min_pixels)
+
+    def key(self, path):
+        st = os.stat(path)
+        return hashlib.blake2b(f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}".encode(), digest_size=16).hexdigest()
+
+    def open(self, path, im):
+        src = LargeImage(path, im, os.path.join(self.root, self.key(path)))
+        if src.levels is None: self.build(src)
+        return src
+
+    def build(self, src):
+        with self.lock:
+            # Only the image on screen matters: drop builds that have not started yet.
+            for p, fut in list(self.pending.items()):
+                if p != src.path and fut.cancel(): del self.pending[p]
+            fut = self.pending.get(src.path)
+            if fut is None:
+                if self.pool is None: self.pool = ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn"))
+                os.makedirs(self.root, exist_ok=True)
+                fut = self.pending[src.path] = self.pool.submit(build_levels, src.path, src.dir, True)
+                fut.add_done_callback(lambda f, p=src.path: self._done(p))
+        src.future = fut
+
+    def _done(self, path):
+        with self.lock: self.pending.pop(path, None)
+
+    def shutdown(self):
+        if self.pool: self.pool.shutdown(wait=False, cancel_futures=True)
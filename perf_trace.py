@@ -0,0 +1,123 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+
+STAT_WINDOW = 1000
+MAX_EVENTS = 1_000_000
+
+class _NullSpan:
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+_NULL = _NullSpan()
+
+class _Span:
+    __slots__ = ('tracer', 'name', 't0')
+    def __init__(self, tracer, name): self.tracer = tracer; self.name = name
+    def __enter__(self): self.t0 = time.perf_counter_ns(); return self
+    def __exit__(self, *exc): self.tracer.record(self.name, self.t0, time.perf_counter_ns()); return False
+
+class Tracer:
+    """Stage timings for the render and I/O hot paths.
+
+    Disabled, span() hands back a shared no-op context manager, so the
+    instrumented code pays one attribute check. Enabled, every span feeds a
+    rolling window per stage (for p50/p95) and a Chrome trace-event list.
+    """
+    def __init__(self):
+        self.enabled = os.environ.get("YOLO_TRACE") == "1"
+        self.t_base = time.perf_counter_ns()
+        self.stats = {}
+        self.events = deque(maxlen=MAX_EVENTS)
+
+    def span(self, name):
+        return _Span(self, name) if self.enabled else _NULL
+
+    def record(self, name, t0, t1):
+        d = self.stats.get(name)
+        if d is None: d = self.stats[name] = deque(maxlen=STAT_WINDOW)
+        d.append((t1 - t0) / 1e6)
+        self.events.append((name, t0, t1, threading.get_ident()))
+
+    def percentiles(self):
+        out = {}
+        for name, d in list(self.stats.items()):
+            xs = sorted(d)
+            if xs: out[name] = (xs[len(xs) // 2], xs[min(len(xs) - 1, int(len(xs) * 0.95))], len(xs))
+        return out
+
+    def summary_text(self):
+        rows = [f"{'stage':<16}{'p50 ms':>9}{'p95 ms':>9}"]
+        for name, (p50, p95, n) in sorted(self.percentiles().items()):
+            rows.append(f"{name:<16}{p50:>9.2f}{p95:>9.2f}")
+        return "\n".join(rows)
+
+    def export_chrome(self, path):
+        """Write the recorded spans as Chrome trace-event JSON (chrome://tracing, Perfetto)."""
+        pid = os.getpid()
+        events = [{'name': n, 'cat': n.split('.')[0], 'ph': 'X', 'pid': pid, 'tid': tid,
+                   'ts': (t0 - self.t_base) / 1000, 'dur': (t1 - t0) / 1000} for n, t0, t1, tid in list(self.events)]
+        with open(path, 'w') as f: json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        return len(events)
+
+TRACER = Tracer()
+
+class StartupTimer:
+    """Startup milestones in seconds since t0, a time.perf_counter() taken at
+    the top of the script before its heavy imports.
+
+    mark() also records each milestone as a span from t0 (so it shows in the
+    trace export); report() appends them to <cache>/startup_times.tsv.
+    """
+    def __init__(self, t0):
+        self.t0 = t0
+        self.marks = {}
+
+    def mark(self, name):
+        t1 = time.perf_counter(); self.marks[name] = t1 - self.t0
+        if TRACER.enabled: TRACER.record("startup." + name, int(self.t0 * 1e9), int(t1 * 1e9))
+        return self.marks[name]
+
+    def text(self): return ", ".join(f"{k} {v:.2f} s" for k, v in self.marks.items())
+
+    def report(self, cache, app):
+        try:
+            with open(os.path.join(cache, "startup_times.tsv"), 'a') as f:
+                f.write("\t".join([time.strftime("%Y-%m-%dT%H:%M:%S"), app] + [f"{k}={v:.3f}" for k, v in self.marks.items()]) + "\n")
+        except OSError: pass
+
+class PerfOverlay:
+    """Hotkey-toggled p50/p95 table drawn over a canvas; exports the trace when switched off."""
+    def __init__(self, root, canvas, export_dir, status=None, hotkey="<F12>"):
+        import tkinter as tk
+        self.root = root
+        self.export_dir = export_dir
+        self.status = status
+        self.label = tk.Label(canvas, font=("Consolas", 9), bg="black", fg="#00FF00", justify=tk.LEFT, anchor="nw")
+        root.bind(hotkey, lambda e: self.toggle())
+        if TRACER.enabled: self.show()
+
+    def show(self):
+        self.label.place(x=10, y=10); self.refresh()
+
+    def toggle(self):
+        if TRACER.enabled:
+            TRACER.enabled = False; self.label.place_forget(); self.export()
+        else:
+            TRACER.enabled = True; self.show()
+            if self.status: self.status("Tracing on (F12 to stop and export)")
+
+    def refresh(self):
+        if not TRACER.enabled: return
+        self.label.config(text=TRACER.summary_text())
+        self.root.after(500, self.refresh)
+
+    def export(self):
+        if not TRACER.events: return None
+        path = os.path.join(self.export_dir, time.strftime("trace-%Y%m%d-%H%M%S.json"))
+        n = TRACER.export_chrome(path)
+        TRACER.events.clear()
+        if self.status: self.status(f"Trace: {n} events -> {path}")
+        return path
@@ -0,0 +1,187 @@
+import time
+import json
+import sqlite3
+import threading
+import numpy as np
+
+UNREVIEWED, ACCEPTED, MODIFIED = 0, 1, 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS box_review (
+    path TEXT NOT NULL, idx INTEGER NOT NULL, status INTEGER NOT NULL,
+    reviewer TEXT, ts REAL,
+    PRIMARY KEY (path, idx)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS label_key (path TEXT PRIMARY KEY, key TEXT) WITHOUT ROWID;
+"""
+
+UPSERT = """
+INSERT INTO box_review (path, idx, status, reviewer, ts) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (path, idx) DO UPDATE SET status = excluded.status, reviewer = excluded.reviewer, ts = excluded.ts
+WHERE box_review.status != excluded.status
+"""
+
+def key_text(key): return json.dumps(list(key)) if key is not None else None
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+class ReviewDB:
+    """Per-box review status in an SQLite (WAL) file, keyed by (image path, box index).
+
+    put() only records the latest statuses of an image; a background thread
+    writes whatever is pending in one transaction every `interval` seconds.
+    Reviewer and timestamp change only on rows whose status changed.
+
+    Box indices only mean something for the label file they were reviewed
+    on: with a `stamp` (image path -> its label file's change key, or None
+    while a write is pending), each image's key is stored next to its rows,
+    and close() stamps every image put this session once more, after the
+    labels are written. apply_rows() skips rows stored against another key.
+    """
+    def __init__(self, db_path, reviewer, interval=1.0, stamp=None):
+        self.db_path = db_path
+        self.reviewer = reviewer
+        self.interval = interval
+        self.stamp = stamp
+        self.touched = set()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = False
+        self.last_error = None
+        conn = connect(db_path)
+        with conn: conn.executescript(SCHEMA)
+        conn.close()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def load(self):
+        """All stored (path, idx, status, label key text) rows; safe to call from any thread."""
+        conn = connect(self.db_path)
+        try: return conn.execute("SELECT r.path, r.idx, r.status, k.key FROM box_review r LEFT JOIN label_key k ON k.path = r.path "
+                                 "WHERE r.status != 0").fetchall()
+        finally: conn.close()
+
+    def put(self, path, statuses):
+        with self.lock: self.pending[path] = (list(map(int, statuses)), time.time()); self.touched.add(path)
+
+    def _stamp(self, conn, paths):
+        for path in paths:
+            key = self.stamp(path)
+            if key is not None: conn.execute("INSERT OR REPLACE INTO label_key (path, key) VALUES (?, ?)", (path, key_text(key)))
+
+    def flush(self, conn):
+        with self.lock: batch, self.pending = self.pending, {}
+        if not batch: return
+        try:
+            with conn:
+                for path, (statuses, ts) in batch.items():
+                    conn.executemany(UPSERT, [(path, i, s, self.reviewer, ts) for i, s in enumerate(statuses)])
+                    conn.execute("DELETE FROM box_review WHERE path = ? AND idx >= ?", (path, len(statuses)))
+                if self.stamp: self._stamp(conn, batch)
+            self.last_error = None
+        except sqlite3.Error as ex:
+            self.last_error = ex
+            with self.lock:
+                for path, v in batch.items(): self.pending.setdefault(path, v)
+
+    def run(self):
+        conn = connect(self.db_path)
+        while not self.stopped:
+            self.wake.wait(self.interval); self.wake.clear()
+            self.flush(conn)
+        self.flush(conn)
+        conn.close()
+
+    def close(self):
+        """Call once the label files are written, so the final stamps match them."""
+        self.stopped = True; self.wake.set(); self.thread.join()
+        if not (self.stamp and self.touched): return
+        conn = connect(self.db_path)
+        try:
+            with conn: self._stamp(conn, self.touched)
+        except sqlite3.Error as ex: self.last_error = ex
+        finally: conn.close()
+
+def apply_rows(store, image_ids, rows, label_key=None):
+    """Copy loaded (path, idx, status, key) rows onto a freshly built BoxStore. With label_key
+    (image path -> its label file's current key), rows of a file changed since they were stored are skipped."""
+    if label_key:
+        keys = {r[0]: r[3] for r in rows}
+        fresh = {p for p, k in keys.items() if k is not None and k == key_text(label_key(p))}
+        rows = [r for r in rows if r[0] in fresh]
+    if not rows: return
+    ids = np.fromiter((image_ids.get(r[0], -1) for r in rows), np.int64, len(rows))
+    idx = np.fromiter((r[1] for r in rows), np.int64, len(rows))
+    st = np.fromiter((r[2] for r in rows), np.uint8, len(rows))
+    ok = ids >= 0
+    ok[ok] &= idx[ok] < store.counts[ids[ok]]   # label file shrank outside the tool
+    store.status[store.start[ids[ok]] + idx[ok]] = st[ok]
+
+class ReviewIndex:
+    """Fenwick tree over per-image unreviewed box counts of a BoxStore.
+
+    next_unreviewed() finds the first unreviewed box at or after a global
+    box number in O(log N) plus a scan of one image's boxes.
+    """
+    def __init__(self, store):
+        self.store = store
+        n = store.n_images
+        self.n = n
+        live = store.alive[:store.size] & (store.status[:store.size] == UNREVIEWED)
+        self.counts = np.bincount(store.img[:store.size][live], minlength=n).astype(np.int64)
+        csum = np.concatenate(([0], np.cumsum(self.counts)))
+        i = np.arange(1, n + 1)
+        self.tree = np.zeros(n + 1, np.int64)
+        self.tree[1:] = csum[i] - csum[i - (i & -i)]
+        self.total = int(csum[-1])
+
+    def refresh(self, img_id):
+        """Recount one image after its boxes or statuses changed."""
+        rows = list(self.store.rows(img_id))
+        c = int(np.count_nonzero(self.store.status[rows] == UNREVIEWED)) if rows else 0
+        delta = c - int(self.counts[img_id])
+        if not delta: return
+        self.counts[img_id] = c; self.total += delta
+        i = img_id + 1
+        while i <= self.n: self.tree[i] += delta; i += i & -i
+
+    def _before(self, img_id):
+        s = 0; i = img_id
+        while i > 0: s += self.tree[i]; i -= i & -i
+        return int(s)
+
+    def _image_at(self, rem):
+        pos = 0
+        step = 1 << (self.n.bit_length() - 1) if self.n else 0
+        while step:
+            nxt = pos + step
+            if nxt <= self.n and self.tree[nxt] <= rem: pos = nxt; rem -= int(self.tree[nxt])
+            step >>= 1
+        return pos
+
+    def next_unreviewed(self, q):
+        """Global index of the first unreviewed box at or after q, or None."""
+        store = self.store
+        if q >= len(store) or not self.total: return None
+        img_id, local = store.locate(max(q, 0))
+        rows = store.rows(img_id)
+        for j in range(local, len(rows)):
+            if store.status[rows[j]] == UNREVIEWED: return store.global_index(img_id, j)
+        rem = self._before(img_id + 1)
+        if rem >= self.total: return None
+        img_id = self._image_at(rem)
+        rows = store.rows(img_id)
+        for j in range(len(rows)):
+            if store.status[rows[j]] == UNREVIEWED: return store.global_index(img_id, j)
+        return None
+
+    def reviewed(self): return len(self.store) - self.total
+
+    def unreviewed_in(self, lo, hi):
+        """Unreviewed boxes in images [lo, hi)."""
+        return self._before(hi) - self._before(lo)
@@ -0,0 +1,111 @@
+import os
+import csv
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from spatial_index import BoxGrid
+from label_pack import is_pack_path, read_packed
+from label_index import is_pixel_box
+
+DUP_IOU = 0.9
+EDGE_EPS = 1e-3
+
+ISSUES = {
+    'malformed': "line is not 'cls cx cy w h'",
+    'bad_class': "class id not in the dataset's names",
+    'zero_area': "width or height <= 0",
+    'out_of_range': "normalized box reaches outside [0, 1]",
+    'pixel_coords': "pixel coordinates in a YOLO label file",
+    'mixed_coords': "pixel box in a file of normalized boxes",
+    'duplicate': "overlaps an earlier box at IoU >= %.2f" % DUP_IOU,
+}
+
+def iou(a, b):
+    _, ax, ay, aw, ah = a; _, bx, by, bw, bh = b
+    ix = min(ax + aw/2, bx + bw/2) - max(ax - aw/2, bx - bw/2)
+    iy = min(ay + ah/2, by + bh/2) - max(ay - ah/2, by - bh/2)
+    if ix <= 0 or iy <= 0: return 0.0
+    inter = ix * iy
+    return inter / (aw*ah + bw*bh - inter)
+
+def check_boxes(boxes, n_classes, dup_iou=DUP_IOU):
+    """[(box index, issue code)] for one image's [cls, cx, cy, w, h] boxes."""
+    out = []
+    pixel = [is_pixel_box(b) for b in boxes]  # the rule the loaders use to normalize
+    n_pixel = sum(pixel)
+    for i, (cls, cx, cy, w, h) in enumerate(b[:5] for b in boxes):
+        if cls != int(cls) or not 0 <= cls < n_classes: out.append((i, 'bad_class'))
+        if w <= 0 or h <= 0: out.append((i, 'zero_area'))
+        if pixel[i]: out.append((i, 'mixed_coords' if n_pixel < len(boxes) else 'pixel_coords'))
+        elif cx - w/2 < -EDGE_EPS or cy - h/2 < -EDGE_EPS or cx + w/2 > 1 + EDGE_EPS or cy + h/2 > 1 + EDGE_EPS:
+            out.append((i, 'out_of_range'))
+
+    # Near-duplicates: IoU is invariant to per-axis scaling, so pixel files are scaled into
+    # [0, 1] and every box only meets the candidates the grid returns for its own rectangle.
+    sx = max([b[1] + b[3]/2 for b in boxes] + [1.0]); sy = max([b[2] + b[4]/2 for b in boxes] + [1.0])
+    norm = [[b[0], b[1]/sx, b[2]/sy, b[3]/sx, b[4]/sy] for b in boxes]
+    grid = BoxGrid(norm)
+    for j, b in enumerate(norm):
+        for i in grid.query(b[1] - b[3]/2, b[2] - b[4]/2, b[1] + b[3]/2, b[2] + b[4]/2):
+            if i >= j: break
+            if iou(norm[i], b) >= dup_iou: out.append((j, 'duplicate')); break
+    return out
+
+def scan_file(lbl_path, n_classes, dup_iou=DUP_IOU):
+    """Issues of one label file: [(box index, code)], malformed lines get index -1.
+
+    Box indices count well-formed lines only, like parse_label_file.
+    """
+    if is_pack_path(lbl_path):
+        try: return check_boxes(read_packed(lbl_path), n_classes, dup_iou)
+        except (OSError, ValueError): return []
+    boxes = []; bad = 0
+    try:
+        with open(lbl_path, 'r') as f:
+            for line in f:
+                if not line.strip(): continue
+                try: parts = list(map(float, line.split()))
+                except ValueError: bad += 1; continue
+                if len(parts) >= 5: boxes.append(parts[:5])
+                else: bad += 1
+    except OSError: return []
+    return [(-1, 'malformed')] * bad + check_boxes(boxes, n_classes, dup_iou)
+
+def _scan_chunk(args):
+    lbl_paths, n_classes, dup_iou = args
+    return [scan_file(p, n_classes, dup_iou) for p in lbl_paths]
+
+class SanityScanner:
+    """Checks every label file on a process pool (threads with processes=False)."""
+    def __init__(self, n_classes, dup_iou=DUP_IOU, workers=None, processes=True, chunk_size=256):
+        self.n_classes = n_classes
+        self.dup_iou = dup_iou
+        self.workers = workers or (os.cpu_count() or 4)
+        self.processes = processes
+        self.chunk_size = chunk_size
+
+    def run(self, lbl_paths, progress=None):
+        """[(file index, box index, code)] over lbl_paths, in file order."""
+        findings = []; done = 0
+        chunks = [lbl_paths[i:i + self.chunk_size] for i in range(0, len(lbl_paths), self.chunk_size)]
+        # Spawned, not forked: the GUI's writer, watcher and prefetch threads may hold locks at fork time.
+        if self.processes: pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        else: pool = ThreadPoolExecutor(self.workers)
+        with pool:
+            for chunk, results in zip(chunks, pool.map(_scan_chunk, [(c, self.n_classes, self.dup_iou) for c in chunks])):
+                for issues in results:
+                    findings.extend((done, i, code) for i, code in issues); done += 1
+                if progress: progress(done, len(lbl_paths))
+        return findings
+
+def write_report(path, findings, image_paths, lbl_paths):
+    """Tab-separated report (issue, image, label file, box index) plus a per-issue count."""
+    counts = {}
+    tmp = path + ".tmp"
+    with open(tmp, 'w', newline='') as f:
+        w = csv.writer(f, delimiter='\t')
+        w.writerow(['issue', 'image', 'label', 'box'])
+        for file_idx, box_idx, code in findings:
+            counts[code] = counts.get(code, 0) + 1
+            w.writerow([code, image_paths[file_idx], lbl_paths[file_idx], box_idx])
+    os.replace(tmp, path)
+    return counts
@@ -0,0 +1,55 @@
+import math
+
+MAX_GRID = 256
+BIG_CELLS = 64
+
+class BoxGrid:
+    """Uniform grid over normalized image coordinates for hit-tests and viewport culling.
+
+    Holds indices into the caller's [cls, cx, cy, w, h] list. Boxes that would
+    span more than BIG_CELLS cells are kept in a separate list that every query
+    checks, so one huge box does not fill the whole grid. Appends can be
+    inserted in place; any delete shifts indices, so callers rebuild.
+    """
+    def __init__(self, boxes):
+        self.boxes = boxes
+        self.g = min(max(int(math.sqrt(len(boxes))), 1), MAX_GRID)
+        self.cells = {}
+        self.big = []
+        for i in range(len(boxes)): self.insert(i)
+
+    def _cell(self, v):
+        return min(max(int(v * self.g), 0), self.g - 1)
+
+    def insert(self, i):
+        _, cx, cy, w, h = self.boxes[i]
+        gx1, gy1 = self._cell(cx - w/2), self._cell(cy - h/2)
+        gx2, gy2 = self._cell(cx + w/2), self._cell(cy + h/2)
+        if (gx2-gx1+1) * (gy2-gy1+1) > BIG_CELLS: self.big.append(i); return
+        for gx in range(gx1, gx2+1):
+            for gy in range(gy1, gy2+1): self.cells.setdefault((gx, gy), []).append(i)
+
+    def hit(self, nx, ny):
+        """Index of the smallest box containing the point, or None."""
+        best = None; best_area = None
+        for i in self.cells.get((self._cell(nx), self._cell(ny)), []) + self.big:
+            _, bcx, bcy, bw, bh = self.boxes[i]
+            if abs(bcx-nx) < bw/2 and abs(bcy-ny) < bh/2 and (best is None or bw*bh < best_area):
+                best = i; best_area = bw*bh
+        return best
+
+    def query(self, x1, y1, x2, y2):
+        """Sorted indices of boxes overlapping the normalized rectangle."""
+        gx1, gy1, gx2, gy2 = self._cell(x1), self._cell(y1), self._cell(x2), self._cell(y2)
+        found = set(self.big)
+        if (gx2-gx1+1) * (gy2-gy1+1) >= len(self.cells):
+            for ids in self.cells.values(): found.update(ids)
+        else:
+            for gx in range(gx1, gx2+1):
+                for gy in range(gy1, gy2+1): found.update(self.cells.get((gx, gy), ()))
+        out = []
+        for i in found:
+            _, cx, cy, w, h = self.boxes[i]
+            if cx + w/2 >= x1 and cx - w/2 <= x2 and cy + h/2 >= y1 and cy - h/2 <= y2: out.append(i)
+        out.sort()
+        return out
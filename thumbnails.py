@@ -0,0 +1,303 @@
+import os
+import pickle
+import hashlib
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from PIL import Image
+from label_index import parse_label_file
+from large_image import is_large
+from frame_scheduler import FrameScheduler
+from perf_trace import TRACER
+
+THUMB = 160
+HEAD_BYTES = 64 * 1024
+INDEX_VERSION = 1
+
+# --- Worker (module level so it pickles for the process pool) ---
+def content_key(img_path, size):
+    """Hash of the file size plus its first and last 64 KB: stable across renames and copies."""
+    h = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(img_path, 'rb') as f:
+        h.update(f.read(HEAD_BYTES))
+        if size > 2 * HEAD_BYTES: f.seek(-HEAD_BYTES, os.SEEK_END); h.update(f.read())
+    return h.hexdigest()
+
+def thumb_file(root, key): return os.path.join(root, key[:2], key + ".jpg")
+
+def make_thumb(img_path, root):
+    """Write the thumbnail of img_path (if its content is new); returns its index entry."""
+    st = os.stat(img_path)
+    key = content_key(img_path, st.st_size)
+    out = thumb_file(root, key)
+    with Image.open(img_path) as img:
+        full = img.size
+        # draft() only shrinks JPEG decodes; anything else this big would be decoded whole.
+        if is_large(full) and img.format != 'JPEG': raise ValueError(f"{img_path}: too large to thumbnail")
+        if not os.path.exists(out):
+            img.draft('RGB', (THUMB, THUMB))   # JPEG: decode at 1/2..1/8 scale
+            img = img.convert('RGB')
+            img.thumbnail((THUMB, THUMB))
+            os.makedirs(os.path.dirname(out), exist_ok=True)
+            tmp = out + f".{os.getpid()}.tmp"
+            img.save(tmp, 'JPEG', quality=80)
+            os.replace(tmp, out)
+    return img_path, (st.st_mtime_ns, st.st_size, key, full)
+
+# --- Cache ---
+class ThumbCache:
+    """Persistent, content-keyed thumbnail store under `root`.
+
+    Thumbnails are files named by content_key(); an index maps each image path
+    to (mtime_ns, size, key, full size) so lookups only stat. Missing
+    thumbnails are generated on a process pool; request() drops queued work
+    that scrolled out of view and drain() hands finished paths to the Tk thread.
+    """
+    def __init__(self, root, workers=None, processes=True):
+        self.root = root
+        self.index_path = os.path.join(root, "index.pkl")
+        os.makedirs(root, exist_ok=True)
+        self.index = {}
+        try:
+            with open(self.index_path, 'rb') as f: data = pickle.load(f)
+            if data.get('version') == INDEX_VERSION: self.index = data['entries']
+        except Exception: pass
+        self.dirty = False
+        workers = workers or (os.cpu_count() or 4)
+        self.pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) if processes else ThreadPoolExecutor(workers)
+        self.pending = {}
+        self.ready = []
+        self.failed = set()
+        self.stale = set()
+        self.lock = threading.Lock()
+
+    def lookup(self, path):
+        """(thumbnail file, full image size) if a current thumbnail exists, else None."""
+        e = self.index.get(path)
+        if e is None: return None
+        try: st = os.stat(path)
+        except OSError: return None
+        if (st.st_mtime_ns, st.st_size) != e[:2]: self.stale.add(path); return None
+        return thumb_file(self.root, e[2]), e[3]
+
+    def _done(self, path, fut):
+        with self.lock:
+            self.pending.pop(path, None)
+            if fut.cancelled(): return
+            try: p, entry = fut.result()
+            except Exception: self.failed.add(path); return
+            self.index[p] = entry; self.dirty = True; self.stale.discard(p)
+            self.ready.append(p)
+
+    def request(self, paths):
+        """Generate thumbnails for paths (most wanted first), cancelling queued ones not listed."""
+        wanted = set(paths)
+        with self.lock:
+            for p, fut in list(self.pending.items()):
+                if p not in wanted and fut.cancel(): del self.pending[p]
+            todo = [p for p in paths if p not in self.pending and p not in self.failed]
+        for p in todo:
+            if p in self.index and p not in self.stale: continue
+            fut = self.pool.submit(make_thumb, p, self.root)
+            with self.lock: self.pending[p] = fut
+            fut.add_done_callback(lambda f, p=p: self._done(p, f))
+
+    def drain(self):
+        with self.lock: out, self.ready = self.ready, []
+        return out
+
+    def busy(self):
+        with self.lock: return len(self.pending)
+
+    def save(self):
+        if not self.dirty: return
+        with self.lock: data = {'version': INDEX_VERSION, 'entries': dict(self.index)}; self.dirty = False
+        tmp = self.index_path + ".tmp"
+        with open(tmp, 'wb') as f: pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.index_path)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        try: self.save()
+        except OSError: pass
+
+# --- Grid view ---
+class ThumbnailGrid:
+    """Contact-sheet window over the dataset, drawn from a ThumbCache.
+
+    Only the rows in view have canvas items; scrolling moves the retained
+    cells and creates/deletes the ones that enter/leave the viewport.
+    """
+    CELL = THUMB + 24
+    PHOTO_CACHE = 1500
+
+    def __init__(self, root, cache, paths, find_label, on_open, current=lambda: None):
+        import tkinter as tk
+        from tkinter import ttk
+        self.tk = tk
+        self.cache = cache
+        self.paths = paths            # callable: the current image list
+        self.find_label = find_label
+        self.on_open = on_open
+        self.current = current
+        self.y = 0
+        self.cells = {}               # image index -> canvas item ids
+        self.photos = OrderedDict()   # thumbnail file -> PhotoImage
+        self.boxes = OrderedDict()    # image path -> normalized boxes
+
+        self.win = tk.Toplevel(root)
+        self.win.title("Overview")
+        self.win.geometry("1200x800")
+        bar = ttk.Frame(self.win, padding=3); bar.pack(side=tk.TOP, fill=tk.X)
+        self.lbl = ttk.Label(bar, text="", foreground="gray"); self.lbl.pack(side=tk.LEFT)
+        self.sb = ttk.Scrollbar(self.win, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.sb.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas = tk.Canvas(self.win, bg="#181818", highlightthickness=0)
+        self.canvas.pack(fill=tk.BOTH, expand=True)
+        self.frames = FrameScheduler(self.win, self.render)
+        self.canvas.bind("<Configure>", lambda e: self.relayout())
+        self.canvas.bind("<MouseWheel>", lambda e: self.scroll_by(-e.delta))
+        self.canvas.bind("<Button-4>", lambda e: self.scroll_by(-120))
+        self.canvas.bind("<Button-5>", lambda e: self.scroll_by(120))
+        self.canvas.bind("<Button-1>", self.on_click)
+        self.win.bind("<Prior>", lambda e: self.scroll_by(-self.view_h()))
+        self.win.bind("<Next>", lambda e: self.scroll_by(self.view_h()))
+        self.win.bind("<Home>", lambda e: self.scroll_to(0))
+        self.win.bind("<End>", lambda e: self.scroll_to(self.total_h()))
+        self.win.protocol("WM_DELETE_WINDOW", self.close)
+        self.alive = True
+        self.show_index(self.current() or 0)
+        self.win.after(100, self.poll)
+
+    # --- Geometry ---
+    def view_w(self): return self.canvas.winfo_width() or 1200
+    def view_h(self): return self.canvas.winfo_height() or 800
+    def cols(self): return max(1, self.view_w() // self.CELL)
+    def total_h(self): return -(-len(self.paths()) // self.cols()) * self.CELL
+    def cell_xy(self, i):
+        c = self.cols()
+        return (i % c) * self.CELL, (i // c) * self.CELL - self.y
+
+    def visible_range(self, margin=0):
+        c = self.cols()
+        r0 = max(0, (self.y - margin) // self.CELL); r1 = (self.y + self.view_h() + margin) // self.CELL + 1
+        return r0 * c, min(r1 * c, len(self.paths()))
+
+    # --- Scrolling ---
+    def scroll_to(self, y):
+        y = int(min(max(0, y), max(0, self.total_h() - self.view_h())))
+        if y == self.y: return
+        self.canvas.move("cell", 0, self.y - y)
+        self.y = y
+        self.frames.request()
+
+    def scroll_by(self, dy): self.scroll_to(self.y + dy)
+
+    def show_index(self, i):
+        self.scroll_to((i // self.cols()) * self.CELL - self.view_h() // 3)
+        self.frames.request()
+
+    def on_scrollbar(self, *args):
+        if args[0] == 'moveto': self.scroll_to(float(args[1]) * self.total_h())
+        elif args[0] == 'scroll':
+            step = self.view_h() if args[2] == 'pages' else self.CELL
+            self.scroll_by(int(args[1]) * step)
+
+    def relayout(self):
+        # Column count may have changed: rebuild every cell.
+        for items in self.cells.values(): self.canvas.delete(*items)
+        self.cells = {}
+        self.frames.request()
+
+    # --- Drawing ---
+    def render(self):
+        if not self.alive: return
+        with TRACER.span("grid.render"):
+            lo, hi = self.visible_range()
+            for i in [i for i in self.cells if not lo <= i < hi]:
+                self.canvas.delete(*self.cells.pop(i))
+            cur = self.current()
+            for i in range(lo, hi):
+                if i not in self.cells: self.cells[i] = self.draw_cell(i, i == cur)
+            # Visible cells first, then a screen above and two below, so scrolling on finds them ready.
+            plo, phi = self.visible_range(margin=2 * self.view_h())
+            paths = self.paths()
+            self.cache.request([paths[i] for i in range(lo, hi)] + [paths[i] for i in range(plo, phi) if not lo <= i < hi])
+            th = self.total_h() or 1
+            self.sb.set(self.y / th, min(1.0, (self.y + self.view_h()) / th))
+            self.lbl.config(text=f"{lo + 1}-{hi} of {len(paths)}   |   generating: {self.cache.busy()}")
+
+    def photo(self, fname):
+        ph = self.photos.get(fname)
+        if ph is not None: self.photos.move_to_end(fname); return ph
+        from PIL import ImageTk
+        with TRACER.span("grid.photo"):
+            with Image.open(fname) as img: ph = ImageTk.PhotoImage(img)
+        self.photos[fname] = ph
+        while len(self.photos) > self.PHOTO_CACHE: self.photos.popitem(last=False)
+        return ph
+
+    def label_boxes(self, path, full):
+        b = self.boxes.get(path)
+        if b is None:
+            lbl = self.find_label(path)
+            b = parse_label_file(lbl) if lbl else []
+            fw, fh = full
+            b = [[c, x/fw, y/fh, w/fw, h/fh] if x > 1 or y > 1 else [c, x, y, w, h] for c, x, y, w, h, *_ in b]
+            self.boxes[path] = b
+            while len(self.boxes) > self.PHOTO_CACHE: self.boxes.popitem(last=False)
+        return b
+
+    def draw_cell(self, i, is_current):
+        tk = self.tk; cv = self.canvas
+        path = self.paths()[i]
+        x, y = self.cell_xy(i)
+        tags = ("cell",)
+        items = [cv.create_rectangle(x + 2, y + 2, x + self.CELL - 2, y + self.CELL - 2,
+                                     outline="#FF0000" if is_current else "#333333", width=2 if is_current else 1, tags=tags)]
+        items.append(cv.create_text(x + self.CELL // 2, y + self.CELL - 12, text=f"{i + 1}: {os.path.basename(path)}"[:28],
+                                    fill="#AAAAAA", font=("Arial", 8), tags=tags))
+        hit = self.cache.lookup(path)
+        if hit is None: return items
+        fname, full = hit
+        try: ph = self.photo(fname)
+        except OSError: return items
+        tw, th = ph.width(), ph.height()
+        ox = x + (self.CELL - tw) // 2; oy = y + 4 + (THUMB - th) // 2
+        items.append(cv.create_image(ox, oy, anchor=tk.NW, image=ph, tags=tags))
+        for c, cx, cy, w, h in self.label_boxes(path, full):
+            items.append(cv.create_rectangle(ox + (cx - w/2) * tw, oy + (cy - h/2) * th, ox + (cx + w/2) * tw, oy + (cy + h/2) * th,
+                                             outline="#00FF00", tags=tags))
+        return items
+
+    def invalidate(self, path):
+        """Drop cached boxes (and the cell) of an image whose labels changed."""
+        self.boxes.pop(path, None)
+        for i, items in list(self.cells.items()):
+            if self.paths()[i] == path: self.canvas.delete(*items); del self.cells[i]
+        self.frames.request()
+
+    def poll(self):
+        if not self.alive: return
+        ready = set(self.cache.drain())
+        if ready:
+            paths = self.paths()
+            for i in [i for i in self.cells if paths[i] in ready]:
+                self.canvas.delete(*self.cells.pop(i))
+            self.frames.request()
+        self.win.after(100, self.poll)
+
+    def on_click(self, e):
+        c = self.cols()
+        col = e.x // self.CELL; row = (e.y + self.y) // self.CELL
+        i = row * c + col
+        if col < c and 0 <= i < len(self.paths()):
+            self.on_open(i)
+            self.relayout()
+
+    def close(self):
+        self.alive = False
+        self.frames.cancel()
+        self.win.destroy()
+        self.cache.save()
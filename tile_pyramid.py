@@ -0,0 +1,135 @@
+import math
+import threading
+from collections import OrderedDict
+from PIL import Image
+from image_cache import image_nbytes
+from large_image import TILE
+from perf_trace import TRACER
+
+class TileCache:
+    """Byte-bounded LRU of pyramid tiles keyed by (path, level, tx, ty), shared by all images."""
+    def __init__(self, max_bytes=256 * 2**20):
+        self.max_bytes = max_bytes
+        self.items = OrderedDict()
+        self.nbytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            t = self.items.get(key)
+            if t is not None: self.items.move_to_end(key)
+            return t
+
+    def put(self, key, tile):
+        with self.lock:
+            if key in self.items: return
+            self.items[key] = tile; self.nbytes += image_nbytes(tile)
+            while self.nbytes > self.max_bytes and len(self.items) > 1:
+                _, old = self.items.popitem(last=False); self.nbytes -= image_nbytes(old)
+
+class TilePyramid:
+    """Power-of-two downsampled levels of one image, cut into TILE x TILE tiles.
+
+    Level 0 is the full image (from `full`, or `load_full(path)` on demand).
+    Coarser levels are reduced from the next finer level when it is already in
+    memory; otherwise JPEGs are decoded straight at reduced size with draft().
+    Images that `large` (a LargeImages) wants are never held whole: their
+    tiles are read by region from a LargeImage source instead.
+    """
+    def __init__(self, path, load_full, tiles, full=None, large=None):
+        self.path = path
+        self.load_full = load_full
+        self.tiles = tiles
+        self.levels = {}
+        self.level_lock = threading.RLock()  # reentrant: a level is reduced from the next finer one
+        self.source = None
+        if full is not None: self.size = full.size; self.levels[0] = full
+        else:
+            with Image.open(path) as im:
+                self.size = im.size
+                if large is not None and large.wants(im.size): self.source = large.open(path, im)
+        self.is_jpeg = path.lower().endswith(('.jpg', '.jpeg'))
+        self.n_levels = 1
+        while max(self.size) >> self.n_levels >= TILE: self.n_levels += 1
+
+    def ready(self): return self.source is None or self.source.ready()
+
+    def level_size(self, k):
+        if self.source is not None: return self.source.sizes[k]
+        return self.level_image(k).size
+
+    def level_for(self, zoom):
+        if zoom >= 1: return 0
+        return min(int(math.floor(math.log2(1 / zoom))), self.n_levels - 1)
+
+    def level_image(self, k):
+        img = self.levels.get(k)
+        if img is not None: return img
+        # The lookahead worker and the Tk thread both build levels: build each once.
+        with self.level_lock:
+            img = self.levels.get(k)
+            if img is not None: return img
+            w, h = self.size
+            target = (max(1, w >> k), max(1, h >> k))
+            finer = next((self.levels[j] for j in range(k - 1, -1, -1) if j in self.levels), None)
+            if k == 0:
+                img = self.load_full(self.path)
+            elif finer is None and self.is_jpeg:
+                with TRACER.span("image.open"): img = Image.open(self.path)
+                with TRACER.span("image.decode"):
+                    img.draft(img.mode, target)
+                    img.load()
+                if img.size != target:
+                    with TRACER.span("resize"): img = img.resize(target, Image.BILINEAR)
+            else:
+                finer = self.level_image(k - 1)
+                with TRACER.span("resize"): img = finer.reduce(2)
+            if img.mode not in ('RGB', 'RGBA', 'L'): img = img.convert('RGB')
+            self.levels[k] = img
+            return img
+
+    def tile(self, k, tx, ty):
+        key = (self.path, k, tx, ty)
+        t = self.tiles.get(key)
+        if t is None:
+            if self.source is not None:
+                lw, lh = self.source.sizes[k]
+                with TRACER.span("region.read"): t = self.source.read(k, (tx*TILE, ty*TILE, min((tx+1)*TILE, lw), min((ty+1)*TILE, lh)))
+            else:
+                lvl = self.level_image(k)
+                with TRACER.span("crop"): t = lvl.crop((tx*TILE, ty*TILE, min((tx+1)*TILE, lvl.width), min((ty+1)*TILE, lvl.height)))
+            self.tiles.put(key, t)
+        return t
+
+    def render(self, view_x, view_y, zoom, cw, ch, resample=Image.NEAREST):
+        """Visible part of the image for a view in full-resolution coordinates.
+
+        Returns (display image, draw_x, draw_y) relative to the view origin, or None
+        (also while a large image's levels are still being built).
+        """
+        w, h = self.size
+        x1 = max(0, int(view_x)); y1 = max(0, int(view_y))
+        x2 = min(w, int(view_x + cw / zoom) + 1); y2 = min(h, int(view_y + ch / zoom) + 1)
+        if x2 <= x1 or y2 <= y1: return None
+
+        k = self.level_for(zoom); s = 1 << k
+        if self.source is not None and not self.source.available(k): return None
+        lw, lh = self.level_size(k)
+        lx1 = x1 // s; ly1 = y1 // s
+        lx2 = min(lw, -(-x2 // s)); ly2 = min(lh, -(-y2 // s))
+        if lx2 <= lx1 or ly2 <= ly1: return None
+        tx1, ty1 = lx1 // TILE, ly1 // TILE
+        tx2, ty2 = (lx2 - 1) // TILE, (ly2 - 1) // TILE
+
+        if tx1 == tx2 and ty1 == ty2: mosaic = self.tile(k, tx1, ty1)
+        else:
+            mosaic = Image.new(self.tile(k, tx1, ty1).mode, ((tx2-tx1+1)*TILE, (ty2-ty1+1)*TILE))
+            for ty in range(ty1, ty2+1):
+                for tx in range(tx1, tx2+1):
+                    mosaic.paste(self.tile(k, tx, ty), ((tx-tx1)*TILE, (ty-ty1)*TILE))
+        with TRACER.span("crop"): region = mosaic.crop((lx1 - tx1*TILE, ly1 - ty1*TILE, lx2 - tx1*TILE, ly2 - ty1*TILE))
+
+        disp_w = max(1, int((lx2 - lx1) * s * zoom)); disp_h = max(1, int((ly2 - ly1) * s * zoom))
+        draw_x = int((lx1 * s - view_x) * zoom); draw_y = int((ly1 * s - view_y) * zoom)
+        with TRACER.span("resize"): disp = region.resize((disp_w, disp_h), resample)
+        return disp, draw_x, draw_y
@@ -0,0 +1,177 @@
+import os
+import json
+from collections import deque
+
+HISTORY_CAPACITY = 5000
+
+# --- Records ---
+# (op, img_id, idx, fields, old, new); op is 'M'odify, 'D'elete or 'A'dd.
+# A MODIFY keeps only the changed fields of [cls, cx, cy, w, h]. ('T', [records]) is a transaction.
+# Bulk edits use one record per image: 'C' (class remap) and 'X' (delete) take a list of indices.
+BULK_OPS = ('C', 'X')
+
+def modify_record(img_id, idx, old, new):
+    fields = tuple(i for i in range(5) if old[i] != new[i])
+    return ('M', img_id, idx, fields, tuple(old[i] for i in fields), tuple(new[i] for i in fields))
+
+def delete_record(img_id, idx, old): return ('D', img_id, idx, None, tuple(old), None)
+def add_record(img_id, idx, new): return ('A', img_id, idx, None, None, tuple(new))
+
+def remap_record(img_id, idxs, old_classes, new_cls): return ('C', img_id, list(idxs), None, list(old_classes), new_cls)
+def delete_many_record(img_id, idxs, old_boxes): return ('X', img_id, list(idxs), None, list(old_boxes), None)
+
+def leaf_records(rec):
+    return rec[1] if rec[0] == 'T' else [rec]
+
+def apply_record(store, rec, undo):
+    """Apply (or revert) a record on a BoxStore; returns the set of touched image ids."""
+    if rec[0] == 'T':
+        touched = set()
+        for r in (reversed(rec[1]) if undo else rec[1]): touched |= apply_record(store, r, undo)
+        return touched
+    op, img_id, idx, fields, old, new = rec
+    if op == 'C':
+        rows = store.rows(img_id)
+        for j, c in zip(idx, old if undo else [new] * len(idx)): store.cls[rows[j]] = int(c)
+    elif op == 'X':
+        if undo:
+            for j, box in zip(idx, old): store.add(img_id, list(box), j)
+        else: store.delete_many(img_id, idx)
+    elif op == 'M':
+        row = store.row(img_id, idx)
+        data = store.get(row)
+        for f, v in zip(fields, old if undo else new): data[f] = v
+        store.set(row, data)
+    elif (op == 'D') == undo: store.add(img_id, list(old if op == 'D' else new), idx)
+    else: store.delete(img_id, idx)
+    return {img_id}
+
+class UndoHistory:
+    """Bounded undo/redo history persisted to an append-only session file.
+
+    Entries live in a deque capped at `capacity`, so pushing evicts the oldest
+    entry and per-edit cost stays constant. Every push/undo/redo appends one
+    line to the session file; load() replays it, and the file is rewritten
+    compactly once it grows past a few times the capacity. Image ids are
+    stored as paths so the file survives reordering of the image list.
+
+    Records address boxes by index, so they only hold for the label files
+    they were made on: with a `stamp` (img_id -> the label file's change key),
+    close() appends the key of every touched image and load() drops the
+    records of images whose file changed since, or of every image when the
+    last session did not close cleanly.
+    """
+    def __init__(self, session_path, encode, decode, capacity=HISTORY_CAPACITY, stamp=None):
+        self.session_path = session_path
+        self.encode = encode
+        self.decode = decode
+        self.stamp = stamp
+        self.capacity = capacity
+        self.entries = deque(maxlen=capacity)
+        self.cursor = 0
+        self.tx = None
+        self.lines = 0
+        self.f = None
+
+    # --- Session file ---
+    def _to_json(self, rec):
+        if rec[0] == 'T': return ['T', [self._to_json(r) for r in rec[1]]]
+        op, img_id, idx, fields, old, new = rec
+        return [op, self.encode(img_id), idx, fields, old, new]
+
+    def _from_json(self, obj):
+        if obj[0] == 'T':
+            subs = [self._from_json(o) for o in obj[1]]
+            return None if None in subs else ('T', subs)
+        op, path, idx, fields, old, new = obj
+        img_id = self.decode(path)
+        if img_id is None: return None
+        if op in BULK_OPS: return (op, img_id, idx, None, old, new)
+        t = lambda v: tuple(v) if v is not None else None
+        return (op, img_id, idx, t(fields), t(old), t(new))
+
+    def touched(self): return {r[1] for rec in self.entries for r in leaf_records(rec)}
+
+    def _key(self, img_id):
+        k = self.stamp(img_id)
+        return list(k) if k is not None else None
+
+    def load(self):
+        keys = None
+        try:
+            with open(self.session_path, 'r') as f:
+                for line in f:
+                    try: cmd = json.loads(line)
+                    except ValueError: continue
+                    keys = cmd.get('keys')   # only valid as the last line
+                    if 'push' in cmd:
+                        rec = self._from_json(cmd['push'])
+                        if rec is None: self.entries.clear(); self.cursor = 0  # image gone: older entries no longer apply
+                        else: self._push(rec)
+                    elif 'undo' in cmd: self.cursor = max(self.cursor - 1, 0)
+                    elif 'redo' in cmd: self.cursor = min(self.cursor + 1, len(self.entries))
+        except OSError: pass
+        if self.stamp:
+            keys = keys or {}
+            self.forget({i for i in self.touched() if keys.get(self.encode(i)) != self._key(i)})
+        self.compact()
+
+    def _log(self, cmd):
+        if self.f is None: return
+        self.f.write(json.dumps(cmd) + "\n"); self.f.flush()
+        self.lines += 1
+        if self.lines > 4 * self.capacity: self.compact()
+
+    def compact(self):
+        if self.f: self.f.close()
+        tmp = self.session_path + ".tmp"
+        with open(tmp, 'w') as f:
+            for rec in self.entries: f.write(json.dumps({'push': self._to_json(rec)}) + "\n")
+            for _ in range(len(self.entries) - self.cursor): f.write('{"undo": 1}\n')
+        os.replace(tmp, self.session_path)
+        self.lines = len(self.entries) * 2 - self.cursor
+        self.f = open(self.session_path, 'a')
+
+    def close(self):
+        """Call once the label files are written, so the recorded keys match them."""
+        if self.f is None: return
+        if self.stamp: self.f.write(json.dumps({'keys': {self.encode(i): self._key(i) for i in self.touched()}}) + "\n")
+        self.f.close(); self.f = None
+
+    # --- Undo/Redo ---
+    def _push(self, rec):
+        while len(self.entries) > self.cursor: self.entries.pop()
+        self.entries.append(rec)
+        self.cursor = len(self.entries)
+
+    def push(self, rec):
+        if self.tx is not None: self.tx.append(rec); return
+        self._push(rec)
+        self._log({'push': self._to_json(rec)})
+
+    def begin(self): self.tx = []
+
+    def commit(self):
+        """Close the transaction opened by begin(); its records undo as one step."""
+        recs, self.tx = self.tx, None
+        if recs: self.push(('T', recs) if len(recs) > 1 else recs[0])
+
+    def forget(self, img_ids):
+        """Drop entries touching img_ids (their labels were replaced from disk); the rest stay undoable."""
+        keep = []; cursor = 0
+        for k, rec in enumerate(self.entries):
+            if any(r[1] in img_ids for r in leaf_records(rec)): continue
+            keep.append(rec); cursor += k < self.cursor
+        if len(keep) == len(self.entries): return
+        self.entries = deque(keep, maxlen=self.capacity); self.cursor = cursor
+        self.compact()
+
+    def undo(self):
+        if self.cursor == 0: return None
+        self.cursor -= 1; self._log({'undo': 1})
+        return self.entries[self.cursor]
+
+    def redo(self):
+        if self.cursor >= len(self.entries): return None
+        self.cursor += 1; self._log({'redo': 1})
+        return self.entries[self.cursor - 1]
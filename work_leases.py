@@ -0,0 +1,136 @@
+import os
+import time
+import uuid
+import zlib
+import socket
+import threading
+
+CHUNK_IMAGES = 200   # consecutive images per leased chunk
+LEASE_TTL = 600.0    # seconds without a heartbeat before a lease may be taken over
+
+class WorkLeases:
+    """Splits a dataset into chunks of consecutive images and leases them to
+    reviewers through lock files in a shared directory; no server needed.
+
+    chunk_NNNNNN.lease is created with O_EXCL, so exactly one session holds a
+    chunk. The holder touches it every ttl/4 seconds; a lease untouched for
+    ttl seconds may be taken over. chunk_NNNNNN.done marks a finished chunk.
+    Reviewers start at different chunks (by name hash), so claims rarely race.
+    """
+    def __init__(self, root, n_images, reviewer, chunk=CHUNK_IMAGES, ttl=LEASE_TTL):
+        self.root = root
+        self.n_images = n_images
+        self.reviewer = reviewer
+        self.chunk = chunk
+        self.ttl = ttl
+        self.n_chunks = (n_images + chunk - 1) // chunk
+        self.token = f"{reviewer}@{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.held = None
+        self.lost = False
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = False
+        os.makedirs(root, exist_ok=True)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def path(self, k, ext): return os.path.join(self.root, f"chunk_{k:06d}.{ext}")
+    def images(self, k): return k * self.chunk, min((k + 1) * self.chunk, self.n_images)
+
+    def state(self):
+        """(done chunk ids, leased chunk ids) from one directory listing."""
+        done, leased = set(), set()
+        for name in os.listdir(self.root):
+            stem, _, ext = name.partition('.')
+            if stem.startswith("chunk_") and ext in ('done', 'lease'): (done if ext == 'done' else leased).add(int(stem[6:]))
+        return done, leased
+
+    def expired(self, path):
+        try: return time.time() - os.stat(path).st_mtime > self.ttl
+        except OSError: return False
+
+    # --- Lock files ---
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, 'r') as f: return f.read()
+        except OSError: return None
+
+    def _create(self, path):
+        try: fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError: return False
+        with os.fdopen(fd, 'w') as f: f.write(self.token)
+        return True
+
+    def _steal(self, path):
+        """Remove an expired lease; only one of several racing sessions gets to."""
+        grave = f"{path}.{uuid.uuid4().hex[:8]}.stale"
+        try: os.rename(path, grave)
+        except OSError: return False
+        if not self.expired(grave):
+            # Renewed or re-claimed between our check and the rename: put it back.
+            try: os.link(grave, path)
+            except OSError: pass
+            os.remove(grave); return False
+        os.remove(grave)
+        return True
+
+    def _drop(self, k):
+        path = self.path(k, 'lease')
+        if self._read(path) == self.token:
+            try: os.remove(path)
+            except OSError: pass
+
+    # --- Leases ---
+    def claim(self, skip=None, start=None):
+        """Lease the first free chunk at or after `start` (wrapping), or None when every chunk
+        is done or held. skip(k) -> True marks chunk k done instead (nothing left to review)."""
+        self.release()
+        done, leased = self.state()
+        if start is None: start = zlib.crc32(self.reviewer.encode())
+        for j in range(self.n_chunks):
+            k = (start + j) % self.n_chunks
+            if k in done: continue
+            path = self.path(k, 'lease')
+            if k in leased and not (self.expired(path) and self._steal(path)): continue
+            if not self._create(path): continue
+            with self.lock: self.held = k; self.lost = False
+            if skip and skip(k): self.finish(); continue
+            return k
+        return None
+
+    def finish(self):
+        """Mark the held chunk done and give up its lease."""
+        with self.lock: k, self.held = self.held, None
+        if k is None: return
+        with open(self.path(k, 'done'), 'w') as f: f.write(self.token)
+        self._drop(k)
+
+    def release(self):
+        with self.lock: k, self.held = self.held, None
+        if k is not None: self._drop(k)
+
+    def owns(self, img_id):
+        with self.lock: k = self.held
+        return k is not None and k * self.chunk <= img_id < (k + 1) * self.chunk
+
+    def done_count(self): return len(self.state()[0])
+
+    # --- Heartbeat ---
+    def run(self):
+        while not self.stopped:
+            self.wake.wait(self.ttl / 4); self.wake.clear()
+            with self.lock: k = self.held
+            if k is None or self.stopped: continue
+            path = self.path(k, 'lease')
+            if self._read(path) != self.token:
+                # Expired while we were away (suspended laptop, dead mount) and someone took it over.
+                with self.lock:
+                    if self.held == k: self.held = None; self.lost = True
+                continue
+            try: os.utime(path)
+            except OSError: pass
+
+    def close(self):
+        self.stopped = True; self.wake.set(); self.thread.join()
+        self.release()